@@ -1,6 +1,13 @@
 from django.contrib import admin
 
-from .models import AccessRoleRule, BusinessElement, Role, UserRole
+from .models import (
+    AccessRoleRule,
+    BusinessElement,
+    PolicyVersion,
+    Role,
+    UserEffectivePermission,
+    UserRole,
+)
 
 
 @admin.register(Role)
@@ -41,3 +48,32 @@ class UserRoleAdmin(admin.ModelAdmin):
         'user__last_name',
         'role__name',
     ]
+
+
+@admin.register(UserEffectivePermission)
+class UserEffectivePermissionAdmin(admin.ModelAdmin):
+    list_display = ['user', 'element', 'permissions_mask']
+    list_filter = ['element']
+    search_fields = ['user__email', 'element__name']
+    readonly_fields = ['user', 'element', 'permissions_mask', 'grants']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(PolicyVersion)
+class PolicyVersionAdmin(admin.ModelAdmin):
+    list_display = ['version', 'updated_at']
+    readonly_fields = ['version', 'updated_at']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -1,5 +1,18 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.backends.signals import connection_created
 
 
 class RbacConfig(AppConfig):
     name = 'rbac'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .middleware import install_query_counter
+
+        connection_created.connect(
+            install_query_counter, dispatch_uid='rbac_query_counter'
+        )
+        # Connections of this thread may already be open.
+        for connection in connections.all():
+            install_query_counter(connection)
@@ -0,0 +1,161 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import BusinessElement, PolicyVersion
+from .serializers import BusinessElementSerializer
+
+KEY_PREFIX = 'rbac'
+
+# ((policy version, element version), monotonic time they were read) of
+# the last versions seen. Replaced as a whole so concurrent readers never
+# see a torn pair.
+_policy_version = (None, 0.0)
+
+
+def get_cache():
+    """Return the cache configured by the RBAC_CACHE_ALIAS setting."""
+    return caches[getattr(settings, 'RBAC_CACHE_ALIAS', 'default')]
+
+
+def make_key(kind, *parts):
+    """Build a namespaced cache key safe for every cache backend."""
+    digest = hashlib.sha256(
+        '\0'.join(str(part) for part in parts).encode()
+    ).hexdigest()
+    return f'{KEY_PREFIX}:{kind}:{digest}'
+
+
+def _fresh_versions():
+    """Return the last versions read if they are recent enough, else None."""
+    interval = (
+        getattr(settings, 'RBAC_POLICY_VERSION_CHECK_INTERVAL', 1000) / 1000
+    )
+    versions, checked_at = _policy_version
+    if time.monotonic() - checked_at >= interval:
+        return None
+    return versions
+
+
+def _remember_versions(versions):
+    global _policy_version
+    _policy_version = (versions, time.monotonic())
+    return versions
+
+
+def _get_versions():
+    versions = _fresh_versions()
+    if versions is None:
+        versions = _remember_versions(PolicyVersion.current_versions())
+    return versions
+
+
+async def _aget_versions():
+    versions = _fresh_versions()
+    if versions is None:
+        versions = _remember_versions(await PolicyVersion.acurrent_versions())
+    return versions
+
+
+def get_policy_version():
+    """Return the policy version, reading it at most once per interval.
+
+    The interval is the RBAC_POLICY_VERSION_CHECK_INTERVAL setting in
+    milliseconds, so a write made by another worker is noticed at most
+    that long after it commits.
+    """
+    return _get_versions()[0]
+
+
+async def aget_policy_version():
+    """Async version of get_policy_version()."""
+    return (await _aget_versions())[0]
+
+
+def get_element_version():
+    """Return the element version, read together with the policy version."""
+    return _get_versions()[1]
+
+
+async def aget_element_version():
+    """Async version of get_element_version()."""
+    return (await _aget_versions())[1]
+
+
+def expire_policy_version():
+    """Make the next get_policy_version() call read the database."""
+    global _policy_version
+    _policy_version = (None, 0.0)
+
+
+def bump_policy_version(elements=False):
+    """Invalidate all cached access decisions in every worker.
+
+    elements also invalidates the element index, for writes to business
+    elements.
+    """
+    PolicyVersion.bump(elements)
+    expire_policy_version()
+
+
+def forget_missing_users(user_ids):
+    """Drop the negative cache entries of users that were just created.
+
+    Only the RBAC_CACHE_ALIAS cache is cleared; if it is not shared, the
+    entries of other workers expire after RBAC_NEGATIVE_CACHE_TIMEOUT.
+    """
+    version = get_policy_version()
+    get_cache().delete_many(
+        [make_key('missing-user', version, user_id) for user_id in user_ids]
+    )
+
+
+class ElementIndex:
+    """In-memory index of business elements by name.
+
+    Maps each name to its id and serialized payload, so resolving an
+    element and rendering it costs no queries. The index is loaded lazily
+    and reloaded whenever the element version changes, that is when
+    elements are created, changed or deleted in any worker.
+    """
+
+    def __init__(self):
+        # (element version, {name: (id, payload)}), replaced as a whole.
+        self._snapshot = (None, {})
+
+    @staticmethod
+    def serialize(element):
+        return element.pk, dict(BusinessElementSerializer(element).data)
+
+    def get_elements(self):
+        """Return the name to (id, payload) mapping for this version."""
+        version = get_element_version()
+        built_for, elements = self._snapshot
+        if built_for != version:
+            elements = {
+                element.name: self.serialize(element)
+                for element in BusinessElement.objects.all()
+            }
+            self._snapshot = (version, elements)
+        return elements
+
+    async def aget_elements(self):
+        """Async version of get_elements()."""
+        version = await aget_element_version()
+        built_for, elements = self._snapshot
+        if built_for != version:
+            elements = {
+                element.name: self.serialize(element)
+                async for element in BusinessElement.objects.all()
+            }
+            self._snapshot = (version, elements)
+        return elements
+
+    def clear(self):
+        """Drop the index so the next lookup reloads it."""
+        self._snapshot = (None, {})
+
+
+element_index = ElementIndex()
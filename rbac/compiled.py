@@ -0,0 +1,178 @@
+import json
+import mmap
+import struct
+from bisect import bisect_left
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .policy_file import PolicyFileWatcher, publish_file
+
+MAGIC = b'RBACPOL\0'
+FORMAT_VERSION = 1
+
+# magic, format version, policy version, number of active users, of role
+# assignments, of roles, of rules, and length of the elements JSON.
+HEADER = struct.Struct('<8sIQIIIII')
+
+# Sections follow the header in this order, each a little-endian array:
+#   user ids        int64  * users, sorted
+#   user offsets    uint32 * (users + 1), into role assignments
+#   assignments     uint32 * assignments, role numbers
+#   role offsets    uint32 * (roles + 1), into rules
+#   rule elements   uint32 * rules, element numbers sorted per role
+#   rule masks      uint16 * rules
+#   elements        UTF-8 JSON list of payloads, by element number
+
+
+class CompiledPolicy:
+    """Access policy read from a memory-mapped compiled policy file.
+
+    The arrays are views on the mapped pages, so workers mapping the same
+    file share them through the page cache and only keep the element
+    names and payloads in their own memory. Provides the same lookup()
+    as PolicySnapshot.
+    """
+
+    __slots__ = (
+        'assignments',
+        'element_numbers',
+        'element_payloads',
+        'role_offsets',
+        'rule_elements',
+        'rule_masks',
+        'user_ids',
+        'user_offsets',
+        'version',
+    )
+
+    def __init__(self, buffer):
+        if len(buffer) < HEADER.size:
+            raise ValueError('Not a compiled RBAC policy file.')
+        (
+            magic,
+            format_version,
+            self.version,
+            users,
+            assignments,
+            roles,
+            rules,
+            elements_length,
+        ) = HEADER.unpack_from(buffer)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError('Not a compiled RBAC policy file.')
+        size = (
+            HEADER.size
+            + 8 * users
+            + 4 * (users + 1 + assignments + roles + 1 + rules)
+            + 2 * rules
+            + elements_length
+        )
+        if len(buffer) != size:
+            raise ValueError('Compiled RBAC policy file has the wrong size.')
+
+        view = memoryview(buffer)
+        offset = HEADER.size
+
+        def section(code, count):
+            nonlocal offset
+            size = struct.calcsize(code) * count
+            array = view[offset : offset + size].cast(code)
+            offset += size
+            return array
+
+        self.user_ids = section('q', users)
+        self.user_offsets = section('I', users + 1)
+        self.assignments = section('I', assignments)
+        self.role_offsets = section('I', roles + 1)
+        self.rule_elements = section('I', rules)
+        self.rule_masks = section('H', rules)
+        payloads = json.loads(
+            bytes(view[offset : offset + elements_length]).decode()
+        )
+        self.element_payloads = tuple(payloads)
+        self.element_numbers = {
+            payload['name']: number for number, payload in enumerate(payloads)
+        }
+
+    @classmethod
+    def from_file(cls, path):
+        """Map a compiled policy file into memory."""
+        with open(path, 'rb') as file:
+            return cls(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def lookup(self, user_pk, resource_name):
+        """Return (user_active, element payload, grants) for an access check.
+
+        Matches the fields of services.AccessEntry.
+        """
+        if user_pk is None:
+            return False, None, frozenset()
+        user = bisect_left(self.user_ids, user_pk)
+        if user == len(self.user_ids) or self.user_ids[user] != user_pk:
+            return False, None, frozenset()
+        number = self.element_numbers.get(resource_name)
+        if number is None:
+            return True, None, frozenset()
+
+        grants = set()
+        start, end = self.user_offsets[user], self.user_offsets[user + 1]
+        for role in self.assignments[start:end]:
+            low, high = self.role_offsets[role], self.role_offsets[role + 1]
+            rule = bisect_left(self.rule_elements, number, low, high)
+            if rule < high and self.rule_elements[rule] == number:
+                grants.add(self.rule_masks[rule])
+        return True, self.element_payloads[number], frozenset(grants)
+
+
+def compile_policy(snapshot):
+    """Encode a PolicySnapshot in the compiled policy file format."""
+    user_ids = sorted(snapshot.active_users)
+    user_offsets = [0]
+    assignments = []
+    for user_id in user_ids:
+        assignments.extend(sorted(snapshot.user_roles.get(user_id, ())))
+        user_offsets.append(len(assignments))
+
+    role_offsets = [0]
+    rule_elements = []
+    rule_masks = []
+    for masks in snapshot.role_masks:
+        for number, mask in sorted(masks.items()):
+            rule_elements.append(number)
+            rule_masks.append(mask)
+        role_offsets.append(len(rule_elements))
+
+    elements = json.dumps(
+        snapshot.element_payloads, cls=DjangoJSONEncoder
+    ).encode()
+    return b''.join(
+        [
+            HEADER.pack(
+                MAGIC,
+                FORMAT_VERSION,
+                snapshot.version,
+                len(user_ids),
+                len(assignments),
+                len(snapshot.role_masks),
+                len(rule_elements),
+                len(elements),
+            ),
+            struct.pack(f'<{len(user_ids)}q', *user_ids),
+            struct.pack(f'<{len(user_offsets)}I', *user_offsets),
+            struct.pack(f'<{len(assignments)}I', *assignments),
+            struct.pack(f'<{len(role_offsets)}I', *role_offsets),
+            struct.pack(f'<{len(rule_elements)}I', *rule_elements),
+            struct.pack(f'<{len(rule_masks)}H', *rule_masks),
+            elements,
+        ]
+    )
+
+
+def write_compiled_policy(snapshot, path):
+    """Publish a compiled policy file, atomically replacing the old one."""
+    publish_file(path, compile_policy(snapshot))
+
+
+compiled_policy = PolicyFileWatcher(
+    'RBAC_COMPILED_POLICY_PATH', CompiledPolicy.from_file, 'compile_policy'
+)
@@ -0,0 +1,240 @@
+import asyncio
+import json
+import os
+import shlex
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+# Upper bounds, in milliseconds, of the latency histogram buckets; the last
+# bucket counts everything slower.
+HISTOGRAM_BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+STACK_COMMANDS = {
+    'wsgi': (
+        '{python} -m gunicorn rbac_service.wsgi:application '
+        '--bind 127.0.0.1:{port} --workers {workers}'
+    ),
+    'asgi': (
+        '{python} -m uvicorn rbac_service.asgi:application '
+        '--host 127.0.0.1 --port {port} --workers {workers} '
+        '--no-access-log'
+    ),
+}
+
+
+class HttpConnection:
+    """Minimal keep-alive HTTP/1.1 client connection on asyncio streams."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+            self.reader = self.writer = None
+
+    async def request(self, method, path, headers=None, body=b''):
+        """Send a request and return (status code, response body).
+
+        A request on a kept-alive connection that the server has closed
+        in the meantime is retried once on a new connection.
+        """
+        if self.writer is None:
+            return await self._send(method, path, headers, body)
+        try:
+            return await self._send(method, path, headers, body)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            await self.close()
+            return await self._send(method, path, headers, body)
+
+    async def _send(self, method, path, headers, body):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port
+            )
+        lines = [
+            f'{method} {path} HTTP/1.1',
+            f'Host: {self.host}:{self.port}',
+            f'Content-Length: {len(body)}',
+            *(f'{name}: {value}' for name, value in (headers or {}).items()),
+        ]
+        self.writer.write('\r\n'.join(lines).encode() + b'\r\n\r\n' + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            await self.close()
+            raise ConnectionError('Connection closed by the server.')
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while (line := await self.reader.readline()) not in (b'\r\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get('transfer-encoding') == 'chunked':
+            chunks = []
+            while size := int((await self.reader.readline()).strip(), 16):
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readline()
+            await self.reader.readline()
+            content = b''.join(chunks)
+        else:
+            length = int(response_headers.get('content-length', 0))
+            content = await self.reader.readexactly(length)
+        if response_headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return status, content
+
+
+def summarize(latencies, statuses, errors, elapsed):
+    """Summarize the outcome of one load run.
+
+    latencies are in nanoseconds. Responses with a 5xx status and
+    transport errors both count as errors.
+    """
+    total = len(latencies) + errors
+    server_errors = sum(
+        count for code, count in statuses.items() if code >= 500
+    )
+    histogram = Counter()
+    for latency in latencies:
+        ms = latency / 1e6
+        bucket = next(
+            (f'<={bound}' for bound in HISTOGRAM_BOUNDS if ms <= bound),
+            f'>{HISTOGRAM_BOUNDS[-1]}',
+        )
+        histogram[bucket] += 1
+    summary = {
+        'requests': total,
+        'throughput': round(total / elapsed, 1) if elapsed else 0.0,
+        'error_rate': (
+            round((errors + server_errors) / total, 4) if total else 0.0
+        ),
+        'statuses': {str(code): statuses[code] for code in sorted(statuses)},
+        'transport_errors': errors,
+        'histogram_ms': {
+            bucket: histogram[bucket]
+            for bucket in (
+                *(f'<={bound}' for bound in HISTOGRAM_BOUNDS),
+                f'>{HISTOGRAM_BOUNDS[-1]}',
+            )
+        },
+    }
+    if len(latencies) >= 2:
+        cuts = statistics.quantiles(latencies, n=100)
+        summary['latency_ms'] = {
+            'mean': round(statistics.fmean(latencies) / 1e6, 3),
+            'p50': round(cuts[49] / 1e6, 3),
+            'p95': round(cuts[94] / 1e6, 3),
+            'p99': round(cuts[98] / 1e6, 3),
+            'max': round(max(latencies) / 1e6, 3),
+        }
+    return summary
+
+
+async def run_load(host, port, request, total, concurrency):
+    """Send total copies of a request over concurrency connections.
+
+    request is a (method, path, headers, body) tuple.
+    """
+    latencies = []
+    statuses = Counter()
+    errors = 0
+    remaining = total
+
+    async def worker():
+        nonlocal errors, remaining
+        connection = HttpConnection(host, port)
+        try:
+            while remaining > 0:
+                remaining -= 1
+                start = time.perf_counter_ns()
+                try:
+                    status, _ = await connection.request(*request)
+                except (OSError, ValueError, asyncio.IncompleteReadError):
+                    errors += 1
+                    await connection.close()
+                    continue
+                latencies.append(time.perf_counter_ns() - start)
+                statuses[status] += 1
+        finally:
+            await connection.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, statuses, errors, time.perf_counter() - start)
+
+
+def json_request(method, path, data=None, token=None):
+    """Build a request tuple for run_load() with an optional JSON body."""
+    headers = {'Accept': 'application/json'}
+    body = b''
+    if data is not None:
+        headers['Content-Type'] = 'application/json'
+        body = json.dumps(data).encode()
+    if token:
+        headers['Authorization'] = f'Token {token}'
+    return method, path, headers, body
+
+
+def free_port():
+    """Return a TCP port on localhost that is currently unused."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(command, port, workers, timeout=30):
+    """Start a server command and wait until it accepts connections.
+
+    command is a template formatted with python, port and workers. Raises
+    RuntimeError with the server output if it exits or does not listen
+    within timeout seconds.
+    """
+    args = shlex.split(
+        command.format(python=sys.executable, port=port, workers=workers)
+    )
+    # Output goes to a file, so a chatty server never blocks on a full pipe;
+    # the child keeps its own copy of the descriptor.
+    with tempfile.TemporaryFile() as log:
+        process = subprocess.Popen(
+            args, stdout=log, stderr=subprocess.STDOUT, env=os.environ.copy()
+        )
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                log.seek(0)
+                output = log.read().decode(errors='replace')
+                raise RuntimeError(
+                    f'{args[0]} exited with code {process.returncode}:\n'
+                    f'{output}'
+                )
+            try:
+                with socket.create_connection(('127.0.0.1', port), timeout=1):
+                    return process
+            except OSError:
+                time.sleep(0.1)
+    stop_server(process)
+    raise RuntimeError(f'Server did not listen on port {port} in time.')
+
+
+def stop_server(process):
+    """Terminate a server started by start_server()."""
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
@@ -0,0 +1,243 @@
+import json
+import statistics
+import time
+import uuid
+
+from django.conf import settings as django_settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework import status
+from rest_framework.test import APIRequestFactory
+
+from rbac.cache import (
+    element_index,
+    expire_policy_version,
+    get_cache,
+)
+from rbac.models import (
+    AccessRoleRule,
+    BusinessElement,
+    Role,
+    UserRole,
+    mask_to_permissions,
+)
+from rbac.services import sync_bulk_created_users
+from rbac.snapshot import clear_snapshot
+from rbac.views import AccessView
+
+User = get_user_model()
+
+# Every role grants a different mask without delete_all on both elements,
+# except the user's last role, which grants everything on the hit element.
+# Checks for read,delete_all therefore scan all of the user's roles.
+PERMISSIONS = 'read,delete_all'
+ALL_PERMISSIONS = 127
+
+# Private cache the benchmark uses instead of RBAC_CACHE_ALIAS, which it
+# clears between checks.
+CACHE_ALIAS = 'bench-access'
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the access check through AccessView against the current '
+        'database and print the results as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=1000,
+            help='Checks measured per scenario.',
+        )
+        parser.add_argument(
+            '--role-counts',
+            type=int,
+            nargs='+',
+            default=[1, 50],
+            help='Numbers of roles per benchmark user.',
+        )
+        parser.add_argument(
+            '--backend',
+            choices=['database', 'snapshot'],
+            help='Policy backend to use; defaults to RBAC_POLICY_BACKEND.',
+        )
+        parser.add_argument('--output', help='Also write the JSON here.')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 2:
+            raise CommandError('--iterations must be at least 2.')
+
+        settings = {
+            'CACHES': {
+                **django_settings.CACHES,
+                CACHE_ALIAS: {
+                    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                    'LOCATION': CACHE_ALIAS,
+                },
+            },
+            'RBAC_CACHE_ALIAS': CACHE_ALIAS,
+        }
+        if options['backend']:
+            settings['RBAC_POLICY_BACKEND'] = options['backend']
+        # Fixture names are unique per run, so rows left behind by a crashed
+        # run cannot collide with this one.
+        self.prefix = f'bench-{uuid.uuid4().hex[:8]}'
+        self.factory = APIRequestFactory()
+        self.view = AccessView.as_view()
+        results = {
+            'backend': options['backend'] or 'default',
+            'iterations': options['iterations'],
+            'dataset': {
+                'users': User.objects.count(),
+                'roles': Role.objects.count(),
+                'elements': BusinessElement.objects.count(),
+                'rules': AccessRoleRule.objects.count(),
+                'user_roles': UserRole.objects.count(),
+            },
+            'scenarios': [],
+        }
+        with override_settings(**settings):
+            # The fixture is committed before the checks run, so they do
+            # not hold a write lock, and deleted afterwards.
+            with transaction.atomic():
+                fixture = self.create_fixture(options['role_counts'])
+            try:
+                for roles in options['role_counts']:
+                    for outcome in ('hit', 'deny'):
+                        for cache in ('cold', 'warm'):
+                            results['scenarios'].append(
+                                self.run_scenario(
+                                    fixture['users'][roles],
+                                    roles,
+                                    outcome,
+                                    cache,
+                                    options['iterations'],
+                                )
+                            )
+            finally:
+                with transaction.atomic():
+                    self.delete_fixture(fixture)
+                self.reset()
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + '\n')
+        self.stdout.write(output)
+
+    def create_fixture(self, role_counts):
+        max_roles = max(role_counts)
+        hit = BusinessElement.objects.create(name=f'{self.prefix}-hit')
+        deny = BusinessElement.objects.create(name=f'{self.prefix}-deny')
+        roles = [
+            Role.objects.create(name=f'{self.prefix}-role-{i}')
+            for i in range(max_roles)
+        ]
+        for i, role in enumerate(roles):
+            for element in (hit, deny):
+                mask = i % 63 + 1
+                if element == hit and role == roles[-1]:
+                    mask = ALL_PERMISSIONS
+                AccessRoleRule.objects.create(
+                    role=role,
+                    element=element,
+                    **{
+                        f'{name}_permission': granted
+                        for name, granted in mask_to_permissions(mask).items()
+                    },
+                )
+
+        users = {}
+        for count in role_counts:
+            user = User.objects.create(
+                email=f'{self.prefix}-{count}@example.com',
+                first_name='Bench',
+                last_name=f'User {count}',
+            )
+            UserRole.objects.bulk_create(
+                UserRole(user=user, role=role) for role in roles[-count:]
+            )
+            users[count] = user
+        sync_bulk_created_users([user.pk for user in users.values()])
+        return {
+            'users': users,
+            'roles': roles,
+            'elements': [hit, deny],
+        }
+
+    def delete_fixture(self, fixture):
+        """Delete the benchmark users, roles and elements with their rules."""
+        User.objects.filter(
+            pk__in=[user.pk for user in fixture['users'].values()]
+        ).delete()
+        Role.objects.filter(
+            pk__in=[role.pk for role in fixture['roles']]
+        ).delete()
+        BusinessElement.objects.filter(
+            pk__in=[element.pk for element in fixture['elements']]
+        ).delete()
+
+    def reset(self):
+        """Drop every cached piece of policy data in this process."""
+        get_cache().clear()
+        element_index.clear()
+        clear_snapshot()
+        expire_policy_version()
+
+    def check_access(self, request, expected_status):
+        response = self.view(request)
+        if response.status_code != expected_status:
+            raise CommandError(
+                f'Expected {expected_status}, got {response.status_code}: '
+                f'{response.data}'
+            )
+
+    def run_scenario(self, user, roles, outcome, cache, iterations):
+        request = self.factory.get(
+            '/api/rbac/access/',
+            {
+                'user_id': str(user.pk),
+                'resource': f'{self.prefix}-{outcome}',
+                'permissions': PERMISSIONS,
+            },
+        )
+        expected_status = (
+            status.HTTP_200_OK
+            if outcome == 'hit'
+            else status.HTTP_403_FORBIDDEN
+        )
+        self.reset()
+        if cache == 'warm':
+            self.check_access(request, expected_status)
+
+        latencies = []
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(iterations):
+                if cache == 'cold':
+                    self.reset()
+                start = time.perf_counter_ns()
+                self.check_access(request, expected_status)
+                latencies.append(time.perf_counter_ns() - start)
+
+        cuts = statistics.quantiles(latencies, n=100)
+        return {
+            'name': f'{cache}-{roles}-roles-{outcome}',
+            'cache': cache,
+            'roles': roles,
+            'outcome': outcome,
+            'checks': iterations,
+            'throughput': round(iterations / (sum(latencies) / 1e9), 1),
+            'latency_ms': {
+                'mean': round(statistics.fmean(latencies) / 1e6, 4),
+                'p50': round(cuts[49] / 1e6, 4),
+                'p95': round(cuts[94] / 1e6, 4),
+                'p99': round(cuts[98] / 1e6, 4),
+            },
+            'queries_per_check': round(
+                len(queries.captured_queries) / iterations, 2
+            ),
+        }
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from rbac.compiled import compiled_policy, write_compiled_policy
+from rbac.models import PolicyVersion
+from rbac.snapshot import PolicySnapshot
+
+
+class Command(BaseCommand):
+    help = (
+        'Compile roles, access rules and user role assignments into a '
+        'binary policy file for the compiled policy backend.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            help='File to write; defaults to RBAC_COMPILED_POLICY_PATH.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['output'] or compiled_policy.get_path()
+        with transaction.atomic():
+            snapshot = PolicySnapshot.from_database(PolicyVersion.current())
+        write_compiled_policy(snapshot, path)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Compiled policy version {snapshot.version} to {path}.'
+            )
+        )
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from rbac.models import PolicyVersion
+from rbac.policy_file import (
+    dump_policy,
+    export_policy,
+    is_yaml_path,
+    publish_file,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Export roles, business elements, access rules and user role '
+        'assignments as a JSON or YAML policy file for the file policy '
+        'backend.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            help='File to write, replaced atomically; defaults to stdout.',
+        )
+        parser.add_argument(
+            '--format',
+            choices=['json', 'yaml'],
+            help='Output format; defaults to the output file extension.',
+        )
+
+    def handle(self, *args, **options):
+        output = options['output']
+        as_yaml = (
+            options['format'] == 'yaml'
+            if options['format']
+            else bool(output) and is_yaml_path(output)
+        )
+        content = dump_policy(export_policy(PolicyVersion.current()), as_yaml)
+        if output:
+            publish_file(output, content.encode())
+        else:
+            self.stdout.write(content, ending='')
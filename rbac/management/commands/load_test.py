@@ -0,0 +1,209 @@
+import asyncio
+import json
+from urllib.parse import urlencode
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+
+from rbac.loadtest import (
+    STACK_COMMANDS,
+    free_port,
+    json_request,
+    run_load,
+    start_server,
+    stop_server,
+)
+from rbac.models import AccessRoleRule, BusinessElement, Role, UserRole
+
+User = get_user_model()
+
+# Element and role created for the run, granting the load test user read
+# access, so the access endpoints measure both outcomes.
+ACCESS_ELEMENT = 'loadtest-document'
+ACCESS_ROLE = 'loadtest-reader'
+
+ENDPOINTS = (
+    'access',
+    'access-deny',
+    'login',
+    'login-async',
+    'roles',
+    'business-elements',
+    'access-rules',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Start the project under its WSGI and ASGI entry points on localhost, '
+        'load its endpoints with an asyncio HTTP client and print latency '
+        'histograms and error rates per stack as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stacks',
+            nargs='+',
+            choices=sorted(STACK_COMMANDS),
+            default=['wsgi', 'asgi'],
+        )
+        parser.add_argument(
+            '--endpoints', nargs='+', choices=ENDPOINTS, default=ENDPOINTS
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=1000,
+            help='Requests per endpoint and stack.',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=32,
+            help='Concurrent keep-alive connections.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Server worker processes.',
+        )
+        parser.add_argument(
+            '--wsgi-command',
+            default=STACK_COMMANDS['wsgi'],
+            help='Server command; {python}, {port} and {workers} are filled '
+            'in. Defaults to gunicorn.',
+        )
+        parser.add_argument(
+            '--asgi-command',
+            default=STACK_COMMANDS['asgi'],
+            help='Server command; {python}, {port} and {workers} are filled '
+            'in. Defaults to uvicorn.',
+        )
+        parser.add_argument('--email', default='loadtest@example.com')
+        parser.add_argument('--password', default='loadtest-password')
+        parser.add_argument('--output', help='Also write the JSON here.')
+
+    def handle(self, *args, **options):
+        user, created = self.get_user(options['email'], options['password'])
+        role, element = self.create_access_policy(user)
+        try:
+            requests = self.build_requests(user, options)
+            results = {
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'workers': options['workers'],
+                'stacks': {
+                    stack: self.run_stack(
+                        options[f'{stack}_command'], requests, options
+                    )
+                    for stack in options['stacks']
+                },
+            }
+        finally:
+            role.delete()
+            element.delete()
+            if created:
+                user.delete()
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + '\n')
+        self.stdout.write(output)
+
+    def get_user(self, email, password):
+        """Return the superuser the load is sent as, creating it if needed."""
+        user = User.objects.filter(email=email).first()
+        if user is None:
+            user = User.objects.create_superuser(
+                email, password, first_name='Load', last_name='Test'
+            )
+            return user, True
+        if not user.is_superuser or not user.check_password(password):
+            raise CommandError(
+                f'{email} exists but is not a superuser with the given '
+                'password.'
+            )
+        return user, False
+
+    @transaction.atomic
+    def create_access_policy(self, user):
+        """Grant the user read access to an element created for the run."""
+        element = BusinessElement.objects.create(name=ACCESS_ELEMENT)
+        role = Role.objects.create(name=ACCESS_ROLE)
+        AccessRoleRule.objects.create(
+            role=role, element=element, read_permission=True
+        )
+        UserRole.objects.create(user=user, role=role)
+        return role, element
+
+    def build_requests(self, user, options):
+        token = Token.objects.get_or_create(user=user)[0].key
+
+        def access(permissions):
+            query = urlencode(
+                {
+                    'user_id': user.pk,
+                    'resource': ACCESS_ELEMENT,
+                    'permissions': permissions,
+                }
+            )
+            return json_request('GET', f'/api/rbac/access/?{query}')
+
+        requests = {
+            'access': access('read'),
+            'access-deny': access('delete'),
+            'login': json_request(
+                'POST',
+                '/api/users/login/',
+                {'email': options['email'], 'password': options['password']},
+            ),
+            'login-async': json_request(
+                'POST',
+                '/api/users/login/async/',
+                {'email': options['email'], 'password': options['password']},
+            ),
+            'roles': json_request('GET', '/api/rbac/roles/', token=token),
+            'business-elements': json_request(
+                'GET', '/api/rbac/business-elements/', token=token
+            ),
+            'access-rules': json_request(
+                'GET', '/api/rbac/access-rules/', token=token
+            ),
+        }
+        return {name: requests[name] for name in options['endpoints']}
+
+    def run_stack(self, command, requests, options):
+        port = free_port()
+        try:
+            process = start_server(command, port, options['workers'])
+        except (OSError, RuntimeError) as e:
+            raise CommandError(f'Could not start the server: {e}') from e
+        try:
+            results = {}
+            for name, request in requests.items():
+                # Warm up connections, workers and caches first.
+                asyncio.run(
+                    run_load(
+                        '127.0.0.1',
+                        port,
+                        request,
+                        options['concurrency'],
+                        options['concurrency'],
+                    )
+                )
+                results[name] = asyncio.run(
+                    run_load(
+                        '127.0.0.1',
+                        port,
+                        request,
+                        options['requests'],
+                        options['concurrency'],
+                    )
+                )
+            return results
+        finally:
+            stop_server(process)
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rbac.cache import bump_policy_version
+from rbac.services import (
+    find_inconsistent_effective_permissions,
+    refresh_effective_permissions,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the user effective permission table from access rules, '
+        'or check it for consistency with --check.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only compare stored rows with a live recomputation.',
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            inconsistent = find_inconsistent_effective_permissions()
+            for user_id, element_id in inconsistent:
+                self.stdout.write(f'user={user_id} element={element_id}')
+            if inconsistent:
+                raise CommandError(
+                    f'{len(inconsistent)} effective permission rows are '
+                    'out of date.'
+                )
+            self.stdout.write(
+                self.style.SUCCESS('Effective permissions are consistent.')
+            )
+            return
+
+        refresh_effective_permissions()
+        bump_policy_version()
+        self.stdout.write(self.style.SUCCESS('Effective permissions rebuilt.'))
@@ -0,0 +1,177 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+
+from rbac.cache import bump_policy_version
+from rbac.models import (
+    PERMISSIONS,
+    AccessRoleRule,
+    BusinessElement,
+    Role,
+    UserRole,
+    mask_to_permissions,
+)
+from rbac.services import sync_bulk_created_users
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a large synthetic policy of users, roles, business '
+        'elements, access rules and role assignments for load testing.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--roles', type=int, default=50)
+        parser.add_argument('--elements', type=int, default=100)
+        parser.add_argument(
+            '--roles-per-user',
+            type=int,
+            default=3,
+            help='Number of distinct roles assigned to every user.',
+        )
+        parser.add_argument(
+            '--rule-density',
+            type=float,
+            default=0.1,
+            help='Fraction of (role, element) pairs that get a rule.',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed; also part of generated names and e-mails.',
+        )
+        parser.add_argument(
+            '--password',
+            default='password',
+            help='Password of every generated user, hashed only once.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Rows per bulk_create() batch and users per transaction.',
+        )
+        parser.add_argument(
+            '--skip-effective-permissions',
+            action='store_true',
+            help=(
+                'Do not fill the effective permission table, which takes '
+                'most of the time; run rebuild_effective_permissions later '
+                'before using the database policy backend.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if options['roles_per_user'] > options['roles']:
+            raise CommandError('--roles-per-user cannot exceed --roles.')
+        if not 0 <= options['rule_density'] <= 1:
+            raise CommandError('--rule-density must be between 0 and 1.')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1.')
+
+        self.rng = random.Random(options['seed'])
+        self.prefix = f'synthetic{options["seed"]}'
+        self.chunk_size = options['chunk_size']
+        self.refresh = not options['skip_effective_permissions']
+        try:
+            with transaction.atomic():
+                roles = self.create_roles(options['roles'])
+                elements = self.create_elements(options['elements'])
+                rules = self.create_rules(
+                    roles, elements, options['rule_density']
+                )
+                bump_policy_version(elements=True)
+            assignments = self.create_users(
+                options['users'],
+                roles,
+                options['roles_per_user'],
+                options['password'],
+            )
+        except IntegrityError as e:
+            raise CommandError(
+                f'{e}. Use another --seed or an empty database.'
+            ) from e
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Created {options["users"]} users, {len(roles)} roles, '
+                f'{len(elements)} elements, {rules} rules and '
+                f'{assignments} role assignments.'
+            )
+        )
+
+    def create_roles(self, count):
+        return Role.objects.bulk_create(
+            (Role(name=f'{self.prefix}-role-{i}') for i in range(count)),
+            batch_size=self.chunk_size,
+        )
+
+    def create_elements(self, count):
+        return BusinessElement.objects.bulk_create(
+            (
+                BusinessElement(name=f'{self.prefix}-element-{i}')
+                for i in range(count)
+            ),
+            batch_size=self.chunk_size,
+        )
+
+    def create_rules(self, roles, elements, density):
+        rules = []
+        for role in roles:
+            for element in elements:
+                if self.rng.random() >= density:
+                    continue
+                mask = self.rng.randrange(1, 1 << len(PERMISSIONS))
+                rules.append(
+                    AccessRoleRule(
+                        role=role,
+                        element=element,
+                        permissions_mask=mask,
+                        **{
+                            f'{name}_permission': granted
+                            for name, granted in mask_to_permissions(
+                                mask
+                            ).items()
+                        },
+                    )
+                )
+        AccessRoleRule.objects.bulk_create(rules, batch_size=self.chunk_size)
+        return len(rules)
+
+    def create_users(self, count, roles, roles_per_user, password):
+        password = make_password(password)
+        role_ids = [role.pk for role in roles]
+        assignments = 0
+        for start in range(0, count, self.chunk_size):
+            # One transaction per chunk, so the database is not locked for
+            # the whole run.
+            with transaction.atomic():
+                users = User.objects.bulk_create(
+                    User(
+                        email=f'{self.prefix}-user-{i}@example.com',
+                        first_name='Synthetic',
+                        last_name=f'User {i}',
+                        password=password,
+                    )
+                    for i in range(start, min(start + self.chunk_size, count))
+                )
+                user_roles = [
+                    UserRole(user_id=user.pk, role_id=role_id)
+                    for user in users
+                    for role_id in self.rng.sample(role_ids, roles_per_user)
+                ]
+                UserRole.objects.bulk_create(
+                    user_roles, batch_size=self.chunk_size
+                )
+                sync_bulk_created_users(
+                    [user.pk for user in users], refresh=self.refresh
+                )
+                assignments += len(user_roles)
+        return assignments
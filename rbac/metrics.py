@@ -0,0 +1,263 @@
+import threading
+from bisect import bisect_left
+
+from .timing import phase_histogram
+
+# Upper bounds of the histogram buckets; the last bucket counts everything
+# larger.
+DURATION_BOUNDS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+QUERY_COUNT_BOUNDS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# name: (type, help) of every exported metric family.
+FAMILIES = {
+    'rbac_http_requests_total': (
+        'counter',
+        'HTTP requests by view, method and status code.',
+    ),
+    'rbac_http_request_duration_seconds': (
+        'histogram',
+        'HTTP request duration by view.',
+    ),
+    'rbac_db_queries_per_request': (
+        'histogram',
+        'SQL queries run per HTTP request by view.',
+    ),
+    'rbac_access_decisions_total': (
+        'counter',
+        'Access check decisions by business element and outcome.',
+    ),
+    'rbac_access_cache_requests_total': (
+        'counter',
+        'Access decision cache lookups by result.',
+    ),
+    'rbac_access_phase_duration_seconds': (
+        'histogram',
+        'Access check phase duration (requires RBAC_ACCESS_TIMING).',
+    ),
+}
+
+
+def _add_shard(totals, shard):
+    """Add the counters and histograms of shard to totals in place."""
+    # Copying a dict is atomic under the GIL, so a shard may be read while
+    # its thread keeps updating it.
+    for key, value in shard.copy().items():
+        total = totals.get(key)
+        if isinstance(value, list):
+            totals[key] = (
+                list(value)
+                if total is None
+                else [a + b for a, b in zip(total, value)]
+            )
+        else:
+            totals[key] = value + (total or 0)
+
+
+class Metrics:
+    """In-process counters and histograms, sharded per thread.
+
+    Every thread updates its own shard without locking; a lock is only
+    taken when a thread creates its shard. collect() adds the shards up,
+    so counts from all threads are aggregated. The shards of finished
+    threads are folded into a retired total, so a server that starts a
+    thread per connection does not accumulate them.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # [(thread, shard)] of threads that may still be running.
+        self._shards = []
+        # Sum of the shards of finished threads.
+        self._retired = {}
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._retire_finished()
+                self._shards.append((threading.current_thread(), shard))
+            return shard
+
+    def _retire_finished(self):
+        """Fold the shards of finished threads; the lock must be held."""
+        running = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                running.append((thread, shard))
+            else:
+                _add_shard(self._retired, shard)
+        self._shards = running
+
+    def inc(self, name, labels=(), value=1):
+        """Add value to a counter; labels is a tuple of (name, value)."""
+        shard = self._shard()
+        key = (name, labels)
+        shard[key] = shard.get(key, 0) + value
+
+    def observe(self, name, labels, value, bounds):
+        """Record value in a histogram with the given bucket bounds."""
+        shard = self._shard()
+        key = (name, labels)
+        counts = shard.get(key)
+        if counts is None:
+            # [bucket counts..., count, sum]
+            counts = shard[key] = [0] * (len(bounds) + 3)
+        counts[bisect_left(bounds, value)] += 1
+        counts[-2] += 1
+        counts[-1] += value
+
+    def collect(self):
+        """Return {(name, labels): value} summed over all threads.
+
+        Histogram values are lists of bucket counts, count and sum.
+        """
+        totals = {}
+        with self._lock:
+            self._retire_finished()
+            _add_shard(totals, self._retired)
+            shards = [shard for thread, shard in self._shards]
+        for shard in shards:
+            _add_shard(totals, shard)
+        return totals
+
+    def clear(self):
+        with self._lock:
+            self._retired.clear()
+            for thread, shard in self._shards:
+                shard.clear()
+
+
+metrics = Metrics()
+
+
+def record_request(view, method, status_code, duration, queries):
+    """Record a served HTTP request."""
+    labels = (('view', view),)
+    metrics.inc(
+        'rbac_http_requests_total',
+        (*labels, ('method', method), ('status', str(status_code))),
+    )
+    metrics.observe(
+        'rbac_http_request_duration_seconds',
+        labels,
+        duration,
+        DURATION_BOUNDS,
+    )
+    metrics.observe(
+        'rbac_db_queries_per_request', labels, queries, QUERY_COUNT_BOUNDS
+    )
+
+
+def record_decision(element, decision):
+    """Record an access check decision on a business element name."""
+    metrics.inc(
+        'rbac_access_decisions_total',
+        (('element', element), ('decision', decision)),
+    )
+
+
+def record_cache_lookups(hits, misses):
+    """Record access decision cache hits and misses."""
+    if hits:
+        metrics.inc(
+            'rbac_access_cache_requests_total', (('result', 'hit'),), hits
+        )
+    if misses:
+        metrics.inc(
+            'rbac_access_cache_requests_total', (('result', 'miss'),), misses
+        )
+
+
+def _escape(value):
+    return (
+        str(value)
+        .replace('\\', r'\\')
+        .replace('\n', r'\n')
+        .replace('"', r'\"')
+    )
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in labels)
+    return f'{{{pairs}}}'
+
+
+def _format_number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def _histogram_lines(name, labels, counts, bounds):
+    cumulative = 0
+    for bound, count in zip((*bounds, '+Inf'), counts[:-2]):
+        cumulative += count
+        bucket_labels = (*labels, ('le', bound))
+        yield f'{name}_bucket{_format_labels(bucket_labels)} {cumulative}'
+    yield f'{name}_count{_format_labels(labels)} {counts[-2]}'
+    yield f'{name}_sum{_format_labels(labels)} {_format_number(counts[-1])}'
+
+
+def _phase_samples():
+    """Convert the access check phase histogram to seconds."""
+    for name, data in phase_histogram.snapshot().items():
+        bounds = tuple(
+            float(bound) / 1000 for bound in data['buckets'] if bound != '+Inf'
+        )
+        counts = [
+            *data['buckets'].values(),
+            data['count'],
+            data['sum_ms'] / 1000,
+        ]
+        yield (('phase', name),), counts, bounds
+
+
+def render_metrics():
+    """Render all metrics in the Prometheus text exposition format."""
+    samples = {}
+    for (name, labels), value in sorted(metrics.collect().items()):
+        samples.setdefault(name, []).append((labels, value))
+
+    bounds = {
+        'rbac_http_request_duration_seconds': DURATION_BOUNDS,
+        'rbac_db_queries_per_request': QUERY_COUNT_BOUNDS,
+    }
+    lines = []
+    for name, (kind, help_text) in FAMILIES.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if name == 'rbac_access_phase_duration_seconds':
+            for labels, counts, phase_bounds in _phase_samples():
+                lines.extend(
+                    _histogram_lines(name, labels, counts, phase_bounds)
+                )
+            continue
+        for labels, value in samples.get(name, ()):
+            if kind == 'histogram':
+                lines.extend(
+                    _histogram_lines(name, labels, value, bounds[name])
+                )
+            else:
+                lines.append(
+                    f'{name}{_format_labels(labels)} {_format_number(value)}'
+                )
+    return '\n'.join(lines) + '\n'
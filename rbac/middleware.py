@@ -0,0 +1,81 @@
+import contextvars
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .metrics import record_request
+
+_query_count = contextvars.ContextVar('rbac_query_count', default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    """Database execute wrapper counting queries of the current request.
+
+    Requests are tracked in a context variable rather than per connection,
+    so queries that async views run in other threads are counted too.
+    """
+    counter = _query_count.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+def install_query_counter(connection, **kwargs):
+    """Add count_query() to a connection's execute wrappers once.
+
+    Connected to the connection_created signal, so every connection opened
+    by any thread is instrumented.
+    """
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+class MetricsMiddleware:
+    """Record the count, duration and SQL queries of every request.
+
+    Requests are labelled with the namespaced name of the URL pattern they
+    matched, or '<unmatched>'.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        counter = [0]
+        token = _query_count.set(counter)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _query_count.reset(token)
+        self.record(request, response, time.perf_counter() - start, counter)
+        return response
+
+    async def __acall__(self, request):
+        counter = [0]
+        token = _query_count.set(counter)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _query_count.reset(token)
+        self.record(request, response, time.perf_counter() - start, counter)
+        return response
+
+    def record(self, request, response, duration, counter):
+        match = getattr(request, 'resolver_match', None)
+        record_request(
+            match.view_name if match else '<unmatched>',
+            request.method,
+            response.status_code,
+            duration,
+            counter[0],
+        )
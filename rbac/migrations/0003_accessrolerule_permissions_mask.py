@@ -0,0 +1,44 @@
+# Generated by Django 6.1.2 on 2026-10-17 23:17
+
+from django.db import migrations, models
+
+PERMISSIONS = (
+    'read',
+    'read_all',
+    'create',
+    'update',
+    'update_all',
+    'delete',
+    'delete_all',
+)
+
+
+def fill_permissions_mask(apps, schema_editor):
+    AccessRoleRule = apps.get_model('rbac', 'AccessRoleRule')
+    rules = AccessRoleRule.objects.all()
+    for rule in rules:
+        rule.permissions_mask = sum(
+            1 << i
+            for i, perm in enumerate(PERMISSIONS)
+            if getattr(rule, perm + '_permission')
+        )
+    AccessRoleRule.objects.bulk_update(
+        rules, ['permissions_mask'], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('rbac', '0002_userrole'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='accessrolerule',
+            name='permissions_mask',
+            field=models.PositiveSmallIntegerField(
+                default=0, editable=False, verbose_name='Маска прав'
+            ),
+        ),
+        migrations.RunPython(fill_permissions_mask, migrations.RunPython.noop),
+    ]
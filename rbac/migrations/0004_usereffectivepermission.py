@@ -0,0 +1,92 @@
+# Generated by Django 6.1.2 on 2026-10-17 23:23
+
+import django.db.models.deletion
+import uuid
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_effective_permissions(apps, schema_editor):
+    AccessRoleRule = apps.get_model('rbac', 'AccessRoleRule')
+    UserEffectivePermission = apps.get_model('rbac', 'UserEffectivePermission')
+    grants = {}
+    rules = AccessRoleRule.objects.filter(
+        role__userrole__isnull=False
+    ).values_list('role__userrole__user_id', 'element_id', 'permissions_mask')
+    for user_id, element_id, mask in rules:
+        grants.setdefault((user_id, element_id), set()).add(mask)
+    UserEffectivePermission.objects.bulk_create(
+        (
+            UserEffectivePermission(
+                user_id=user_id,
+                element_id=element_id,
+                permissions_mask=reduce(or_, masks, 0),
+                grants=sorted(masks),
+            )
+            for (user_id, element_id), masks in grants.items()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('rbac', '0003_accessrolerule_permissions_mask'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserEffectivePermission',
+            fields=[
+                (
+                    'id',
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    'permissions_mask',
+                    models.PositiveSmallIntegerField(
+                        default=0, verbose_name='Маска прав'
+                    ),
+                ),
+                (
+                    'grants',
+                    models.JSONField(
+                        default=list, verbose_name='Маски прав ролей'
+                    ),
+                ),
+                (
+                    'element',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to='rbac.businesselement',
+                        verbose_name='Бизнес-элемент',
+                    ),
+                ),
+                (
+                    'user',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name='Пользователь',
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'Эффективные права пользователя',
+                'verbose_name_plural': 'Эффективные права пользователей',
+                'unique_together': {('user', 'element')},
+            },
+        ),
+        migrations.RunPython(
+            populate_effective_permissions, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 6.1.2 on 2026-10-17 23:29
+
+from django.db import migrations, models
+
+
+def create_policy_version(apps, schema_editor):
+    PolicyVersion = apps.get_model('rbac', 'PolicyVersion')
+    PolicyVersion.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('rbac', '0004_usereffectivepermission'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PolicyVersion',
+            fields=[
+                (
+                    'id',
+                    models.PositiveSmallIntegerField(
+                        default=1,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    'version',
+                    models.PositiveBigIntegerField(
+                        default=0, verbose_name='Версия'
+                    ),
+                ),
+                (
+                    'updated_at',
+                    models.DateTimeField(
+                        auto_now=True, verbose_name='Дата обновления'
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'Версия политики',
+                'verbose_name_plural': 'Версии политики',
+            },
+        ),
+        migrations.RunPython(create_policy_version, migrations.RunPython.noop),
+    ]
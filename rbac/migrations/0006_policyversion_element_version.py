@@ -0,0 +1,19 @@
+# Generated by Django 6.1.2 on 2026-10-18 03:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('rbac', '0005_policyversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='policyversion',
+            name='element_version',
+            field=models.PositiveBigIntegerField(
+                default=0, verbose_name='Версия элементов'
+            ),
+        ),
+    ]
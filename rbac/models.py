@@ -1,8 +1,158 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+import time
 import uuid
 
+PERMISSIONS = (
+    'read',
+    'read_all',
+    'create',
+    'update',
+    'update_all',
+    'delete',
+    'delete_all',
+)
 
-class Role(models.Model):
+# Bit assigned to each permission in AccessRoleRule.permissions_mask.
+PERMISSION_BITS = {perm: 1 << i for i, perm in enumerate(PERMISSIONS)}
+
+
+def permissions_to_mask(permissions):
+    """Encode permission names as a bitmask.
+
+    Returns None if any of the names is not a known permission.
+    """
+    mask = 0
+    for perm in permissions:
+        try:
+            mask |= PERMISSION_BITS[perm]
+        except KeyError:
+            return None
+    return mask
+
+
+def mask_to_permissions(mask):
+    """Decode a bitmask into a dict of permission name to boolean."""
+    return {perm: bool(mask & bit) for perm, bit in PERMISSION_BITS.items()}
+
+
+class PolicyVersion(models.Model):
+    """Single-row counter of changes to the RBAC policy.
+
+    Bumped on every write to roles, business elements, access rules and
+    user role assignments, so caches can detect stale entries with one
+    cheap read. element_version is only bumped by writes to business
+    elements, for caches of the element catalogue.
+    """
+
+    id = models.PositiveSmallIntegerField(
+        primary_key=True, default=1, editable=False
+    )
+    version = models.PositiveBigIntegerField('Версия', default=0)
+    element_version = models.PositiveBigIntegerField(
+        'Версия элементов', default=0
+    )
+    updated_at = models.DateTimeField('Дата обновления', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Версия политики'
+        verbose_name_plural = 'Версии политики'
+
+    def __str__(self):
+        return str(self.version)
+
+    @classmethod
+    def current(cls):
+        """Return the current policy version."""
+        version = (
+            cls.objects.filter(pk=1).values_list('version', flat=True).first()
+        )
+        return version or 0
+
+    @classmethod
+    async def acurrent(cls):
+        """Async version of current()."""
+        version = (
+            await cls.objects.filter(pk=1)
+            .values_list('version', flat=True)
+            .afirst()
+        )
+        return version or 0
+
+    @classmethod
+    def current_versions(cls):
+        """Return the current (policy version, element version) pair."""
+        versions = (
+            cls.objects.filter(pk=1)
+            .values_list('version', 'element_version')
+            .first()
+        )
+        return versions or (0, 0)
+
+    @classmethod
+    async def acurrent_versions(cls):
+        """Async version of current_versions()."""
+        versions = (
+            await cls.objects.filter(pk=1)
+            .values_list('version', 'element_version')
+            .afirst()
+        )
+        return versions or (0, 0)
+
+    @classmethod
+    def bump(cls, elements=False):
+        """Increase the policy version, and the element version if asked.
+
+        The new versions are at least the current time in nanoseconds, so
+        a version number seen inside a rolled back transaction is never
+        reused by a later commit.
+        """
+        floor = time.time_ns()
+        fields = ['version', 'element_version'] if elements else ['version']
+        updated = cls.objects.filter(pk=1).update(
+            **{
+                field: Greatest(F(field) + 1, Value(floor)) for field in fields
+            },
+            updated_at=timezone.now(),
+        )
+        if not updated:
+            cls.objects.get_or_create(
+                pk=1, defaults=dict.fromkeys(fields, floor)
+            )
+
+
+class PolicyModel(models.Model):
+    """Base class for models that make up the RBAC policy.
+
+    Saves run in a transaction together with their post_save handlers, so
+    the policy version bump commits atomically with the write.
+    """
+
+    # Fields whose values as loaded from the database are kept in
+    # _loaded_values, so signal handlers can tell what a save changed.
+    tracked_fields = ()
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values, *args, **kwargs):
+        instance = super().from_db(db, field_names, values, *args, **kwargs)
+        instance._loaded_values = {
+            name: value
+            for name, value in zip(field_names, values)
+            if name in cls.tracked_fields
+        }
+        return instance
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+
+class Role(PolicyModel):
     """Role model for RBAC system.
 
     Represents a user role that can be assigned permissions for various
@@ -28,7 +178,7 @@ class Role(models.Model):
         return self.name
 
 
-class BusinessElement(models.Model):
+class BusinessElement(PolicyModel):
     """Business element model for RBAC system.
 
     Represents a resource or object in the system that can have access
@@ -54,7 +204,7 @@ class BusinessElement(models.Model):
         return self.name
 
 
-class AccessRoleRule(models.Model):
+class AccessRoleRule(PolicyModel):
     """Access rule model defining permissions for a role on a business element.
 
     Defines the specific permissions that a role has for a particular
@@ -84,6 +234,11 @@ class AccessRoleRule(models.Model):
     delete_all_permission = models.BooleanField(
         'Удаление (все)', default=False
     )
+    permissions_mask = models.PositiveSmallIntegerField(
+        'Маска прав', default=0, editable=False
+    )
+
+    tracked_fields = ('role_id', 'element_id')
 
     class Meta:
         unique_together = ('role', 'element')
@@ -93,8 +248,18 @@ class AccessRoleRule(models.Model):
     def __str__(self):
         return f'{self.role.name} - {self.element.name}'
 
+    def save(self, *args, **kwargs):
+        """Keep permissions_mask in sync with the permission fields."""
+        self.permissions_mask = permissions_to_mask(
+            perm for perm in PERMISSIONS if getattr(self, perm + '_permission')
+        )
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'permissions_mask'}
+        super().save(*args, **kwargs)
+
 
-class UserRole(models.Model):
+class UserRole(PolicyModel):
     """User-Role association for RBAC system.
 
     Links users to roles they are assigned to.
@@ -113,6 +278,8 @@ class UserRole(models.Model):
     )
     created_at = models.DateTimeField('Дата создания', auto_now_add=True)
 
+    tracked_fields = ('user_id',)
+
     class Meta:
         unique_together = ('user', 'role')
         verbose_name = 'Роль пользователя'
@@ -120,3 +287,35 @@ class UserRole(models.Model):
 
     def __str__(self):
         return f'{self.user} - {self.role}'
+
+
+class UserEffectivePermission(models.Model):
+    """Denormalized permissions of a user on a business element.
+
+    Combines the access rules of all the user's roles for the element and
+    is maintained incrementally whenever user roles or access rules change.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        'users.User',
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+    )
+    element = models.ForeignKey(
+        BusinessElement,
+        on_delete=models.CASCADE,
+        verbose_name='Бизнес-элемент',
+    )
+    permissions_mask = models.PositiveSmallIntegerField(
+        'Маска прав', default=0
+    )
+    grants = models.JSONField('Маски прав ролей', default=list)
+
+    class Meta:
+        unique_together = ('user', 'element')
+        verbose_name = 'Эффективные права пользователя'
+        verbose_name_plural = 'Эффективные права пользователей'
+
+    def __str__(self):
+        return f'{self.user} - {self.element}'
@@ -0,0 +1,279 @@
+import json
+import logging
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+
+from .models import (
+    AccessRoleRule,
+    BusinessElement,
+    Role,
+    UserRole,
+    mask_to_permissions,
+    permissions_to_mask,
+)
+from .serializers import BusinessElementSerializer
+from .snapshot import PolicySnapshot
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+User = get_user_model()
+
+logger = logging.getLogger(__name__)
+
+YAML_EXTENSIONS = ('.yaml', '.yml')
+
+
+class PolicyFileWatcher:
+    """Keep a policy loaded from a file, reloading it when it changes.
+
+    The file is checked at most once per RBAC_POLICY_VERSION_CHECK_INTERVAL
+    milliseconds with a single stat() call; a different inode, size or
+    modification time loads it again. If the file disappears, or a changed
+    file cannot be loaded, the policy loaded last keeps being served and
+    the error is logged once per change of the file.
+    """
+
+    def __init__(self, setting, load, command):
+        # load(path) returns the policy, raising OSError or ValueError if
+        # the file cannot be read.
+        self.setting = setting
+        self.load = load
+        self.command = command
+        # (policy, stat of its file, monotonic time of the last check),
+        # replaced as a whole.
+        self._loaded = (None, None, 0.0)
+
+    def get_path(self):
+        """Return the path named by the watcher's setting."""
+        path = getattr(settings, self.setting, None)
+        if not path:
+            raise ImproperlyConfigured(
+                f'{self.setting} must be set to use this policy backend.'
+            )
+        return path
+
+    def get(self):
+        """Return the loaded policy, reloading the file if it changed."""
+        policy, file_stat, checked_at = self._loaded
+        interval = (
+            getattr(settings, 'RBAC_POLICY_VERSION_CHECK_INTERVAL', 1000)
+            / 1000
+        )
+        if policy is not None and time.monotonic() - checked_at < interval:
+            return policy
+
+        path = self.get_path()
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            if policy is None:
+                raise ImproperlyConfigured(
+                    f'Policy file {path} does not exist. Run manage.py '
+                    f'{self.command}.'
+                ) from None
+            current = file_stat
+        else:
+            current = (
+                stat.st_dev,
+                stat.st_ino,
+                stat.st_mtime_ns,
+                stat.st_size,
+            )
+        if policy is None or current != file_stat:
+            try:
+                policy = self.load(path)
+            except (OSError, ValueError):
+                if policy is None:
+                    raise
+                # Recording the new stat below keeps a broken file from
+                # being parsed again on every check.
+                logger.exception(
+                    'Cannot reload policy file %s; serving the policy '
+                    'loaded before.',
+                    path,
+                )
+        self._loaded = (policy, current, time.monotonic())
+        return policy
+
+    def clear(self):
+        """Drop the loaded policy so the next access loads the file."""
+        self._loaded = (None, None, 0.0)
+
+
+def is_yaml_path(path):
+    """Return True if the path has a YAML file extension."""
+    return str(path).endswith(YAML_EXTENSIONS)
+
+
+def read_policy(path):
+    """Parse a JSON or YAML policy file, chosen by its extension.
+
+    Raises ValueError if the file is not valid JSON or YAML.
+    """
+    with open(path, encoding='utf-8') as file:
+        if not is_yaml_path(path):
+            return json.load(file)
+        if yaml is None:
+            raise ImproperlyConfigured('PyYAML is required for YAML policies.')
+        try:
+            return yaml.safe_load(file)
+        except yaml.YAMLError as e:
+            raise ValueError(f'Invalid YAML policy: {e}') from e
+
+
+def snapshot_from_policy(data):
+    """Build a PolicySnapshot from a parsed policy document.
+
+    Raises ValueError if the document refers to unknown roles, elements
+    or permissions.
+    """
+    element_numbers = {}
+    element_payloads = []
+    for element in data.get('elements', []):
+        element_numbers[element['name']] = len(element_payloads)
+        element_payloads.append(
+            {
+                'id': element.get('id'),
+                'name': element['name'],
+                'description': element.get('description'),
+                'created_at': element.get('created_at'),
+                'updated_at': element.get('updated_at'),
+            }
+        )
+
+    role_numbers = {}
+    role_masks = []
+    for role in data.get('roles', []):
+        masks = {}
+        for element_name, permissions in role.get('rules', {}).items():
+            if element_name not in element_numbers:
+                raise ValueError(f'Unknown element {element_name!r}.')
+            mask = permissions_to_mask(permissions)
+            if mask is None:
+                raise ValueError(f'Unknown permission in {permissions!r}.')
+            masks[element_numbers[element_name]] = mask
+        role_numbers[role['name']] = len(role_masks)
+        role_masks.append(masks)
+
+    active_users = set()
+    user_roles = {}
+    for user in data.get('users', []):
+        if not user.get('is_active', True):
+            continue
+        active_users.add(user['id'])
+        roles = []
+        for role_name in user.get('roles', []):
+            if role_name not in role_numbers:
+                raise ValueError(f'Unknown role {role_name!r}.')
+            roles.append(role_numbers[role_name])
+        user_roles[user['id']] = tuple(roles)
+
+    return PolicySnapshot(
+        version=data.get('version', 0),
+        active_users=frozenset(active_users),
+        user_roles=user_roles,
+        role_masks=tuple(role_masks),
+        element_numbers=element_numbers,
+        element_payloads=tuple(element_payloads),
+    )
+
+
+def load_policy_file(path):
+    """Read a policy file into a PolicySnapshot.
+
+    Raises ValueError if the file is not a valid policy document.
+    """
+    data = read_policy(path)
+    try:
+        return snapshot_from_policy(data)
+    except (AttributeError, KeyError, TypeError) as e:
+        raise ValueError(f'Malformed policy document: {e!r}') from e
+
+
+def export_policy(version):
+    """Dump the database policy as a policy document."""
+    rules = {}
+    for role_name, element_name, mask in AccessRoleRule.objects.values_list(
+        'role__name', 'element__name', 'permissions_mask'
+    ):
+        rules.setdefault(role_name, {})[element_name] = [
+            name
+            for name, granted in mask_to_permissions(mask).items()
+            if granted
+        ]
+
+    user_roles = {}
+    for user_id, role_name in UserRole.objects.values_list(
+        'user_id', 'role__name'
+    ).order_by('role__name'):
+        user_roles.setdefault(user_id, []).append(role_name)
+
+    return {
+        'version': version,
+        'elements': [
+            dict(BusinessElementSerializer(element).data)
+            for element in BusinessElement.objects.order_by('name')
+        ],
+        'roles': [
+            {
+                'name': name,
+                'description': description,
+                'rules': rules.get(name, {}),
+            }
+            for name, description in Role.objects.order_by('name').values_list(
+                'name', 'description'
+            )
+        ],
+        'users': [
+            {
+                'id': user_id,
+                'email': email,
+                'is_active': is_active,
+                'roles': user_roles.get(user_id, []),
+            }
+            for user_id, email, is_active in User.objects.order_by(
+                'id'
+            ).values_list('id', 'email', 'is_active')
+        ],
+    }
+
+
+def dump_policy(data, as_yaml=False):
+    """Serialize a policy document as YAML or JSON text."""
+    if as_yaml:
+        if yaml is None:
+            raise ImproperlyConfigured('PyYAML is required for YAML policies.')
+        return yaml.safe_dump(data, allow_unicode=True, sort_keys=False)
+    return json.dumps(data, ensure_ascii=False, indent=2) + '\n'
+
+
+def publish_file(path, content):
+    """Write bytes to path, atomically replacing the existing file.
+
+    Watchers polling the path see either the old or the new file, never
+    a partially written one.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(content)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+policy_file = PolicyFileWatcher(
+    'RBAC_POLICY_FILE_PATH', load_policy_file, 'export_policy'
+)
@@ -34,4 +34,5 @@ class AccessRoleRuleSerializer(serializers.ModelSerializer):
             'update_all_permission',
             'delete_permission',
             'delete_all_permission',
+            'permissions_mask',
         ]
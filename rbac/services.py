@@ -0,0 +1,498 @@
+from collections import defaultdict, namedtuple
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db import transaction
+from rest_framework import status
+
+from .cache import (
+    aget_policy_version,
+    bump_policy_version,
+    element_index,
+    forget_missing_users,
+    get_cache,
+    get_policy_version,
+    make_key,
+)
+from .compiled import compiled_policy
+from .metrics import record_cache_lookups, record_decision
+from .models import (
+    AccessRoleRule,
+    UserEffectivePermission,
+    mask_to_permissions,
+    permissions_to_mask,
+)
+from .policy_file import policy_file
+from .snapshot import aget_snapshot, get_snapshot
+from .timing import phase
+
+User = get_user_model()
+
+# user_active: whether the user exists and is active.
+# element: serialized business element, or None if it does not exist.
+# grants: the distinct permission masks of the user's roles on the element.
+AccessEntry = namedtuple('AccessEntry', ['user_active', 'element', 'grants'])
+
+
+def parse_permissions(permissions_str):
+    """Parse a comma-separated permissions string into a bitmask.
+
+    Returns None if the string names an unknown permission.
+    """
+    return permissions_to_mask(
+        p.strip() for p in permissions_str.split(',') if p.strip()
+    )
+
+
+def _parse_user_id(user_id):
+    """Convert a user id to the primary key type, or None if invalid."""
+    try:
+        return User._meta.pk.to_python(user_id)
+    except ValidationError:
+        return None
+
+
+def compute_effective_permissions(user_ids=None, element_ids=None):
+    """Compute role permission masks per (user id, element id) from rules.
+
+    Only the given users and elements are considered; None means all.
+    """
+    filters = {'role__userrole__isnull': False}
+    if user_ids is not None:
+        filters['role__userrole__user_id__in'] = user_ids
+    if element_ids is not None:
+        filters['element_id__in'] = element_ids
+    rules = AccessRoleRule.objects.filter(**filters).values_list(
+        'role__userrole__user_id', 'element_id', 'permissions_mask'
+    )
+    grants = defaultdict(set)
+    for user_pk, element_id, mask in rules:
+        grants[user_pk, element_id].add(mask)
+    return grants
+
+
+def _stored_effective_permissions(user_ids=None, element_ids=None):
+    rows = UserEffectivePermission.objects.all()
+    if user_ids is not None:
+        rows = rows.filter(user_id__in=user_ids)
+    if element_ids is not None:
+        rows = rows.filter(element_id__in=element_ids)
+    return rows
+
+
+def refresh_effective_permissions(user_ids=None, element_ids=None):
+    """Bring stored effective permissions in line with the access rules.
+
+    Only rows of the given users and elements are touched; None means all.
+    """
+    desired = compute_effective_permissions(user_ids, element_ids)
+    with transaction.atomic():
+        stale = []
+        changed = []
+        for row in _stored_effective_permissions(user_ids, element_ids):
+            masks = desired.pop((row.user_id, row.element_id), None)
+            if masks is None:
+                stale.append(row.pk)
+            elif row.grants != sorted(masks):
+                row.grants = sorted(masks)
+                row.permissions_mask = reduce(or_, masks, 0)
+                changed.append(row)
+        if stale:
+            UserEffectivePermission.objects.filter(pk__in=stale).delete()
+        UserEffectivePermission.objects.bulk_update(
+            changed, ['grants', 'permissions_mask'], batch_size=1000
+        )
+        UserEffectivePermission.objects.bulk_create(
+            (
+                UserEffectivePermission(
+                    user_id=user_pk,
+                    element_id=element_id,
+                    permissions_mask=reduce(or_, masks, 0),
+                    grants=sorted(masks),
+                )
+                for (user_pk, element_id), masks in desired.items()
+            ),
+            batch_size=1000,
+        )
+
+
+def sync_bulk_created_users(user_ids, assigned_roles=True, refresh=True):
+    """Update derived policy data after users were created with bulk_create().
+
+    bulk_create() does not send the signals that fill the effective
+    permission table and invalidate cached decisions, so callers that
+    bulk-create users or their role assignments call this instead.
+    assigned_roles is False when the users got no roles, in which case only
+    their negative cache entries are dropped. refresh=False leaves the
+    effective permission table for rebuild_effective_permissions.
+    """
+    if not assigned_roles:
+        forget_missing_users(user_ids)
+        return
+    if refresh:
+        refresh_effective_permissions(user_ids=user_ids)
+    bump_policy_version()
+
+
+def find_inconsistent_effective_permissions():
+    """Return (user id, element id) pairs whose stored row is out of date."""
+    desired = compute_effective_permissions()
+    inconsistent = []
+    for row in _stored_effective_permissions():
+        masks = desired.pop((row.user_id, row.element_id), None)
+        if (
+            masks is None
+            or row.grants != sorted(masks)
+            or row.permissions_mask != reduce(or_, masks, 0)
+        ):
+            inconsistent.append((row.user_id, row.element_id))
+    inconsistent.extend(desired)
+    return inconsistent
+
+
+def build_access_entries(keys, missing_users=()):
+    """Compile access entries for (user_id, resource_name) keys.
+
+    Business elements are resolved from the in-memory element index.
+    Granted checks then need a single lookup in the effective permission
+    table and the remaining keys one more query for users, so the number
+    of queries does not depend on the number of keys or on how many roles
+    the users have. Users in missing_users are known not to exist or to
+    be inactive and are not looked up.
+    """
+    with phase('element'):
+        elements = element_index.get_elements()
+    user_ids = {
+        user_id: pk
+        for user_id, _ in keys
+        if user_id not in missing_users
+        and (pk := _parse_user_id(user_id)) is not None
+    }
+
+    element_ids = {
+        elements[resource_name][0]
+        for user_id, resource_name in keys
+        if user_id in user_ids and resource_name in elements
+    }
+    grants = {}
+    if element_ids:
+        with phase('rules'):
+            rows = UserEffectivePermission.objects.filter(
+                user_id__in=set(user_ids.values()),
+                user__is_active=True,
+                element_id__in=element_ids,
+            ).values_list('user_id', 'element_id', 'grants')
+            grants = {
+                (user_pk, element_id): masks
+                for user_pk, element_id, masks in rows
+            }
+
+    entries = {}
+    unresolved = []
+    for key in keys:
+        user_id, resource_name = key
+        element_id, payload = elements.get(resource_name, (None, None))
+        masks = grants.get((user_ids.get(user_id), element_id))
+        if masks is None:
+            unresolved.append(key)
+        else:
+            entries[key] = AccessEntry(True, payload, frozenset(masks))
+    if not unresolved:
+        return entries
+
+    with phase('user'):
+        active_users = set(
+            User.objects.filter(
+                id__in={
+                    user_ids[k[0]] for k in unresolved if k[0] in user_ids
+                },
+                is_active=True,
+            ).values_list('id', flat=True)
+        )
+    for key in unresolved:
+        user_id, resource_name = key
+        if user_ids.get(user_id) not in active_users:
+            entries[key] = AccessEntry(False, None, frozenset())
+        else:
+            _, payload = elements.get(resource_name, (None, None))
+            entries[key] = AccessEntry(True, payload, frozenset())
+    return entries
+
+
+def build_effective_permissions(user_id):
+    """Return the user's merged permissions on every business element.
+
+    Maps element names to a dict of permission name to boolean, combining
+    the rules of all the user's roles. Returns None if the user does not
+    exist or is inactive.
+    """
+    user_pk = _parse_user_id(user_id)
+    if (
+        user_pk is None
+        or not User.objects.filter(id=user_pk, is_active=True).exists()
+    ):
+        return None
+
+    rows = (
+        UserEffectivePermission.objects.filter(user_id=user_pk)
+        .values_list('element__name', 'permissions_mask')
+        .order_by('element__name')
+    )
+    return {
+        element_name: mask_to_permissions(mask) for element_name, mask in rows
+    }
+
+
+def _negative_cache_timeout():
+    return getattr(settings, 'RBAC_NEGATIVE_CACHE_TIMEOUT', 30)
+
+
+def _negative_entries(built, cache_keys, user_keys):
+    """Map negative cache keys to record for the given built entries.
+
+    Missing or inactive users are recorded once per user, since that
+    outcome does not depend on the resource or the user's roles; missing
+    resources of active users are recorded under their access key.
+    """
+    negatives = {}
+    for key, entry in built.items():
+        if not entry.user_active:
+            negatives[user_keys[key[0]]] = True
+        elif entry.element is None:
+            negatives[cache_keys[key]] = tuple(entry)
+    return negatives
+
+
+POLICY_BACKENDS = ('database', 'snapshot', 'compiled', 'file')
+
+
+def _policy_backend():
+    backend = getattr(settings, 'RBAC_POLICY_BACKEND', 'database')
+    if backend not in POLICY_BACKENDS:
+        raise ImproperlyConfigured(f'Unknown RBAC_POLICY_BACKEND {backend!r}.')
+    return backend
+
+
+def get_policy_snapshot():
+    """Return the in-memory policy snapshot, or None if it is not used.
+
+    The RBAC_POLICY_BACKEND setting selects how access checks are
+    evaluated: against the database and cache ('database'), an in-memory
+    snapshot of the whole policy ('snapshot'), a memory-mapped compiled
+    policy file ('compiled'), or a JSON or YAML policy file ('file').
+    """
+    backend = _policy_backend()
+    if backend == 'database':
+        return None
+    with phase('snapshot'):
+        if backend == 'snapshot':
+            return get_snapshot()
+        if backend == 'compiled':
+            return compiled_policy.get()
+        return policy_file.get()
+
+
+async def aget_policy_snapshot():
+    """Async version of get_policy_snapshot()."""
+    backend = _policy_backend()
+    if backend == 'database':
+        return None
+    with phase('snapshot'):
+        if backend == 'snapshot':
+            return await aget_snapshot()
+        # Only reads the file system, and rarely.
+        if backend == 'compiled':
+            return compiled_policy.get()
+        return policy_file.get()
+
+
+def _snapshot_entry(snapshot, user_id, resource_name):
+    return AccessEntry(
+        *snapshot.lookup(_parse_user_id(user_id), resource_name)
+    )
+
+
+def get_access_entries(keys):
+    """Return access entries for (user_id, resource_name) keys.
+
+    Entries are taken from the cache where possible; the remaining ones
+    are built together and cached. Missing or inactive users and missing
+    resources are only cached for RBAC_NEGATIVE_CACHE_TIMEOUT seconds, so
+    requests for them stop reaching the database. These entries share the
+    cache with real decisions, so a flood of bogus keys can still push
+    decisions out of a bounded cache, if only for that long. With the
+    snapshot backend, entries are read from the policy snapshot instead.
+    """
+    keys = {(str(user_id), resource_name) for user_id, resource_name in keys}
+    snapshot = get_policy_snapshot()
+    if snapshot is not None:
+        with phase('rules'):
+            return {key: _snapshot_entry(snapshot, *key) for key in keys}
+
+    cache = get_cache()
+    with phase('version'):
+        version = get_policy_version()
+    cache_keys = {key: make_key('access', version, *key) for key in keys}
+    user_keys = {
+        user_id: make_key('missing-user', version, user_id)
+        for user_id, _ in keys
+    }
+    with phase('cache'):
+        cached = cache.get_many([*cache_keys.values(), *user_keys.values()])
+
+    entries = {}
+    missing = []
+    for key, cache_key in cache_keys.items():
+        if cache_key in cached:
+            entries[key] = AccessEntry(*cached[cache_key])
+        else:
+            missing.append(key)
+    record_cache_lookups(len(entries), len(missing))
+    if not missing:
+        return entries
+
+    built = build_access_entries(
+        missing,
+        missing_users={u for u, _ in missing if user_keys[u] in cached},
+    )
+    entries.update(built)
+    negatives = _negative_entries(built, cache_keys, user_keys)
+    negatives = {k: v for k, v in negatives.items() if k not in cached}
+    with phase('cache'):
+        cache.set_many(
+            {
+                cache_keys[key]: tuple(entry)
+                for key, entry in built.items()
+                if entry.element is not None
+            }
+        )
+        if negatives:
+            cache.set_many(negatives, timeout=_negative_cache_timeout())
+    return entries
+
+
+def get_access_entry(user_id, resource_name):
+    """Return the access entry of a user on a resource."""
+    key = (str(user_id), resource_name)
+    return get_access_entries([key])[key]
+
+
+async def abuild_access_entry(user_id, resource_name, user_missing=False):
+    """Async version of build_access_entries() for a single key.
+
+    Runs the same queries as the sync version through the async ORM.
+    """
+    with phase('element'):
+        elements = await element_index.aget_elements()
+    element_id, payload = elements.get(resource_name, (None, None))
+    user_pk = None if user_missing else _parse_user_id(user_id)
+    if user_pk is None:
+        return AccessEntry(False, None, frozenset())
+
+    if element_id is not None:
+        with phase('rules'):
+            masks = (
+                await UserEffectivePermission.objects.filter(
+                    user_id=user_pk,
+                    user__is_active=True,
+                    element_id=element_id,
+                )
+                .values_list('grants', flat=True)
+                .afirst()
+            )
+        if masks is not None:
+            return AccessEntry(True, payload, frozenset(masks))
+
+    with phase('user'):
+        active = await User.objects.filter(
+            id=user_pk, is_active=True
+        ).aexists()
+    if not active:
+        return AccessEntry(False, None, frozenset())
+    return AccessEntry(True, payload, frozenset())
+
+
+async def aget_access_entry(user_id, resource_name):
+    """Async version of get_access_entry().
+
+    Uses the same cache keys as the sync version, so both share entries.
+    """
+    key = (str(user_id), resource_name)
+    snapshot = await aget_policy_snapshot()
+    if snapshot is not None:
+        with phase('rules'):
+            return _snapshot_entry(snapshot, *key)
+
+    cache = get_cache()
+    with phase('version'):
+        version = await aget_policy_version()
+    cache_key = make_key('access', version, *key)
+    user_key = make_key('missing-user', version, key[0])
+    with phase('cache'):
+        cached = await cache.aget_many([cache_key, user_key])
+    if cache_key in cached:
+        record_cache_lookups(1, 0)
+        return AccessEntry(*cached[cache_key])
+    record_cache_lookups(0, 1)
+
+    entry = await abuild_access_entry(*key, user_missing=user_key in cached)
+    with phase('cache'):
+        if entry.element is not None:
+            await cache.aset(cache_key, tuple(entry))
+        elif entry.user_active:
+            await cache.aset(
+                cache_key, tuple(entry), timeout=_negative_cache_timeout()
+            )
+        elif user_key not in cached:
+            await cache.aset(user_key, True, timeout=_negative_cache_timeout())
+    return entry
+
+
+def get_effective_permissions(user_id):
+    """Return the cached merged permissions of a user.
+
+    Returns None if the user does not exist or is inactive.
+    """
+    cache_key = make_key('effective', get_policy_version(), user_id)
+    cache = get_cache()
+    cached = cache.get(cache_key)
+    if cached is None:
+        cached = (build_effective_permissions(user_id),)
+        cache.set(cache_key, cached)
+    return cached[0]
+
+
+def has_access(entry, required_mask):
+    """Return True if a single role grants every required permission."""
+    if required_mask is None:
+        return False
+    return any(
+        granted & required_mask == required_mask for granted in entry.grants
+    )
+
+
+def decide(entry, required_mask):
+    """Return the (status code, response data) of an access check.
+
+    The decision is counted per business element in the metrics.
+    """
+    if not entry.user_active:
+        record_decision('', 'unauthenticated')
+        return (
+            status.HTTP_401_UNAUTHORIZED,
+            {'error': 'User not found or inactive'},
+        )
+    if entry.element is None:
+        record_decision('', 'not_found')
+        return status.HTTP_403_FORBIDDEN, {'error': 'Resource not found'}
+    if not has_access(entry, required_mask):
+        record_decision(entry.element['name'], 'deny')
+        return (
+            status.HTTP_403_FORBIDDEN,
+            {'error': 'Insufficient permissions'},
+        )
+    record_decision(entry.element['name'], 'allow')
+    return status.HTTP_200_OK, entry.element
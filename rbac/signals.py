@@ -0,0 +1,114 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache import bump_policy_version, forget_missing_users
+from .models import AccessRoleRule, BusinessElement, Role, UserRole
+from .services import refresh_effective_permissions
+
+# Effective permissions are refreshed before caches are invalidated, so a
+# cache miss never rebuilds an entry from outdated rows.
+
+
+@receiver(pre_save, sender=UserRole)
+@receiver(pre_save, sender=AccessRoleRule)
+def remember_previous_values(sender, instance, **kwargs):
+    """Remember the tracked fields a save is about to overwrite.
+
+    Values loaded from the database are used when available; instances
+    saved without being loaded cost a query.
+    """
+    previous = None
+    if not instance._state.adding:
+        previous = getattr(instance, '_loaded_values', {})
+        if not set(sender.tracked_fields) <= previous.keys():
+            previous = (
+                sender.objects.filter(pk=instance.pk)
+                .values(*sender.tracked_fields)
+                .first()
+            )
+    instance._previous_values = previous
+
+
+def _previous_values(instance):
+    """Return and reset the tracked values before the last save, if any."""
+    previous = instance.__dict__.pop('_previous_values', None)
+    instance._loaded_values = {
+        name: getattr(instance, name) for name in instance.tracked_fields
+    }
+    return previous or {}
+
+
+@receiver(post_save, sender=UserRole)
+@receiver(post_delete, sender=UserRole)
+def refresh_user_role_permissions(sender, instance, **kwargs):
+    """Recompute effective permissions of users whose roles changed.
+
+    An assignment moved to another user also changes the previous user.
+    """
+    user_ids = {instance.user_id}
+    user_ids.update(_previous_values(instance).values())
+    refresh_effective_permissions(user_ids=list(user_ids))
+
+
+@receiver(post_save, sender=AccessRoleRule)
+@receiver(post_delete, sender=AccessRoleRule)
+def refresh_rule_permissions(sender, instance, **kwargs):
+    """Recompute effective permissions of users holding a changed rule.
+
+    A rule moved to another role or element also changes what the
+    holders of the previous role get on the previous element.
+    """
+    previous = _previous_values(instance)
+    role_ids = {instance.role_id, previous.get('role_id', instance.role_id)}
+    element_ids = {
+        instance.element_id,
+        previous.get('element_id', instance.element_id),
+    }
+    user_ids = list(
+        UserRole.objects.filter(role_id__in=role_ids).values_list(
+            'user_id', flat=True
+        )
+    )
+    if user_ids:
+        refresh_effective_permissions(
+            user_ids=user_ids, element_ids=list(element_ids)
+        )
+
+
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+@receiver(post_save, sender=BusinessElement)
+@receiver(post_delete, sender=BusinessElement)
+@receiver(post_save, sender=AccessRoleRule)
+@receiver(post_delete, sender=AccessRoleRule)
+@receiver(post_save, sender=UserRole)
+@receiver(post_delete, sender=UserRole)
+def invalidate_policy(sender, **kwargs):
+    """Bump the policy version when the policy changes.
+
+    Writes to business elements also bump the element version.
+    """
+    bump_policy_version(elements=sender is BusinessElement)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_account(sender, instance, created, **kwargs):
+    """Bump the policy version when a user is (de)activated.
+
+    A new user has no roles, so only its negative cache entry is dropped.
+    Saves that keep is_active, such as profile updates, are ignored; raw
+    saves of existing users, e.g. from loaddata, always bump.
+    """
+    if created:
+        forget_missing_users([instance.pk])
+        return
+    changed = getattr(instance, 'changed_account_fields', {'is_active'})
+    if 'is_active' in changed:
+        bump_policy_version()
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_deleted_user(sender, **kwargs):
+    """Bump the policy version when a user is deleted."""
+    bump_policy_version()
@@ -0,0 +1,182 @@
+import threading
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from .cache import aget_policy_version, get_policy_version
+from .models import AccessRoleRule, BusinessElement, UserRole
+from .serializers import BusinessElementSerializer
+
+User = get_user_model()
+
+
+class PolicySnapshot:
+    """Immutable in-memory copy of the whole RBAC policy.
+
+    Roles and elements are numbered densely so that per-role rules are
+    stored as a tuple indexed by role number, each mapping element numbers
+    to permission masks. Snapshots are never modified after construction;
+    a policy change produces a new snapshot that replaces the old one.
+    """
+
+    __slots__ = (
+        'active_users',
+        'element_numbers',
+        'element_payloads',
+        'role_masks',
+        'user_roles',
+        'version',
+    )
+
+    def __init__(
+        self,
+        version,
+        active_users,
+        user_roles,
+        role_masks,
+        element_numbers,
+        element_payloads,
+    ):
+        set_attr = super().__setattr__
+        # Policy version the snapshot was built for.
+        set_attr('version', version)
+        # frozenset of active user ids.
+        set_attr('active_users', active_users)
+        # {user id: tuple of role numbers} for active users with roles.
+        set_attr('user_roles', user_roles)
+        # tuple indexed by role number of {element number: mask}.
+        set_attr('role_masks', role_masks)
+        # {element name: element number}.
+        set_attr('element_numbers', element_numbers)
+        # tuple indexed by element number of serialized elements.
+        set_attr('element_payloads', element_payloads)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('PolicySnapshot is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('PolicySnapshot is immutable')
+
+    @classmethod
+    def from_database(cls, version):
+        """Build a snapshot from the database without model instances.
+
+        Only business elements are instantiated, to render their payloads.
+        The queries run in one transaction so that they see the same policy.
+        """
+        with transaction.atomic():
+            element_numbers = {}
+            element_payloads = []
+            element_by_id = {}
+            for number, element in enumerate(
+                BusinessElement.objects.order_by('name')
+            ):
+                element_numbers[element.name] = number
+                element_by_id[element.pk] = number
+                element_payloads.append(
+                    dict(BusinessElementSerializer(element).data)
+                )
+
+            role_by_id = {}
+            role_masks = []
+            rules = AccessRoleRule.objects.values_list(
+                'role_id', 'element_id', 'permissions_mask'
+            )
+            for role_id, element_id, mask in rules:
+                if role_id not in role_by_id:
+                    role_by_id[role_id] = len(role_masks)
+                    role_masks.append({})
+                masks = role_masks[role_by_id[role_id]]
+                masks[element_by_id[element_id]] = mask
+
+            user_roles = {}
+            assignments = UserRole.objects.filter(
+                user__is_active=True
+            ).values_list('user_id', 'role_id')
+            for user_id, role_id in assignments:
+                if role_id in role_by_id:
+                    user_roles.setdefault(user_id, []).append(
+                        role_by_id[role_id]
+                    )
+            active_users = frozenset(
+                User.objects.filter(is_active=True).values_list(
+                    'id', flat=True
+                )
+            )
+
+        return cls(
+            version=version,
+            active_users=active_users,
+            user_roles={
+                user_id: tuple(roles) for user_id, roles in user_roles.items()
+            },
+            role_masks=tuple(role_masks),
+            element_numbers=element_numbers,
+            element_payloads=tuple(element_payloads),
+        )
+
+    def lookup(self, user_pk, resource_name):
+        """Return (user_active, element payload, grants) for an access check.
+
+        Matches the fields of services.AccessEntry.
+        """
+        if user_pk not in self.active_users:
+            return False, None, frozenset()
+        number = self.element_numbers.get(resource_name)
+        if number is None:
+            return True, None, frozenset()
+        grants = frozenset(
+            self.role_masks[role][number]
+            for role in self.user_roles.get(user_pk, ())
+            if number in self.role_masks[role]
+        )
+        return True, self.element_payloads[number], grants
+
+
+_current = None
+_rebuild_lock = threading.Lock()
+
+
+def get_snapshot():
+    """Return the current policy snapshot.
+
+    Readers only take a reference to the current snapshot. When the policy
+    version has changed, one thread rebuilds the snapshot and swaps it in
+    while the others keep serving the previous one.
+    """
+    global _current
+    snapshot = _current
+    version = get_policy_version()
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    if not _rebuild_lock.acquire(blocking=snapshot is None):
+        return snapshot
+    try:
+        snapshot = _current
+        if snapshot is None or snapshot.version != version:
+            snapshot = PolicySnapshot.from_database(version)
+            _current = snapshot
+        return snapshot
+    finally:
+        _rebuild_lock.release()
+
+
+async def aget_snapshot():
+    """Async version of get_snapshot().
+
+    Only a rebuild leaves the event loop, to run the queries in a thread.
+    """
+    snapshot = _current
+    if snapshot is not None and snapshot.version == (
+        await aget_policy_version()
+    ):
+        return snapshot
+    return await sync_to_async(get_snapshot)()
+
+
+def clear_snapshot():
+    """Drop the current snapshot so the next access rebuilds it."""
+    global _current
+    _current = None
@@ -1,16 +1,64 @@
-from django.test import TestCase
-from django.db import IntegrityError
+import asyncio
+import json
+import tempfile
+import threading
+from collections import Counter
+from io import StringIO
+from pathlib import Path
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import LiveServerTestCase, TestCase, override_settings
+from django.core.management import call_command
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, transaction
 from django.contrib.admin.sites import AdminSite
 from django.contrib.auth import get_user_model
 from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APITestCase
 from rest_framework import status
-
-from .models import AccessRoleRule, BusinessElement, Role, UserRole
+from users.authentication import get_token_cache
+
+from .models import (
+    AccessRoleRule,
+    BusinessElement,
+    PolicyVersion,
+    Role,
+    UserEffectivePermission,
+    UserRole,
+    mask_to_permissions,
+    permissions_to_mask,
+)
 from .admin import AccessRoleRuleAdmin, BusinessElementAdmin, RoleAdmin
+from .cache import element_index, expire_policy_version, get_cache
+from .compiled import CompiledPolicy, compiled_policy
+from .metrics import metrics, render_metrics
+from .loadtest import (
+    free_port,
+    json_request,
+    run_load,
+    start_server,
+    stop_server,
+    summarize,
+)
+from .management.commands.bench_access import Command as BenchAccessCommand
+from .management.commands.load_test import Command as LoadTestCommand
+from .policy_file import policy_file, publish_file, snapshot_from_policy
+from .services import find_inconsistent_effective_permissions
+from .snapshot import (
+    PolicySnapshot,
+    _rebuild_lock,
+    clear_snapshot,
+    get_snapshot,
+)
+from .timing import HISTOGRAM_BOUNDS, phase, phase_histogram
 
 User = get_user_model()
 
+QUERY_BUDGETS_PATH = Path(__file__).with_name('query_budgets.json')
+
 
 class RoleModelTest(TestCase):
     """Test cases for Role model."""
@@ -121,6 +169,32 @@ class AccessRoleRuleModelTest(TestCase):
         with self.assertRaises(IntegrityError):
             AccessRoleRule.objects.create(role=self.role, element=self.element)
 
+    def test_permissions_mask_follows_permission_fields(self):
+        """Test that permissions_mask is kept in sync on save."""
+        rule = AccessRoleRule.objects.create(
+            role=self.role,
+            element=self.element,
+            read_permission=True,
+            delete_all_permission=True,
+        )
+        self.assertEqual(
+            rule.permissions_mask,
+            permissions_to_mask(['read', 'delete_all']),
+        )
+        rule.read_permission = False
+        rule.save(update_fields=['read_permission'])
+        rule.refresh_from_db()
+        self.assertEqual(
+            rule.permissions_mask, permissions_to_mask(['delete_all'])
+        )
+        self.assertEqual(
+            mask_to_permissions(rule.permissions_mask)['delete_all'], True
+        )
+
+    def test_permissions_to_mask_rejects_unknown_permission(self):
+        """Test that unknown permission names produce no mask."""
+        self.assertIsNone(permissions_to_mask(['read', 'fly']))
+
     def test_access_rule_str_method(self):
         """Test AccessRoleRule __str__ method."""
         rule = AccessRoleRule.objects.create(
@@ -276,6 +350,71 @@ class UserRoleModelTest(TestCase):
         )
 
 
+class PolicyVersionTest(TestCase):
+    """Test cases for PolicyVersion."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.user = User.objects.create_user(
+            email='user@test.com',
+            password='password',
+            first_name='Test',
+            last_name='User',
+        )
+
+    def test_policy_writes_bump_version(self):
+        """Test that policy writes increment the version."""
+        version = PolicyVersion.current()
+        role = Role.objects.create(name='Reader')
+        element = BusinessElement.objects.create(name='Document')
+        AccessRoleRule.objects.create(role=role, element=element)
+        UserRole.objects.create(user=self.user, role=role)
+        self.assertGreater(PolicyVersion.current(), version + 3)
+
+    def test_user_activity_change_bumps_version(self):
+        """Test that only saves changing is_active bump the version."""
+        version = PolicyVersion.current()
+        self.user.is_active = False
+        self.user.save()
+        bumped = PolicyVersion.current()
+        self.assertGreater(bumped, version)
+        self.user.save(update_fields=['last_login'])
+        self.user.first_name = 'Changed'
+        self.user.save()
+        self.assertEqual(PolicyVersion.current(), bumped)
+        User.objects.create_user(
+            email='new@test.com',
+            password='password',
+            first_name='New',
+            last_name='User',
+        )
+        self.assertEqual(PolicyVersion.current(), bumped)
+
+    def test_profile_update_keeps_version(self):
+        """Test that a profile update through token auth does not bump."""
+        token = Token.objects.create(user=self.user)
+        version = PolicyVersion.current()
+        response = self.client.patch(
+            '/api/users/update/',
+            {'first_name': 'Jane'},
+            content_type='application/json',
+            HTTP_AUTHORIZATION=f'Token {token.key}',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(PolicyVersion.current(), version)
+
+    def test_failed_write_does_not_bump_version(self):
+        """Test that the bump is rolled back with a failed write."""
+        Role.objects.create(name='Reader')
+        version = PolicyVersion.current()
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                role = Role.objects.create(name='Writer')
+                role.name = 'Reader'
+                role.save()
+        self.assertEqual(PolicyVersion.current(), version)
+
+
 class AccessViewTest(APITestCase):
     """Test cases for AccessView."""
 
@@ -360,6 +499,1903 @@ class AccessViewTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('error', response.data)
 
+    def test_unknown_permission_denied(self):
+        """Test 403 when an unknown permission is requested."""
+        url = '/api/rbac/access/'
+        params = {
+            'user_id': str(self.user.id),
+            'resource': 'Document',
+            'permissions': 'read,fly',
+        }
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_permissions_must_be_granted_by_single_role(self):
+        """Test that permissions from different roles are not combined."""
+        writer = Role.objects.create(name='Writer')
+        UserRole.objects.create(user=self.user, role=writer)
+        AccessRoleRule.objects.create(
+            role=writer, element=self.element, create_permission=True
+        )
+        url = '/api/rbac/access/'
+        params = {
+            'user_id': str(self.user.id),
+            'resource': 'Document',
+            'permissions': 'read,create',
+        }
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_query_count_does_not_depend_on_role_count(self):
+        """Test that the access check uses a fixed number of queries."""
+        url = '/api/rbac/access/'
+        params = {
+            'user_id': str(self.user.id),
+            'resource': 'Document',
+            'permissions': 'create',
+        }
+        with self.assertNumQueries(3):
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        for i in range(30):
+            role = Role.objects.create(name=f'Extra{i}')
+            UserRole.objects.create(user=self.user, role=role)
+            AccessRoleRule.objects.create(
+                role=role, element=self.element, read_permission=True
+            )
+        # Role and rule writes keep the element index; drop it to compare.
+        element_index.clear()
+        with self.assertNumQueries(3):
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class AccessCacheTest(APITestCase):
+    """Test cases for access decision caching."""
+
+    url = '/api/rbac/access/'
+
+    def setUp(self):
+        """Set up test data."""
+        get_cache().clear()
+        self.user = User.objects.create_user(
+            email='user@test.com',
+            password='password',
+            first_name='Test',
+            last_name='User',
+        )
+        self.role = Role.objects.create(name='Reader')
+        self.element = BusinessElement.objects.create(name='Document')
+        self.user_role = UserRole.objects.create(
+            user=self.user, role=self.role
+        )
+        self.access_rule = AccessRoleRule.objects.create(
+            role=self.role, element=self.element, read_permission=True
+        )
+        self.params = {
+            'user_id': str(self.user.id),
+            'resource': 'Document',
+            'permissions': 'read',
+        }
+
+    def test_repeated_check_is_served_from_cache(self):
+        """Test that a repeated check does not query the database."""
+        self.client.get(self.url, self.params)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, self.params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_file_based_cache_backend(self):
+        """Test that decisions can be shared through a file-based cache."""
+        with tempfile.TemporaryDirectory() as location:
+            caches = {
+                'default': {
+                    'BACKEND': 'django.core.cache.backends.filebased.'
+                    'FileBasedCache',
+                    'LOCATION': location,
+                }
+            }
+            with self.settings(CACHES=caches, RBAC_CACHE_ALIAS='default'):
+                self.client.get(self.url, self.params)
+                with self.assertNumQueries(0):
+                    response = self.client.get(self.url, self.params)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.access_rule.delete()
+                response = self.client.get(self.url, self.params)
+                self.assertEqual(
+                    response.status_code, status.HTTP_403_FORBIDDEN
+                )
+
+    def test_policy_version_bump_by_another_worker(self):
+        """Test that a version bump in the database invalidates entries."""
+        self.client.get(self.url, self.params)
+        # Simulate another worker: change the policy without signals.
+        UserEffectivePermission.objects.update(grants=[])
+        PolicyVersion.bump()
+        response = self.client.get(self.url, self.params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.settings(RBAC_POLICY_VERSION_CHECK_INTERVAL=0):
+            response = self.client.get(self.url, self.params)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_effective_permissions_are_cached(self):
+        """Test that effective permissions are served from the cache."""
+        url = '/api/rbac/access/effective/'
+        self.client.get(url, {'user_id': self.user.id})
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'user_id': self.user.id})
+        self.assertTrue(response.data['Document']['read'])
+        self.user_role.delete()
+        response = self.client.get(url, {'user_id': self.user.id})
+        self.assertEqual(response.data, {})
+
+    def test_rule_change_invalidates_cache(self):
+        """Test that updating a rule invalidates cached decisions."""
+        self.client.get(self.url, self.params)
+        self.access_rule.read_permission = False
+        self.access_rule.save()
+        response = self.client.get(self.url, self.params)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_user_role_removal_invalidates_cache(self):
+        """Test that removing a user role invalidates cached decisions."""
+        self.client.get(self.url, self.params)
+        self.user_role.delete()
+        response = self.client.get(self.url, self.params)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_role_deletion_invalidates_cache(self):
+        """Test that deleting a role invalidates cached decisions."""
+        self.client.get(self.url, self.params)
+        self.role.delete()
+        response = self.client.get(self.url, self.params)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_user_deactivation_invalidates_cache(self):
+        """Test that deactivating a user invalidates cached decisions."""
+        self.client.get(self.url, self.params)
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(self.url, self.params)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_element_update_invalidates_cache(self):
+        """Test that updating an element refreshes the cached payload."""
+        self.client.get(self.url, self.params)
+        self.element.description = 'Updated'
+        self.element.save()
+        response = self.client.get(self.url, self.params)
+        self.assertEqual(response.data['description'], 'Updated')
+
+
+class ElementIndexTest(TestCase):
+    """Test cases for the in-memory business element index."""
+
+    def setUp(self):
+        """Set up test data."""
+        element_index.clear()
+        self.element = BusinessElement.objects.create(
+            name='Document', description='A test document'
+        )
+
+    def test_index_is_loaded_once(self):
+        """Test that lookups after the first one cost no queries."""
+        element_index.get_elements()
+        with self.assertNumQueries(0):
+            elements = element_index.get_elements()
+        element_id, payload = elements['Document']
+        self.assertEqual(element_id, self.element.id)
+        self.assertEqual(payload['description'], 'A test document')
+
+    def test_rename_refreshes_index(self):
+        """Test that renaming an element reloads the index."""
+        element_index.get_elements()
+        self.element.name = 'Contract'
+        self.element.save()
+        elements = element_index.get_elements()
+        self.assertNotIn('Document', elements)
+        self.assertEqual(elements['Contract'][0], self.element.id)
+
+    def test_other_policy_writes_keep_index(self):
+        """Test that role writes only re-read the versions."""
+        element_index.get_elements()
+        Role.objects.create(name='Reader')
+        with self.assertNumQueries(1):
+            elements = element_index.get_elements()
+        self.assertIn('Document', elements)
+
+    def test_deletion_refreshes_index(self):
+        """Test that deleting an element reloads the index."""
+        element_index.get_elements()
+        self.element.delete()
+        self.assertEqual(element_index.get_elements(), {})
+
+
+class NegativeCacheTest(APITestCase):
+    """Test cases for negative caching of unknown users and resources."""
+
+    url = '/api/rbac/access/'
+
+    def setUp(self):
+        """Set up test data."""
+        get_cache().clear()
+        self.user = User.objects.create_user(
+            email='user@test.com',
+            password='password',
+            first_name='Test',
+            last_name='User',
+        )
+        role = Role.objects.create(name='Reader')
+        self.element = BusinessElement.objects.create(name='Document')
+        UserRole.objects.create(user=self.user, role=role)
+        AccessRoleRule.objects.create(
+            role=role, element=self.element, read_permission=True
+        )
+
+    def get(self, user_id, resource):
+        return self.client.get(
+            self.url,
+            {'user_id': user_id, 'resource': resource, 'permissions': 'read'},
+        )
+
+    def test_missing_user_is_not_looked_up_again(self):
+        """Test that a missing user is answered from the negative cache."""
+        self.get('12345', 'Document')
+        with self.assertNumQueries(0):
+            response = self.get('12345', 'Other')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_missing_resource_skips_element_lookups(self):
+        """Test that a missing resource only needs the user lookup."""
+        self.get(str(self.user.id), 'Missing')
+        other = User.objects.create_user(
+            email='other@test.com',
+            password='password',
+            first_name='Other',
+            last_name='User',
+        )
+        self.get(str(self.user.id), 'Missing')
+        with self.assertNumQueries(1):
+            response = self.get(str(other.id), 'Missing')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_missing_resource_is_not_looked_up_again(self):
+        """Test that a missing resource is answered from the negative cache."""
+        self.get(str(self.user.id), 'Missing')
+        with self.assertNumQueries(0):
+            response = self.get(str(self.user.id), 'Missing')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_element_creation_invalidates_negative_entry(self):
+        """Test that creating an element clears its negative entry."""
+        self.get(str(self.user.id), 'Report')
+        report = BusinessElement.objects.create(name='Report')
+        AccessRoleRule.objects.create(
+            role=Role.objects.get(name='Reader'),
+            element=report,
+            read_permission=True,
+        )
+        response = self.get(str(self.user.id), 'Report')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_user_reactivation_invalidates_negative_entry(self):
+        """Test that reactivating a user clears its negative entry."""
+        self.user.is_active = False
+        self.user.save()
+        response = self.get(str(self.user.id), 'Document')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.user.is_active = True
+        self.user.save()
+        response = self.get(str(self.user.id), 'Document')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_user_creation_invalidates_negative_entry(self):
+        """Test that creating a user clears its negative entry only."""
+        response = self.get('12345', 'Document')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        version = PolicyVersion.current()
+        User.objects.create_user(
+            email='new@test.com',
+            password='password',
+            first_name='New',
+            last_name='User',
+            id=12345,
+        )
+        response = self.get('12345', 'Document')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(PolicyVersion.current(), version)
+
+    def test_negative_entries_expire(self):
+        """Test that negative entries honour the configured timeout."""
+        with self.settings(RBAC_NEGATIVE_CACHE_TIMEOUT=0):
+            self.get('12345', 'Document')
+            with self.assertNumQueries(2):
+                self.get('12345', 'Document')
+
+
+class AsyncAccessViewTest(TestCase):
+    """Test cases for AsyncAccessView."""
+
+    def setUp(self):
+        """Set up test data."""
+        get_cache().clear()
+        self.user = User.objects.create_user(
+            email='user@test.com',
+            password='password',
+            first_name='Test',
+            last_name='User',
+        )
+        role = Role.objects.create(name='Reader')
+        element = BusinessElement.objects.create(
+            name='Document', description='A test document'
+        )
+        BusinessElement.objects.create(name='Report')
+        UserRole.objects.create(user=self.user, role=role)
+        AccessRoleRule.objects.create(
+            role=role, element=element, read_permission=True
+        )
+
+    async def assert_same_response(self, params):
+        expected = await sync_to_async(self.client.get)(
+            '/api/rbac/access/', params
+        )
+        get_cache().clear()
+        response = await self.async_client.get(
+            '/api/rbac/access/async/', params
+        )
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.content, expected.content)
+        self.assertEqual(response['Content-Type'], expected['Content-Type'])
+
+    async def test_responses_match_sync_view(self):
+        """Test that every outcome matches the sync AccessView."""
+        user_id = str(self.user.id)
+        for params in [
+            {
+                'user_id': user_id,
+                'resource': 'Document',
+                'permissions': 'read',
+            },
+            {
+                'user_id': user_id,
+                'resource': 'Document',
+                'permissions': 'create',
+            },
+            {'user_id': user_id, 'resource': 'Report', 'permissions': 'read'},
+            {'user_id': user_id, 'resource': 'Missing', 'permissions': 'read'},
+            {'user_id': '-1', 'resource': 'Document', 'permissions': 'read'},
+            {'user_id': 'abc', 'resource': 'Document', 'permissions': 'read'},
+            {'user_id': user_id},
+        ]:
+            with self.subTest(params=params):
+                await self.assert_same_response(params)
+
+    def test_cached_response(self):
+        """Test that a repeated check is served from the cache."""
+        url = '/api/rbac/access/async/'
+        params = {
+            'user_id': str(self.user.id),
+            'resource': 'Document',
+            'permissions': 'read',
+        }
+        async_to_sync(self.async_client.get)(url, params)
+        with self.assertNumQueries(0):
+            response = async_to_sync(self.async_client.get)(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+@override_settings(RBAC_ACCESS_TIMING=True)
+class AccessTimingTest(TestCase):
+    """Test cases for the access check phase timers."""
+
+    def setUp(self):
+        """Set up test data."""
+        get_cache().clear()
+        element_index.clear()
+        phase_histogram.clear()
+        self.addCleanup(phase_histogram.clear)
+        self.user = User.objects.create_user(
+            email='user@test.com',
+            password='password',
+            first_name='Test',
+            last_name='User',
+        )
+        role = Role.objects.create(name='Reader')
+        element = BusinessElement.objects.create(name='Document')
+        UserRole.objects.create(user=self.user, role=role)
+        AccessRoleRule.objects.create(
+            role=role, element=element, read_permission=True
+        )
+        self.params = {
+            'user_id': str(self.user.id),
+            'resource': 'Document',
+            'permissions': 'read',
+        }
+
+    def server_timing(self, response):
+        return {
+            name: float(duration.removeprefix('dur='))
+            for name, _, duration in (
+                metric.partition(';')
+                for metric in response['Server-Timing'].split(', ')
+            )
+        }
+
+    def test_server_timing_header(self):
+        """Test that every phase of a check is reported."""
+        response = self.client.get('/api/rbac/access/', self.params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        timings = self.server_timing(response)
+        self.assertEqual(
+            set(timings),
+            {
+                'version',
+                'cache',
+                'element',
+                'rules',
+                'decide',
+                'render',
+                'total',
+            },
+        )
+        self.assertGreaterEqual(
+            timings['total'],
+            max(v for k, v in timings.items() if k != 'total'),
+        )
+
+    def test_cached_check(self):
+        """Test that a cached check reports no database phases."""
+        self.client.get('/api/rbac/access/', self.params)
+        response = self.client.get('/api/rbac/access/', self.params)
+        self.assertEqual(
+            set(self.server_timing(response)),
+            {'version', 'cache', 'decide', 'render', 'total'},
+        )
+
+    def test_denied_user_phase(self):
+        """Test that the active user query is timed for unknown users."""
+        response = self.client.get(
+            '/api/rbac/access/', {**self.params, 'user_id': '-1'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn('user', self.server_timing(response))
+
+    @override_settings(RBAC_POLICY_BACKEND='snapshot')
+    def test_snapshot_backend(self):
+        """Test the phases of a check against the policy snapshot."""
+        clear_snapshot()
+        self.addCleanup(clear_snapshot)
+        response = self.client.get('/api/rbac/access/', self.params)
+        self.assertEqual(
+            set(self.server_timing(response)),
+            {'snapshot', 'rules', 'decide', 'render', 'total'},
+        )
+
+    def test_async_view(self):
+        """Test that the async view reports its phases as well."""
+        response = async_to_sync(self.async_client.get)(
+            '/api/rbac/access/async/', self.params
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertLessEqual(
+            {
+                'version',
+                'cache',
+                'element',
+                'rules',
+                'decide',
+                'render',
+                'total',
+            },
+            set(self.server_timing(response)),
+        )
+
+    def test_histogram(self):
+        """Test that every phase is recorded in the histogram."""
+        for _ in range(3):
+            self.client.get('/api/rbac/access/', self.params)
+        histogram = phase_histogram.snapshot()
+        self.assertEqual(histogram['total']['count'], 3)
+        self.assertEqual(histogram['element']['count'], 1)
+        self.assertEqual(
+            list(histogram['total']['buckets']),
+            [*map(str, HISTOGRAM_BOUNDS), '+Inf'],
+        )
+        self.assertEqual(sum(histogram['total']['buckets'].values()), 3)
+        self.assertGreater(histogram['total']['sum_ms'], 0)
+
+    @override_settings(RBAC_ACCESS_TIMING=False)
+    def test_disabled(self):
+        """Test that nothing is timed or recorded when disabled."""
+        response = self.client.get('/api/rbac/access/', self.params)
+        self.assertNotIn('Server-Timing', response)
+        response = async_to_sync(self.async_client.get)(
+            '/api/rbac/access/async/', self.params
+        )
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(phase_histogram.snapshot(), {})
+
+    def test_phase_without_timer(self):
+        """Test that phases outside a timed request are no-ops."""
+        with phase('rules'):
+            pass
+        self.assertEqual(phase_histogram.snapshot(), {})
+
+
+class MetricsTest(TestCase):
+    """Test cases for the metrics endpoint and counters."""
+
+    url = '/api/rbac/metrics/'
+
+    def setUp(self):
+        """Set up test data."""
+        get_cache().clear()
+        element_index.clear()
+        metrics.clear()
+        phase_histogram.clear()
+        self.addCleanup(phase_histogram.clear)
+        self.user = User.objects.create_user(
+            email='user@test.com',
+            password='password',
+            first_name='Test',
+            last_name='User',
+        )
+        role = Role.objects.create(name='Reader')
+        element = BusinessElement.objects.create(name='Document')
+        UserRole.objects.create(user=self.user, role=role)
+        AccessRoleRule.objects.create(
+            role=role, element=element, read_permission=True
+        )
+        self.params = {
+            'user_id': str(self.user.id),
+            'resource': 'Document',
+            'permissions': 'read',
+        }
+
+    def scrape(self):
+        """Return {sample name with labels: value} from the endpoint."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response['Content-Type'],
+            'text/plain; version=0.0.4; charset=utf-8',
+        )
+        return {
+            sample: float(value)
+            for sample, _, value in (
+                line.rpartition(' ')
+                for line in response.content.decode().splitlines()
+                if not line.startswith('#')
+            )
+        }
+
+    def test_exposition_format(self):
+        """Test that every metric family is declared."""
+        text = render_metrics()
+        for name, kind in [
+            ('rbac_http_requests_total', 'counter'),
+            ('rbac_http_request_duration_seconds', 'histogram'),
+            ('rbac_db_queries_per_request', 'histogram'),
+            ('rbac_access_decisions_total', 'counter'),
+            ('rbac_access_cache_requests_total', 'counter'),
+            ('rbac_access_phase_duration_seconds', 'histogram'),
+        ]:
+            self.assertIn(f'# TYPE {name} {kind}\n', text)
+        self.assertTrue(text.endswith('\n'))
+
+    def test_request_metrics(self):
+        """Test request counts, latency and query histograms per view."""
+        self.client.get('/api/rbac/access/', self.params)
+        self.client.get('/api/rbac/access/', self.params)
+        self.client.get('/api/rbac/access/', {'user_id': '1'})
+        samples = self.scrape()
+        self.assertEqual(
+            samples[
+                'rbac_http_requests_total{view="rbac:access",method="GET",'
+                'status="200"}'
+            ],
+            2,
+        )
+        self.assertEqual(
+            samples[
+                'rbac_http_requests_total{view="rbac:access",method="GET",'
+                'status="400"}'
+            ],
+            1,
+        )
+        self.assertEqual(
+            samples[
+                'rbac_http_request_duration_seconds_bucket'
+                '{view="rbac:access",le="+Inf"}'
+            ],
+            3,
+        )
+        self.assertEqual(
+            samples[
+                'rbac_db_queries_per_request_bucket{view="rbac:access",le="0"}'
+            ],
+            2,
+        )
+        self.assertGreater(
+            samples['rbac_db_queries_per_request_sum{view="rbac:access"}'], 0
+        )
+
+    def test_async_view_queries(self):
+        """Test that queries of the async view are counted."""
+        async_to_sync(self.async_client.get)(
+            '/api/rbac/access/async/', self.params
+        )
+        samples = self.scrape()
+        self.assertGreater(
+            samples[
+                'rbac_db_queries_per_request_sum{view="rbac:access-async"}'
+            ],
+            0,
+        )
+
+    def test_unmatched_requests(self):
+        """Test that requests without a URL pattern share one label."""
+        self.client.get('/missing/')
+        self.assertEqual(
+            self.scrape()[
+                'rbac_http_requests_total{view="<unmatched>",method="GET",'
+                'status="404"}'
+            ],
+            1,
+        )
+
+    def test_decision_and_cache_metrics(self):
+        """Test decision counts per element and cache hits and misses."""
+        self.client.get('/api/rbac/access/', self.params)
+        self.client.get('/api/rbac/access/', self.params)
+        self.client.get(
+            '/api/rbac/access/', {**self.params, 'permissions': 'delete'}
+        )
+        self.client.get(
+            '/api/rbac/access/', {**self.params, 'resource': 'Missing'}
+        )
+        samples = self.scrape()
+        decisions = 'rbac_access_decisions_total'
+        self.assertEqual(
+            samples[f'{decisions}{{element="Document",decision="allow"}}'], 2
+        )
+        self.assertEqual(
+            samples[f'{decisions}{{element="Document",decision="deny"}}'], 1
+        )
+        self.assertEqual(
+            samples[f'{decisions}{{element="",decision="not_found"}}'], 1
+        )
+        cache = 'rbac_access_cache_requests_total'
+        self.assertEqual(samples[f'{cache}{{result="hit"}}'], 2)
+        self.assertEqual(samples[f'{cache}{{result="miss"}}'], 2)
+
+    @override_settings(RBAC_ACCESS_TIMING=True)
+    def test_phase_histogram(self):
+        """Test that access check phases are exported in seconds."""
+        self.client.get('/api/rbac/access/', self.params)
+        samples = self.scrape()
+        name = 'rbac_access_phase_duration_seconds'
+        self.assertEqual(samples[f'{name}_count{{phase="total"}}'], 1)
+        self.assertEqual(
+            samples[f'{name}_bucket{{phase="total",le="+Inf"}}'], 1
+        )
+        self.assertIn(f'{name}_bucket{{phase="total",le="5e-05"}}', samples)
+
+    def test_threads_aggregate(self):
+        """Test that counts from concurrent threads add up."""
+
+        def work():
+            for _ in range(1000):
+                metrics.inc('test_total', (('label', 'a"b'),))
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        metrics.inc('test_total', (('label', 'a"b'),))
+        self.assertEqual(
+            metrics.collect()['test_total', (('label', 'a"b'),)], 8001
+        )
+
+    def test_finished_threads_are_retired(self):
+        """Test that finished threads' shards are folded, not kept."""
+        for _ in range(20):
+            thread = threading.Thread(target=metrics.inc, args=('test_total',))
+            thread.start()
+            thread.join()
+        self.assertEqual(metrics.collect()['test_total', ()], 20)
+        self.assertTrue(
+            all(thread.is_alive() for thread, shard in metrics._shards)
+        )
+        metrics.clear()
+        self.assertNotIn(('test_total', ()), metrics.collect())
+
+    @override_settings(RBAC_METRICS_TOKEN='secret')
+    def test_token(self):
+        """Test that the configured bearer token is required."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.get(self.url, HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.get(
+            self.url, HTTP_AUTHORIZATION='Bearer secret'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+@override_settings(RBAC_POLICY_BACKEND='snapshot')
+class PolicySnapshotTest(APITestCase):
+    """Test cases for the in-memory policy snapshot backend."""
+
+    url = '/api/rbac/access/'
+
+    def setUp(self):
+        """Set up test data."""
+        get_cache().clear()
+        clear_snapshot()
+        self.user = User.objects.create_user(
+            email='user@test.com',
+            password='password',
+            first_name='Test',
+            last_name='User',
+        )
+        self.inactive = User.objects.create_user(
+            email='inactive@test.com',
+            password='password',
+            first_name='Inactive',
+            last_name='User',
+            is_active=False,
+        )
+        reader = Role.objects.create(name='Reader')
+        self.writer = Role.objects.create(name='Writer')
+        self.element = BusinessElement.objects.create(
+            name='Document', description='A test document'
+        )
+        BusinessElement.objects.create(name='Report')
+        UserRole.objects.create(user=self.user, role=reader)
+        UserRole.objects.create(user=self.user, role=self.writer)
+        UserRole.objects.create(user=self.inactive, role=reader)
+        AccessRoleRule.objects.create(
+            role=reader, element=self.element, read_permission=True
+        )
+        AccessRoleRule.objects.create(
+            role=self.writer, element=self.element, create_permission=True
+        )
+
+    def get(self, user_id, resource, permissions='read'):
+        return self.client.get(
+            self.url,
+            {
+                'user_id': user_id,
+                'resource': resource,
+                'permissions': permissions,
+            },
+        )
+
+    def test_responses_match_database_backend(self):
+        """Test that every outcome matches the database backend."""
+        user_id = str(self.user.id)
+        for args in [
+            (user_id, 'Document', 'read'),
+            (user_id, 'Document', 'create'),
+            (user_id, 'Document', 'read,create'),
+            (user_id, 'Document', 'update'),
+            (user_id, 'Document', 'unknown'),
+            (user_id, 'Report', 'read'),
+            (user_id, 'Missing', 'read'),
+            (str(self.inactive.id), 'Document', 'read'),
+            ('-1', 'Document', 'read'),
+            ('abc', 'Document', 'read'),
+        ]:
+            with self.subTest(args=args):
+                response = self.get(*args)
+                with self.settings(RBAC_POLICY_BACKEND='database'):
+                    expected = self.get(*args)
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response.json(), expected.json())
+
+    def test_checks_cost_no_queries(self):
+        """Test that checks against a built snapshot run no queries."""
+        self.get(str(self.user.id), 'Document')
+        with self.assertNumQueries(0):
+            granted = self.get(str(self.user.id), 'Document')
+            missing = self.get('12345', 'Document')
+        self.assertEqual(granted.status_code, status.HTTP_200_OK)
+        self.assertEqual(missing.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_policy_change_swaps_snapshot(self):
+        """Test that a policy change replaces the snapshot."""
+        before = get_snapshot()
+        AccessRoleRule.objects.filter(role=self.writer).get().delete()
+        AccessRoleRule.objects.create(
+            role=self.writer, element=self.element, update_permission=True
+        )
+        after = get_snapshot()
+        self.assertIsNot(after, before)
+        self.assertNotEqual(after.version, before.version)
+        response = self.get(str(self.user.id), 'Document', 'update')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_readers_keep_previous_snapshot_during_rebuild(self):
+        """Test that a rebuild in progress does not block readers."""
+        before = get_snapshot()
+        BusinessElement.objects.create(name='Contract')
+        with _rebuild_lock:
+            self.assertIs(get_snapshot(), before)
+        self.assertIn('Contract', get_snapshot().element_numbers)
+
+    def test_rebuild_reads_in_one_transaction(self):
+        """Test that all rebuild queries run in a single transaction."""
+        with CaptureQueriesContext(connection) as queries:
+            PolicySnapshot.from_database(0)
+        sql = [query['sql'] for query in queries.captured_queries]
+        self.assertTrue(sql[0].startswith('SAVEPOINT'))
+        self.assertTrue(sql[-1].startswith('RELEASE SAVEPOINT'))
+        self.assertEqual(sum('SAVEPOINT' in statement for statement in sql), 2)
+
+    def test_snapshot_is_immutable(self):
+        """Test that snapshot attributes cannot be reassigned."""
+        snapshot = get_snapshot()
+        self.assertIsInstance(snapshot, PolicySnapshot)
+        with self.assertRaises(AttributeError):
+            snapshot.version = 0
+        with self.assertRaises(AttributeError):
+            snapshot.extra = 0
+
+    def test_async_and_batch_views(self):
+        """Test that the async and batch views use the snapshot."""
+        user_id = str(self.user.id)
+        response = async_to_sync(self.async_client.get)(
+            '/api/rbac/access/async/',
+            {
+                'user_id': user_id,
+                'resource': 'Document',
+                'permissions': 'read',
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(0):
+            response = self.client.post(
+                '/api/rbac/access/batch/',
+                {
+                    'checks': [
+                        {
+                            'user_id': user_id,
+                            'resource': 'Document',
+                            'permissions': 'create',
+                        },
+                        {
+                            'user_id': user_id,
+                            'resource': 'Document',
+                            'permissions': 'delete',
+                        },
+                    ]
+                },
+                format='json',
+            )
+        self.assertEqual(
+            [result['status'] for result in response.json()['results']],
+            [status.HTTP_200_OK, status.HTTP_403_FORBIDDEN],
+        )
+
+
+class CompiledPolicyTest(APITestCase):
+    """Test cases for the memory-mapped compiled policy backend."""
+
+    url = '/api/rbac/access/'
+
+    def setUp(self):
+        """Set up test data."""
+        get_cache().clear()
+        compiled_policy.clear()
+        self.addCleanup(compiled_policy.clear)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = f'{directory.name}/policy.bin'
+        settings = self.settings(
+            RBAC_POLICY_BACKEND='compiled',
+            RBAC_COMPILED_POLICY_PATH=self.path,
+            RBAC_POLICY_VERSION_CHECK_INTERVAL=0,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.user = User.objects.create_user(
+            email='user@test.com',
+            password='password',
+            first_name='Test',
+            last_name='User',
+        )
+        self.inactive = User.objects.create_user(
+            email='inactive@test.com',
+            password='password',
+            first_name='Inactive',
+            last_name='User',
+            is_active=False,
+        )
+        User.objects.create_user(
+            email='norole@test.com',
+            password='password',
+            first_name='No',
+            last_name='Role',
+        )
+        reader = Role.objects.create(name='Reader')
+        self.writer = Role.objects.create(name='Writer')
+        Role.objects.create(name='Empty')
+        self.element = BusinessElement.objects.create(
+            name='Document', description='A test document'
+        )
+        report = BusinessElement.objects.create(name='Report')
+        UserRole.objects.create(user=self.user, role=reader)
+        UserRole.objects.create(user=self.user, role=self.writer)
+        UserRole.objects.create(user=self.inactive, role=reader)
+        AccessRoleRule.objects.create(
+            role=reader, element=self.element, read_permission=True
+        )
+        AccessRoleRule.objects.create(
+            role=reader, element=report, delete_permission=True
+        )
+        AccessRoleRule.objects.create(
+            role=self.writer, element=self.element, create_permission=True
+        )
+        call_command('compile_policy', stdout=StringIO())
+
+    def get(self, user_id, resource, permissions='read'):
+        return self.client.get(
+            self.url,
+            {
+                'user_id': user_id,
+                'resource': resource,
+                'permissions': permissions,
+            },
+        )
+
+    def test_responses_match_database_backend(self):
+        """Test that every outcome matches the database backend."""
+        user_id = str(self.user.id)
+        for args in [
+            (user_id, 'Document', 'read'),
+            (user_id, 'Document', 'create'),
+            (user_id, 'Document', 'read,create'),
+            (user_id, 'Report', 'delete'),
+            (user_id, 'Report', 'read'),
+            (user_id, 'Missing', 'read'),
+            (str(User.objects.get(email='norole@test.com').id), 'Report'),
+            (str(self.inactive.id), 'Document', 'read'),
+            ('-1', 'Document', 'read'),
+            ('abc', 'Document', 'read'),
+        ]:
+            with self.subTest(args=args):
+                response = self.get(*args)
+                with self.settings(RBAC_POLICY_BACKEND='database'):
+                    expected = self.get(*args)
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response.json(), expected.json())
+
+    def test_checks_cost_no_queries(self):
+        """Test that checks against the compiled file run no queries."""
+        with self.assertNumQueries(0):
+            response = self.get(str(self.user.id), 'Document')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_published_file_is_reloaded(self):
+        """Test that workers map a newly published policy file."""
+        self.assertEqual(
+            self.get(str(self.user.id), 'Document', 'update').status_code,
+            status.HTTP_403_FORBIDDEN,
+        )
+        AccessRoleRule.objects.create(
+            role=Role.objects.get(name='Empty'),
+            element=self.element,
+            update_permission=True,
+        )
+        UserRole.objects.create(
+            user=self.user, role=Role.objects.get(name='Empty')
+        )
+        self.assertEqual(
+            self.get(str(self.user.id), 'Document', 'update').status_code,
+            status.HTTP_403_FORBIDDEN,
+        )
+        call_command('compile_policy', stdout=StringIO())
+        self.assertEqual(
+            self.get(str(self.user.id), 'Document', 'update').status_code,
+            status.HTTP_200_OK,
+        )
+
+    def test_broken_file_keeps_policy(self):
+        """Test that a truncated file keeps the policy loaded before."""
+        user_id = str(self.user.id)
+        self.assertEqual(
+            self.get(user_id, 'Document').status_code, status.HTTP_200_OK
+        )
+        with open(self.path, 'rb') as file:
+            content = file.read()
+        publish_file(self.path, content[: len(content) // 2])
+        with self.assertLogs('rbac.policy_file', 'ERROR'):
+            response = self.get(user_id, 'Document')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertNoLogs('rbac.policy_file'):
+            response = self.get(user_id, 'Document')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_header_records_policy_version(self):
+        """Test that the file header carries the policy version."""
+        policy = CompiledPolicy.from_file(self.path)
+        self.assertEqual(policy.version, PolicyVersion.current())
+
+    def test_missing_file(self):
+        """Test that a missing policy file is reported as misconfiguration."""
+        with self.settings(RBAC_COMPILED_POLICY_PATH=self.path + '.missing'):
+            with self.assertRaises(ImproperlyConfigured):
+                self.get(str(self.user.id), 'Document')
+
+    def test_invalid_file(self):
+        """Test that a file without the policy header is rejected."""
+        with open(self.path, 'wb') as file:
+            file.write(b'\0' * 64)
+        with self.assertRaises(ValueError):
+            CompiledPolicy.from_file(self.path)
+
+
+class PolicyFileTest(APITestCase):
+    """Test cases for the JSON and YAML policy file backend."""
+
+    url = '/api/rbac/access/'
+
+    def setUp(self):
+        """Set up test data."""
+        get_cache().clear()
+        policy_file.clear()
+        self.addCleanup(policy_file.clear)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.path = f'{directory.name}/policy.json'
+        settings = self.settings(
+            RBAC_POLICY_BACKEND='file',
+            RBAC_POLICY_FILE_PATH=self.path,
+            RBAC_POLICY_VERSION_CHECK_INTERVAL=0,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.user = User.objects.create_user(
+            email='user@test.com',
+            password='password',
+            first_name='Test',
+            last_name='User',
+        )
+        self.inactive = User.objects.create_user(
+            email='inactive@test.com',
+            password='password',
+            first_name='Inactive',
+            last_name='User',
+            is_active=False,
+        )
+        reader = Role.objects.create(name='Reader')
+        writer = Role.objects.create(name='Writer')
+        element = BusinessElement.objects.create(
+            name='Document', description='A test document'
+        )
+        BusinessElement.objects.create(name='Report')
+        UserRole.objects.create(user=self.user, role=reader)
+        UserRole.objects.create(user=self.user, role=writer)
+        UserRole.objects.create(user=self.inactive, role=reader)
+        AccessRoleRule.objects.create(
+            role=reader, element=element, read_permission=True
+        )
+        AccessRoleRule.objects.create(
+            role=writer, element=element, create_permission=True
+        )
+
+    def get(self, user_id, resource, permissions='read'):
+        return self.client.get(
+            self.url,
+            {
+                'user_id': user_id,
+                'resource': resource,
+                'permissions': permissions,
+            },
+        )
+
+    def write(self, content, name='policy.json'):
+        with open(f'{self.directory}/{name}', 'w') as file:
+            file.write(content)
+
+    def test_exported_policy_matches_database_backend(self):
+        """Test that an exported policy answers like the database."""
+        call_command('export_policy', output=self.path)
+        user_id = str(self.user.id)
+        for args in [
+            (user_id, 'Document', 'read'),
+            (user_id, 'Document', 'create'),
+            (user_id, 'Document', 'read,create'),
+            (user_id, 'Report', 'read'),
+            (user_id, 'Missing', 'read'),
+            (str(self.inactive.id), 'Document', 'read'),
+            ('-1', 'Document', 'read'),
+            ('abc', 'Document', 'read'),
+        ]:
+            with self.subTest(args=args):
+                with self.assertNumQueries(0):
+                    response = self.get(*args)
+                with self.settings(RBAC_POLICY_BACKEND='database'):
+                    expected = self.get(*args)
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response.json(), expected.json())
+
+    def test_yaml_export_round_trip(self):
+        """Test that a YAML export loads to the same policy as JSON."""
+        yaml_path = f'{self.directory}/policy.yaml'
+        call_command('export_policy', output=yaml_path)
+        call_command('export_policy', output=self.path)
+        with self.settings(RBAC_POLICY_FILE_PATH=yaml_path):
+            from_yaml = self.get(str(self.user.id), 'Document')
+        policy_file.clear()
+        from_json = self.get(str(self.user.id), 'Document')
+        self.assertEqual(from_yaml.status_code, status.HTTP_200_OK)
+        self.assertEqual(from_yaml.json(), from_json.json())
+
+    def test_export_to_stdout(self):
+        """Test that the export command prints JSON by default."""
+        out = StringIO()
+        call_command('export_policy', stdout=out)
+        self.assertIn('"name": "Reader"', out.getvalue())
+        out = StringIO()
+        call_command('export_policy', format='yaml', stdout=out)
+        self.assertIn('- name: Reader', out.getvalue())
+
+    def test_changed_file_is_reloaded(self):
+        """Test that editing the policy file takes effect on the next check."""
+        user_id = str(self.user.id)
+        self.write(
+            '{"elements": [{"name": "Document"}],'
+            ' "roles": [{"name": "Reader", "rules": {"Document": ["read"]}}],'
+            f' "users": [{{"id": {user_id}, "roles": ["Reader"]}}]}}'
+        )
+        self.assertEqual(
+            self.get(user_id, 'Document').status_code, status.HTTP_200_OK
+        )
+        self.write(
+            '{"elements": [{"name": "Document"}],'
+            ' "roles": [{"name": "Reader", "rules": {"Document": []}}],'
+            f' "users": [{{"id": {user_id}, "roles": ["Reader"]}}]}}'
+        )
+        self.assertEqual(
+            self.get(user_id, 'Document').status_code,
+            status.HTTP_403_FORBIDDEN,
+        )
+
+    def test_broken_file_keeps_policy(self):
+        """Test that an unparsable edit keeps the policy loaded before."""
+        user_id = str(self.user.id)
+        policy = (
+            '{"elements": [{"name": "Document"}],'
+            ' "roles": [{"name": "Reader", "rules": {"Document": ["read"]}}],'
+            f' "users": [{{"id": {user_id}, "roles": ["Reader"]}}]}}'
+        )
+        self.write(policy)
+        self.assertEqual(
+            self.get(user_id, 'Document').status_code, status.HTTP_200_OK
+        )
+        for content in [policy[:-10], '{"users": [{"roles": []}]}']:
+            with self.subTest(content=content):
+                self.write(content)
+                with self.assertLogs('rbac.policy_file', 'ERROR'):
+                    response = self.get(user_id, 'Document')
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                with self.assertNoLogs('rbac.policy_file'):
+                    response = self.get(user_id, 'Document')
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_invalid_references(self):
+        """Test that unknown roles, elements and permissions are rejected."""
+        for policy in [
+            {'users': [{'id': 1, 'roles': ['Missing']}]},
+            {'roles': [{'name': 'Reader', 'rules': {'Missing': ['read']}}]},
+            {
+                'elements': [{'name': 'Document'}],
+                'roles': [
+                    {'name': 'Reader', 'rules': {'Document': ['unknown']}}
+                ],
+            },
+        ]:
+            with self.subTest(policy=policy):
+                with self.assertRaises(ValueError):
+                    snapshot_from_policy(policy)
+
+    def test_missing_file(self):
+        """Test that a missing policy file is reported as misconfiguration."""
+        with self.assertRaises(ImproperlyConfigured):
+            self.get(str(self.user.id), 'Document')
+
+
+class AccessBatchViewTest(APITestCase):
+    """Test cases for AccessBatchView."""
+
+    url = '/api/rbac/access/batch/'
+
+    def setUp(self):
+        """Set up test data."""
+        get_cache().clear()
+        self.reader = User.objects.create_user(
+            email='reader@test.com',
+            password='password',
+            first_name='Test',
+            last_name='Reader',
+        )
+        self.inactive = User.objects.create_user(
+            email='inactive@test.com',
+            password='password',
+            first_name='Test',
+            last_name='Inactive',
+            is_active=False,
+        )
+        self.role = Role.objects.create(name='Reader')
+        self.document = BusinessElement.objects.create(name='Document')
+        self.report = BusinessElement.objects.create(name='Report')
+        UserRole.objects.create(user=self.reader, role=self.role)
+        AccessRoleRule.objects.create(
+            role=self.role, element=self.document, read_permission=True
+        )
+        AccessRoleRule.objects.create(
+            role=self.role,
+            element=self.report,
+            read_permission=True,
+            create_permission=True,
+        )
+
+    def check(self, user, resource, permissions):
+        return {
+            'user_id': str(user.id),
+            'resource': resource,
+            'permissions': permissions,
+        }
+
+    def test_results_in_input_order(self):
+        """Test that each check gets the single endpoint's decision."""
+        checks = [
+            self.check(self.reader, 'Report', 'read,create'),
+            self.check(self.reader, 'Document', 'create'),
+            self.check(self.inactive, 'Document', 'read'),
+            self.check(self.reader, 'Missing', 'read'),
+            {'user_id': str(self.reader.id), 'resource': 'Document'},
+            self.check(self.reader, 'Document', ['read']),
+        ]
+        response = self.client.post(self.url, {'checks': checks}, 'json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        statuses = [r['status'] for r in response.data['results']]
+        self.assertEqual(statuses, [200, 403, 401, 403, 400, 200])
+        self.assertEqual(response.data['results'][0]['data']['name'], 'Report')
+        self.assertEqual(
+            response.data['results'][3]['data'],
+            {'error': 'Resource not found'},
+        )
+
+    def test_query_count_does_not_depend_on_batch_size(self):
+        """Test that a batch is answered with a fixed number of queries."""
+        checks = [
+            self.check(self.reader, 'Document', 'read'),
+            self.check(self.inactive, 'Report', 'read'),
+            self.check(self.reader, 'Missing', 'read'),
+        ]
+        with self.assertNumQueries(4):
+            self.client.post(self.url, {'checks': checks}, 'json')
+
+        get_cache().clear()
+        for i in range(20):
+            user = User.objects.create_user(
+                email=f'user{i}@test.com',
+                password='password',
+                first_name='Test',
+                last_name='User',
+            )
+            UserRole.objects.create(user=user, role=self.role)
+            checks.append(self.check(user, 'Report', 'create'))
+            checks.append(self.check(user, f'Element{i}', 'read'))
+        # Role writes keep the element index; drop it to compare.
+        element_index.clear()
+        with self.assertNumQueries(4):
+            response = self.client.post(self.url, {'checks': checks}, 'json')
+        self.assertEqual(len(response.data['results']), len(checks))
+
+    def test_missing_checks(self):
+        """Test 400 when the checks list is missing."""
+        response = self.client.post(self.url, {}, 'json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_too_many_checks(self):
+        """Test 400 when the batch exceeds the configured size."""
+        checks = [self.check(self.reader, 'Document', 'read')] * 3
+        with self.settings(RBAC_ACCESS_BATCH_MAX_SIZE=2):
+            response = self.client.post(self.url, {'checks': checks}, 'json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class EffectivePermissionsViewTest(APITestCase):
+    """Test cases for EffectivePermissionsView."""
+
+    url = '/api/rbac/access/effective/'
+
+    def setUp(self):
+        """Set up test data."""
+        self.user = User.objects.create_user(
+            email='user@test.com',
+            password='password',
+            first_name='Test',
+            last_name='User',
+        )
+        self.reader = Role.objects.create(name='Reader')
+        self.writer = Role.objects.create(name='Writer')
+        self.document = BusinessElement.objects.create(name='Document')
+        self.report = BusinessElement.objects.create(name='Report')
+        BusinessElement.objects.create(name='Hidden')
+        UserRole.objects.create(user=self.user, role=self.reader)
+        UserRole.objects.create(user=self.user, role=self.writer)
+        AccessRoleRule.objects.create(
+            role=self.reader, element=self.document, read_permission=True
+        )
+        AccessRoleRule.objects.create(
+            role=self.writer, element=self.document, create_permission=True
+        )
+        AccessRoleRule.objects.create(
+            role=self.reader, element=self.report, read_all_permission=True
+        )
+
+    def test_merged_permissions(self):
+        """Test that permissions of all roles are merged per element."""
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, {'user_id': self.user.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data), {'Document', 'Report'})
+        self.assertEqual(
+            response.data['Document'],
+            mask_to_permissions(permissions_to_mask(['read', 'create'])),
+        )
+        self.assertTrue(response.data['Report']['read_all'])
+        self.assertFalse(response.data['Report']['read'])
+
+    def test_inactive_user(self):
+        """Test 401 when the user is inactive."""
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(self.url, {'user_id': self.user.id})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_missing_user_id(self):
+        """Test 400 when user_id is missing."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class UserEffectivePermissionTest(TestCase):
+    """Test cases for maintenance of the effective permission table."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.user = User.objects.create_user(
+            email='user@test.com',
+            password='password',
+            first_name='Test',
+            last_name='User',
+        )
+        self.reader = Role.objects.create(name='Reader')
+        self.writer = Role.objects.create(name='Writer')
+        self.document = BusinessElement.objects.create(name='Document')
+        self.read_rule = AccessRoleRule.objects.create(
+            role=self.reader, element=self.document, read_permission=True
+        )
+        self.create_rule = AccessRoleRule.objects.create(
+            role=self.writer, element=self.document, create_permission=True
+        )
+
+    def effective(self):
+        row = UserEffectivePermission.objects.filter(
+            user=self.user, element=self.document
+        ).first()
+        return row and (row.permissions_mask, sorted(row.grants))
+
+    def test_role_assignment_adds_permissions(self):
+        """Test that assigning roles merges their rules."""
+        UserRole.objects.create(user=self.user, role=self.reader)
+        UserRole.objects.create(user=self.user, role=self.writer)
+        read = permissions_to_mask(['read'])
+        create = permissions_to_mask(['create'])
+        self.assertEqual(self.effective(), (read | create, [read, create]))
+
+    def test_role_removal_removes_permissions(self):
+        """Test that removing the last role deletes the row."""
+        user_role = UserRole.objects.create(user=self.user, role=self.reader)
+        user_role.delete()
+        self.assertIsNone(self.effective())
+
+    def test_rule_update_refreshes_permissions(self):
+        """Test that changing a rule updates rows of its role holders."""
+        UserRole.objects.create(user=self.user, role=self.reader)
+        self.read_rule.update_permission = True
+        self.read_rule.save()
+        mask = permissions_to_mask(['read', 'update'])
+        self.assertEqual(self.effective(), (mask, [mask]))
+
+    def test_role_deletion_removes_permissions(self):
+        """Test that deleting a role removes the permissions it granted."""
+        UserRole.objects.create(user=self.user, role=self.reader)
+        UserRole.objects.create(user=self.user, role=self.writer)
+        self.writer.delete()
+        mask = permissions_to_mask(['read'])
+        self.assertEqual(self.effective(), (mask, [mask]))
+
+    def test_rule_moved_to_other_element(self):
+        """Test that moving a rule revokes it on the previous element."""
+        UserRole.objects.create(user=self.user, role=self.reader)
+        report = BusinessElement.objects.create(name='Report')
+        rule = AccessRoleRule.objects.get(pk=self.read_rule.pk)
+        rule.element = report
+        rule.save()
+        self.assertIsNone(self.effective())
+        self.assertTrue(
+            UserEffectivePermission.objects.filter(
+                user=self.user, element=report
+            ).exists()
+        )
+        self.assertEqual(find_inconsistent_effective_permissions(), [])
+
+    def test_rule_moved_to_other_role(self):
+        """Test that moving a rule revokes it from the previous role."""
+        UserRole.objects.create(user=self.user, role=self.reader)
+        self.create_rule.delete()
+        self.read_rule.role = self.writer
+        self.read_rule.save()
+        self.assertIsNone(self.effective())
+        self.assertEqual(find_inconsistent_effective_permissions(), [])
+
+    def test_user_role_moved_to_other_user(self):
+        """Test that reassigning a role revokes it from the previous user."""
+        other = User.objects.create_user(
+            email='other@test.com',
+            password='password',
+            first_name='Other',
+            last_name='User',
+        )
+        UserRole.objects.create(user=self.user, role=self.reader)
+        # user is deferred, so its previous value is read from the database.
+        user_role = UserRole.objects.only('pk', 'role').get()
+        user_role.user = other
+        user_role.save()
+        self.assertIsNone(self.effective())
+        self.assertTrue(
+            UserEffectivePermission.objects.filter(
+                user=other, element=self.document
+            ).exists()
+        )
+        self.assertEqual(find_inconsistent_effective_permissions(), [])
+
+    def test_rebuild_command(self):
+        """Test rebuilding and checking the table from the command."""
+        UserRole.objects.create(user=self.user, role=self.reader)
+        UserEffectivePermission.objects.all().delete()
+        with self.assertRaises(CommandError):
+            call_command(
+                'rebuild_effective_permissions', check=True, stdout=StringIO()
+            )
+        call_command('rebuild_effective_permissions', stdout=StringIO())
+        call_command(
+            'rebuild_effective_permissions', check=True, stdout=StringIO()
+        )
+        mask = permissions_to_mask(['read'])
+        self.assertEqual(self.effective(), (mask, [mask]))
+
+
+class SeedSyntheticPolicyTest(TestCase):
+    """Test cases for the seed_synthetic_policy management command."""
+
+    def seed(self, **options):
+        options = {
+            'users': 30,
+            'roles': 5,
+            'elements': 8,
+            'roles_per_user': 2,
+            'rule_density': 0.5,
+            'chunk_size': 7,
+            'stdout': StringIO(),
+            **options,
+        }
+        call_command('seed_synthetic_policy', **options)
+
+    def rules(self):
+        return set(
+            AccessRoleRule.objects.values_list(
+                'role__name', 'element__name', 'permissions_mask'
+            )
+        )
+
+    def test_creates_requested_policy(self):
+        """Test that the requested numbers of objects are created."""
+        self.seed()
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Role.objects.count(), 5)
+        self.assertEqual(BusinessElement.objects.count(), 8)
+        self.assertEqual(UserRole.objects.count(), 60)
+        for user in User.objects.all():
+            self.assertEqual(user.userrole_set.count(), 2)
+        self.assertTrue(User.objects.first().check_password('password'))
+
+    def test_rules_match_flags(self):
+        """Test that rule masks match the permission flags."""
+        self.seed()
+        self.assertTrue(self.rules())
+        for rule in AccessRoleRule.objects.all():
+            permissions = mask_to_permissions(rule.permissions_mask)
+            for name, granted in permissions.items():
+                self.assertEqual(getattr(rule, f'{name}_permission'), granted)
+
+    def test_effective_permissions_are_consistent(self):
+        """Test that the effective permission table is filled."""
+        version = PolicyVersion.current()
+        self.seed()
+        self.assertTrue(UserEffectivePermission.objects.exists())
+        call_command(
+            'rebuild_effective_permissions', check=True, stdout=StringIO()
+        )
+        self.assertGreater(PolicyVersion.current(), version)
+
+    def test_seed_is_deterministic(self):
+        """Test that the same seed generates the same policy."""
+        self.seed(seed=3)
+        rules = self.rules()
+        AccessRoleRule.objects.all().delete()
+        Role.objects.all().delete()
+        BusinessElement.objects.all().delete()
+        User.objects.all().delete()
+        self.seed(seed=3)
+        self.assertEqual(self.rules(), rules)
+
+    def test_existing_seed(self):
+        """Test that reusing a seed reports an error."""
+        self.seed(seed=1)
+        with self.assertRaises(CommandError):
+            self.seed(seed=1)
+
+    def test_invalid_chunk_size(self):
+        """Test that chunk sizes below one are rejected."""
+        for chunk_size in (0, -1):
+            with self.subTest(chunk_size=chunk_size):
+                with self.assertRaises(CommandError):
+                    self.seed(chunk_size=chunk_size)
+        self.assertFalse(Role.objects.exists())
+
+    def test_skip_effective_permissions(self):
+        """Test that the effective permission table can be left empty."""
+        self.seed(skip_effective_permissions=True)
+        self.assertFalse(UserEffectivePermission.objects.exists())
+
+
+class BenchAccessTest(TestCase):
+    """Test cases for the bench_access management command."""
+
+    def test_reports_every_scenario(self):
+        """Test that every scenario is reported as JSON."""
+        out = StringIO()
+        call_command(
+            'bench_access', iterations=3, role_counts=[1, 3], stdout=out
+        )
+        results = json.loads(out.getvalue())
+        self.assertEqual(
+            [scenario['name'] for scenario in results['scenarios']],
+            [
+                f'{cache}-{roles}-roles-{outcome}'
+                for roles in (1, 3)
+                for outcome in ('hit', 'deny')
+                for cache in ('cold', 'warm')
+            ],
+        )
+        for scenario in results['scenarios']:
+            self.assertEqual(scenario['checks'], 3)
+            self.assertEqual(
+                set(scenario['latency_ms']), {'mean', 'p50', 'p95', 'p99'}
+            )
+            if scenario['cache'] == 'warm':
+                self.assertEqual(scenario['queries_per_check'], 0)
+            else:
+                self.assertGreater(scenario['queries_per_check'], 0)
+
+    def test_leftover_fixture_does_not_collide(self):
+        """Test that rows left by an interrupted run do not break a rerun."""
+
+        class KeepFixtureCommand(BenchAccessCommand):
+            def delete_fixture(self, fixture):
+                pass
+
+        call_command(
+            KeepFixtureCommand(),
+            iterations=2,
+            role_counts=[1],
+            stdout=StringIO(),
+        )
+        call_command(
+            'bench_access', iterations=2, role_counts=[1], stdout=StringIO()
+        )
+        self.assertEqual(BusinessElement.objects.count(), 2)
+
+    def test_fixture_is_deleted(self):
+        """Test that the benchmark leaves the database and cache unchanged."""
+        get_cache().set('live-entry', 1)
+        call_command(
+            'bench_access',
+            iterations=2,
+            role_counts=[2],
+            backend='snapshot',
+            stdout=StringIO(),
+        )
+        self.assertFalse(Role.objects.exists())
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(BusinessElement.objects.exists())
+        self.assertFalse(AccessRoleRule.objects.exists())
+        self.assertEqual(get_cache().get('live-entry'), 1)
+
+
+class LoadTestHarnessTest(LiveServerTestCase):
+    """Test cases for the HTTP load test harness."""
+
+    def setUp(self):
+        """Set up test data."""
+        get_cache().clear()
+        self.user = User.objects.create_superuser(
+            email='admin@test.com',
+            password='password',
+            first_name='Admin',
+            last_name='User',
+        )
+        BusinessElement.objects.create(name='Document')
+        self.port = int(self.live_server_url.rsplit(':', 1)[1])
+
+    def load(self, request, total=20, concurrency=4):
+        return asyncio.run(
+            run_load('localhost', self.port, request, total, concurrency)
+        )
+
+    def test_access_load(self):
+        """Test that every request is sent and its status recorded."""
+        result = self.load(
+            json_request(
+                'GET',
+                f'/api/rbac/access/?user_id={self.user.id}'
+                '&resource=Document&permissions=read',
+            )
+        )
+        self.assertEqual(result['requests'], 20)
+        self.assertEqual(result['statuses'], {'403': 20})
+        self.assertEqual(result['error_rate'], 0)
+        self.assertEqual(sum(result['histogram_ms'].values()), 20)
+        self.assertLessEqual(
+            result['latency_ms']['p50'], result['latency_ms']['p99']
+        )
+
+    def test_access_requests_are_allowed_and_denied(self):
+        """Test that the access endpoints measure both outcomes."""
+        command = LoadTestCommand()
+        command.create_access_policy(self.user)
+        requests = command.build_requests(
+            self.user,
+            {
+                'endpoints': ['access', 'access-deny'],
+                'email': 'admin@test.com',
+                'password': 'password',
+            },
+        )
+        self.assertEqual(
+            self.load(requests['access'], total=4)['statuses'], {'200': 4}
+        )
+        self.assertEqual(
+            self.load(requests['access-deny'], total=4)['statuses'],
+            {'403': 4},
+        )
+
+    def test_authenticated_and_json_requests(self):
+        """Test that token and JSON body requests are sent correctly."""
+        token = Token.objects.create(user=self.user).key
+        roles = self.load(
+            json_request('GET', '/api/rbac/roles/', token=token), total=5
+        )
+        self.assertEqual(roles['statuses'], {'200': 5})
+        login = self.load(
+            json_request(
+                'POST',
+                '/api/users/login/',
+                {'email': 'admin@test.com', 'password': 'wrong'},
+            ),
+            total=2,
+            concurrency=1,
+        )
+        self.assertEqual(login['statuses'], {'401': 2})
+
+    def test_transport_errors_are_counted(self):
+        """Test that refused connections count as errors."""
+        port = free_port()
+        result = asyncio.run(
+            run_load('127.0.0.1', port, json_request('GET', '/'), 3, 1)
+        )
+        self.assertEqual(result['transport_errors'], 3)
+        self.assertEqual(result['error_rate'], 1)
+        self.assertNotIn('latency_ms', result)
+
+    def test_start_server(self):
+        """Test that a server command is started and stopped."""
+        port = free_port()
+        process = start_server(
+            '{python} -m http.server {port} --bind 127.0.0.1', port, 1
+        )
+        try:
+            result = asyncio.run(
+                run_load('127.0.0.1', port, json_request('GET', '/'), 3, 1)
+            )
+        finally:
+            stop_server(process)
+        self.assertEqual(result['statuses'], {'200': 3})
+        self.assertIsNotNone(process.returncode)
+
+    def test_failing_server_command(self):
+        """Test that a server exiting at startup is reported."""
+        with self.assertRaisesRegex(RuntimeError, 'exited with code 3'):
+            start_server('{python} -c "exit(3)"', free_port(), 1)
+
+    def test_summarize(self):
+        """Test that latencies are bucketed and 5xx count as errors."""
+        summary = summarize(
+            [500_000, 1_500_000, 30_000_000, 9_000_000_000],
+            Counter({200: 3, 503: 1}),
+            1,
+            1.0,
+        )
+        self.assertEqual(summary['requests'], 5)
+        self.assertEqual(summary['error_rate'], 0.4)
+        self.assertEqual(summary['histogram_ms']['<=1'], 1)
+        self.assertEqual(summary['histogram_ms']['<=2'], 1)
+        self.assertEqual(summary['histogram_ms']['<=50'], 1)
+        self.assertEqual(summary['histogram_ms']['>5000'], 1)
+
+
+class QueryBudgetTest(APITestCase):
+    """Test cases for the SQL query budgets of the RBAC endpoints.
+
+    Every endpoint is requested with cold caches against datasets of
+    increasing size. The number of queries must not grow with the data and
+    must stay within the budget recorded in query_budgets.json.
+    """
+
+    sizes = (3, 15)
+
+    def setUp(self):
+        """Set up test data."""
+        self.budgets = json.loads(QUERY_BUDGETS_PATH.read_text())
+        self.admin = User.objects.create_superuser(
+            email='admin@test.com',
+            password='password',
+            first_name='Admin',
+            last_name='User',
+        )
+        self.token = Token.objects.create(user=self.admin)
+
+    def seed(self, size):
+        call_command(
+            'seed_synthetic_policy',
+            users=size,
+            roles=size,
+            elements=size,
+            roles_per_user=2,
+            rule_density=0.5,
+            seed=size,
+            stdout=StringIO(),
+        )
+
+    def endpoints(self):
+        """Map endpoint names to functions requesting them."""
+        granted = UserEffectivePermission.objects.select_related(
+            'user', 'element'
+        ).last()
+        user, element = granted.user, granted.element
+        role = Role.objects.order_by('pk').last()
+        rule = AccessRoleRule.objects.order_by('pk').last()
+        check = {
+            'user_id': str(user.pk),
+            'resource': element.name,
+            'permissions': next(
+                name
+                for name, flag in mask_to_permissions(
+                    granted.grants[0]
+                ).items()
+                if flag
+            ),
+        }
+        checks = [
+            {
+                'user_id': str(user_id),
+                'resource': name,
+                'permissions': 'read',
+            }
+            for user_id, name in zip(
+                User.objects.values_list('pk', flat=True)[:10],
+                BusinessElement.objects.values_list('name', flat=True)[:10],
+            )
+        ]
+        token = {'HTTP_AUTHORIZATION': f'Token {self.token.key}'}
+        api = '/api/rbac'
+        admin = '/admin/rbac'
+        get = self.client.get
+        return {
+            'access': lambda: get(f'{api}/access/', check),
+            'access-async': lambda: get(f'{api}/access/async/', check),
+            'access-batch': lambda: self.client.post(
+                f'{api}/access/batch/', {'checks': checks}, format='json'
+            ),
+            'access-effective': lambda: get(
+                f'{api}/access/effective/', {'user_id': user.pk}
+            ),
+            'role-list': lambda: get(f'{api}/roles/', **token),
+            'role-detail': lambda: get(f'{api}/roles/{role.pk}/', **token),
+            'businesselement-list': lambda: get(
+                f'{api}/business-elements/', **token
+            ),
+            'businesselement-detail': lambda: get(
+                f'{api}/business-elements/{element.pk}/', **token
+            ),
+            'accessrolerule-list': lambda: get(
+                f'{api}/access-rules/', **token
+            ),
+            'accessrolerule-detail': lambda: get(
+                f'{api}/access-rules/{rule.pk}/', **token
+            ),
+            'metrics': lambda: get(f'{api}/metrics/'),
+            'admin-role': lambda: get(f'{admin}/role/'),
+            'admin-businesselement': lambda: get(f'{admin}/businesselement/'),
+            'admin-accessrolerule': lambda: get(f'{admin}/accessrolerule/'),
+            'admin-userrole': lambda: get(f'{admin}/userrole/'),
+            'admin-usereffectivepermission': lambda: get(
+                f'{admin}/usereffectivepermission/'
+            ),
+            'admin-policyversion': lambda: get(f'{admin}/policyversion/'),
+        }
+
+    def measure(self):
+        """Return the number of queries of every endpoint."""
+        self.client.force_login(self.admin)
+        counts = {}
+        for name, request in self.endpoints().items():
+            get_cache().clear()
+            get_token_cache().clear()
+            element_index.clear()
+            expire_policy_version()
+            with CaptureQueriesContext(connection) as queries:
+                response = request()
+            self.assertEqual(response.status_code, status.HTTP_200_OK, name)
+            counts[name] = len(queries)
+        return counts
+
+    def test_query_counts_within_budgets(self):
+        """Test that query counts are constant and within budget."""
+        measured = []
+        for size in self.sizes:
+            self.seed(size)
+            measured.append(self.measure())
+        self.assertEqual(set(measured[0]), set(self.budgets))
+        for name, budget in self.budgets.items():
+            counts = [counts[name] for counts in measured]
+            with self.subTest(endpoint=name):
+                self.assertEqual(
+                    len(set(counts)),
+                    1,
+                    f'{name} runs {counts} queries for dataset sizes '
+                    f'{self.sizes}.',
+                )
+                self.assertLessEqual(
+                    counts[-1],
+                    budget,
+                    f'{name} exceeds its budget; update '
+                    f'{QUERY_BUDGETS_PATH.name} if this is intended.',
+                )
+
 
 class IsSuperuserPermissionTest(APITestCase):
     """Test cases for IsSuperuser permission class."""
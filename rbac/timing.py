@@ -0,0 +1,144 @@
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+
+from django.conf import settings
+
+# Upper bounds, in milliseconds, of the phase histogram buckets; the last
+# bucket counts everything slower.
+HISTOGRAM_BOUNDS = (
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    25,
+    50,
+    100,
+    250,
+    500,
+    1000,
+)
+
+_NO_PHASE = nullcontext()
+_current_timer = contextvars.ContextVar('rbac_phase_timer', default=None)
+
+
+class PhaseTimer:
+    """Durations of the named phases of one access check, in seconds."""
+
+    __slots__ = ('durations', 'started_at')
+
+    def __init__(self):
+        self.durations = {}
+        self.started_at = time.perf_counter()
+
+    def add(self, name, seconds):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    def server_timing(self):
+        """Format the durations as a Server-Timing header value."""
+        return ', '.join(
+            f'{name};dur={seconds * 1000:.3f}'
+            for name, seconds in self.durations.items()
+        )
+
+
+class _Phase:
+    __slots__ = ('name', 'started_at', 'timer')
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.timer.add(self.name, time.perf_counter() - self.started_at)
+
+
+def phase(name):
+    """Return a context manager timing a phase of the current check.
+
+    Does nothing unless a timer was started for the current request, so
+    instrumented code costs a context variable lookup when timing is off.
+    """
+    timer = _current_timer.get()
+    if timer is None:
+        return _NO_PHASE
+    return _Phase(timer, name)
+
+
+def start_timer():
+    """Start timing the current request if RBAC_ACCESS_TIMING is enabled.
+
+    Returns the timer and a token for stop_timer(), or (None, None).
+    """
+    if not getattr(settings, 'RBAC_ACCESS_TIMING', False):
+        return None, None
+    timer = PhaseTimer()
+    return timer, _current_timer.set(timer)
+
+
+def stop_timer(timer, token):
+    """Finish a timer: add the total and record every phase."""
+    _current_timer.reset(token)
+    timer.add('total', time.perf_counter() - timer.started_at)
+    for name, seconds in timer.durations.items():
+        phase_histogram.record(name, seconds * 1000)
+
+
+class PhaseHistogram:
+    """In-process histograms of access check phase durations."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # {phase: [bucket counts..., count, sum in ms]}
+        self._phases = {}
+
+    def record(self, name, ms):
+        bucket = bisect_left(HISTOGRAM_BOUNDS, ms)
+        with self._lock:
+            counts = self._phases.get(name)
+            if counts is None:
+                counts = self._phases[name] = [0] * (len(HISTOGRAM_BOUNDS) + 3)
+            counts[bucket] += 1
+            counts[-2] += 1
+            counts[-1] += ms
+
+    def snapshot(self):
+        """Return {phase: {'buckets', 'count', 'sum_ms'}} for every phase.
+
+        'buckets' maps each upper bound in milliseconds, and '+Inf', to
+        the number of durations in that bucket.
+        """
+        with self._lock:
+            phases = {
+                name: list(counts) for name, counts in self._phases.items()
+            }
+        return {
+            name: {
+                'buckets': dict(
+                    zip(
+                        [*map(str, HISTOGRAM_BOUNDS), '+Inf'],
+                        counts[:-2],
+                    )
+                ),
+                'count': counts[-2],
+                'sum_ms': counts[-1],
+            }
+            for name, counts in phases.items()
+        }
+
+    def clear(self):
+        with self._lock:
+            self._phases = {}
+
+
+phase_histogram = PhaseHistogram()
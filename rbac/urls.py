@@ -11,5 +11,21 @@ router.register(r'access-rules', views.AccessRoleRuleViewSet)
 
 urlpatterns = [
     path('access/', views.AccessView.as_view(), name='access'),
+    path(
+        'access/async/',
+        views.AsyncAccessView.as_view(),
+        name='access-async',
+    ),
+    path(
+        'access/batch/',
+        views.AccessBatchView.as_view(),
+        name='access-batch',
+    ),
+    path(
+        'access/effective/',
+        views.EffectivePermissionsView.as_view(),
+        name='access-effective',
+    ),
+    path('metrics/', views.MetricsView.as_view(), name='metrics'),
     path('', include(router.urls)),
 ]
@@ -1,22 +1,58 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.views import View
+from rest_framework.renderers import JSONRenderer
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.viewsets import ModelViewSet
-from django.contrib.auth import get_user_model
 
-from .models import BusinessElement, UserRole, AccessRoleRule, Role
+from .models import BusinessElement, AccessRoleRule, Role
 from .serializers import (
     BusinessElementSerializer,
     RoleSerializer,
     AccessRoleRuleSerializer,
 )
+from .metrics import render_metrics
 from .permissions import IsSuperuser
+from .services import (
+    aget_access_entry,
+    decide,
+    get_access_entries,
+    get_access_entry,
+    get_effective_permissions,
+    parse_permissions,
+)
+from .timing import phase, start_timer, stop_timer
 
-User = get_user_model()
+MISSING_PARAMETERS_ERROR = {
+    'error': 'Missing required parameters: user_id, resource, permissions'
+}
 
 
 class AccessView(APIView):
-    """View for checking user access to business resources."""
+    """View for checking user access to business resources.
+
+    With RBAC_ACCESS_TIMING enabled, the duration of every phase of the
+    check is returned in a Server-Timing header and recorded in the
+    in-process phase histogram.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        timer, token = start_timer()
+        if timer is None:
+            return super().dispatch(request, *args, **kwargs)
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+            with phase('render'):
+                response.render()
+        finally:
+            stop_timer(timer, token)
+        response['Server-Timing'] = timer.server_timing()
+        return response
 
     def get(self, request):
         user_id = request.query_params.get('user_id')
@@ -25,65 +61,160 @@ class AccessView(APIView):
 
         if not user_id or not resource_name or not permissions_str:
             return Response(
-                {
-                    'error': 'Missing required parameters: user_id, resource, permissions'
-                },
+                MISSING_PARAMETERS_ERROR,
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        # Validate user exists
-        try:
-            user = User.objects.get(id=user_id, is_active=True)
-        except User.DoesNotExist:
-            return Response(
-                {'error': 'User not found or inactive'},
-                status=status.HTTP_401_UNAUTHORIZED,
+        entry = get_access_entry(user_id, resource_name)
+        with phase('decide'):
+            status_code, data = decide(
+                entry, parse_permissions(permissions_str)
             )
+        return Response(data, status=status_code)
+
+
+class AsyncAccessView(View):
+    """Async view for checking user access to business resources.
+
+    Returns the same status codes and JSON bodies as AccessView, including
+    the Server-Timing header, but runs on the event loop under ASGI
+    instead of occupying a worker thread.
+    """
 
-        # Get business element
+    http_method_names = ['get', 'head', 'options']
+
+    async def get(self, request):
+        timer, token = start_timer()
+        if timer is None:
+            return await self.check(request)
         try:
-            business_element = BusinessElement.objects.get(name=resource_name)
-        except BusinessElement.DoesNotExist:
-            return Response(
-                {'error': 'Resource not found'},
-                status=status.HTTP_403_FORBIDDEN,
+            response = await self.check(request)
+        finally:
+            stop_timer(timer, token)
+        response['Server-Timing'] = timer.server_timing()
+        return response
+
+    async def check(self, request):
+        user_id = request.GET.get('user_id')
+        resource_name = request.GET.get('resource')
+        permissions_str = request.GET.get('permissions', '')
+
+        if not user_id or not resource_name or not permissions_str:
+            return self.render(
+                MISSING_PARAMETERS_ERROR, status.HTTP_400_BAD_REQUEST
             )
 
-        # Parse permissions
-        required_permissions = [
-            p.strip() for p in permissions_str.split(',') if p.strip()
-        ]
+        entry = await aget_access_entry(user_id, resource_name)
+        with phase('decide'):
+            status_code, data = decide(
+                entry, parse_permissions(permissions_str)
+            )
+        return self.render(data, status_code)
 
-        # Get user's roles
-        user_roles = UserRole.objects.filter(user=user).values_list(
-            'role', flat=True
+    def render(self, data, status_code):
+        with phase('render'):
+            content = JSONRenderer().render(data)
+        response = HttpResponse(
+            content, status=status_code, content_type='application/json'
         )
+        response['Allow'] = 'GET, HEAD, OPTIONS'
+        patch_vary_headers(response, ['Accept'])
+        return response
 
-        # Check if any user role has all required permissions for this element
-        has_access = False
-        for role_id in user_roles:
-            try:
-                rule = AccessRoleRule.objects.get(
-                    role_id=role_id, element=business_element
+
+class AccessBatchView(APIView):
+    """View for checking many user accesses to business resources at once."""
+
+    def post(self, request):
+        checks = (
+            request.data.get('checks')
+            if isinstance(request.data, dict)
+            else None
+        )
+        if not isinstance(checks, list):
+            return Response(
+                {'error': 'Missing required parameter: checks'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        max_size = getattr(settings, 'RBAC_ACCESS_BATCH_MAX_SIZE', 1000)
+        if len(checks) > max_size:
+            return Response(
+                {'error': f'Too many checks, at most {max_size} allowed'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        items = [self.parse_check(check) for check in checks]
+        entries = get_access_entries(
+            {item[:2] for item in items if item is not None}
+        )
+
+        results = []
+        for item in items:
+            if item is None:
+                status_code = status.HTTP_400_BAD_REQUEST
+                data = MISSING_PARAMETERS_ERROR
+            else:
+                user_id, resource_name, permissions_str = item
+                status_code, data = decide(
+                    entries[user_id, resource_name],
+                    parse_permissions(permissions_str),
                 )
-                if all(
-                    getattr(rule, perm + '_permission', False)
-                    for perm in required_permissions
-                ):
-                    has_access = True
-                    break
-            except AccessRoleRule.DoesNotExist:
-                continue
-
-        if not has_access:
+            results.append({'status': status_code, 'data': data})
+        return Response({'results': results})
+
+    @staticmethod
+    def parse_check(check):
+        """Return (user_id, resource, permissions) or None if incomplete."""
+        if not isinstance(check, dict):
+            return None
+        user_id = check.get('user_id')
+        resource_name = check.get('resource')
+        permissions = check.get('permissions')
+        if isinstance(permissions, list):
+            permissions = ','.join(str(p) for p in permissions)
+        if not user_id or not resource_name or not permissions:
+            return None
+        return str(user_id), str(resource_name), str(permissions)
+
+
+class EffectivePermissionsView(APIView):
+    """View for listing a user's permissions on all business resources."""
+
+    def get(self, request):
+        user_id = request.query_params.get('user_id')
+        if not user_id:
+            return Response(
+                {'error': 'Missing required parameter: user_id'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        permissions = get_effective_permissions(user_id)
+        if permissions is None:
             return Response(
-                {'error': 'Insufficient permissions'},
-                status=status.HTTP_403_FORBIDDEN,
+                {'error': 'User not found or inactive'},
+                status=status.HTTP_401_UNAUTHORIZED,
             )
+        return Response(permissions)
+
 
-        # Return resource data
-        serializer = BusinessElementSerializer(business_element)
-        return Response(serializer.data)
+class MetricsView(View):
+    """View exposing the service metrics in the Prometheus text format.
+
+    If RBAC_METRICS_TOKEN is set, requests must send it as a bearer token.
+    """
+
+    http_method_names = ['get', 'head']
+
+    def get(self, request):
+        token = getattr(settings, 'RBAC_METRICS_TOKEN', None)
+        if token and not hmac.compare_digest(
+            request.headers.get('Authorization', ''), f'Bearer {token}'
+        ):
+            return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+        return HttpResponse(
+            render_metrics(),
+            content_type='text/plain; version=0.0.4; charset=utf-8',
+        )
 
 
 class RoleViewSet(ModelViewSet):
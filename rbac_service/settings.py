@@ -52,7 +52,8 @@ AUTH_USER_MODEL = 'users.User'
 # Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
+        'users.authentication.SignedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -61,7 +62,100 @@ REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'rbac': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'rbac',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    # Files shared by every worker on this host, so an invalidated token
+    # is rejected by all of them on its next use.
+    'tokens': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'tokens',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    # Files shared by every worker on this host; expired entries are
+    # deleted before any live one is culled.
+    'revocations': {
+        'BACKEND': 'users.cache.ExpiringFileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'revocations',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+
+# Users
+# Cache alias used by CachedTokenAuthentication. It must be shared by all
+# workers so a revoked token is rejected by every worker immediately; use
+# Redis or Memcached when the workers run on several hosts.
+USERS_TOKEN_CACHE_ALIAS = 'tokens'
+# Access tokens issued by login and registration: 'database' (authtoken
+# rows, "Token <key>") or 'signed' (stateless tokens signed with SECRET_KEY,
+# "Bearer <token>").
+USERS_TOKEN_FORMAT = 'database'
+# Seconds after their last use at which database tokens expire; None keeps
+# them forever. python manage.py sweep_tokens deletes expired tokens.
+USERS_TOKEN_TTL = 60 * 60 * 24 * 14
+# Resolution, in seconds, of token last-use times, which are written to the
+# database in batches at most this often per worker.
+USERS_TOKEN_LAST_USED_INTERVAL = 60
+# Lifetime of signed tokens in seconds.
+USERS_SIGNED_TOKEN_TTL = 3600
+# Cache alias holding revoked signed tokens. It must be shared by all
+# workers and must not evict entries before they expire; use Redis without
+# an eviction policy when the workers run on several hosts.
+USERS_REVOCATION_CACHE_ALIAS = 'revocations'
+# Threads hashing passwords for the async login and registration endpoints;
+# None uses one per CPU.
+USERS_HASHER_WORKERS = None
+# Hashes that may be running or waiting at once before the async endpoints
+# answer 503; None allows four per worker thread.
+USERS_HASHER_MAX_PENDING = None
+# Retry-After header, in seconds, of those 503 responses.
+USERS_HASHER_RETRY_AFTER = 1
+# Processes hashing passwords during bulk user imports; None uses one per
+# CPU and 0 hashes in the importing process.
+USERS_IMPORT_PROCESSES = None
+# Rows validated and inserted per transaction by bulk user imports.
+USERS_IMPORT_CHUNK_SIZE = 1000
+
+# RBAC
+# Cache alias used for access decisions. Point it at a shared backend
+# (file-based, Redis, Memcached) so all workers see the same entries.
+RBAC_CACHE_ALIAS = 'rbac'
+# How often, in milliseconds, each worker re-reads the policy version from
+# the database to notice writes made by other workers.
+RBAC_POLICY_VERSION_CHECK_INTERVAL = 1000
+# Seconds to remember missing or inactive users and missing resources.
+RBAC_NEGATIVE_CACHE_TIMEOUT = 30
+# Maximum number of checks accepted by the batch access endpoint.
+RBAC_ACCESS_BATCH_MAX_SIZE = 1000
+# How access checks are evaluated: 'database' (effective permission table
+# and cache), 'snapshot' (in-memory copy of the whole policy), 'compiled'
+# (memory-mapped file written by manage.py compile_policy) or 'file'
+# (JSON or YAML policy file, no database needed).
+RBAC_POLICY_BACKEND = 'database'
+# Compiled policy file used by the 'compiled' backend.
+RBAC_COMPILED_POLICY_PATH = BASE_DIR / 'rbac_policy.bin'
+# JSON or YAML (.yaml/.yml, requires PyYAML) policy file used by the 'file'
+# backend.
+RBAC_POLICY_FILE_PATH = BASE_DIR / 'rbac_policy.json'
+# Time the phases of every access check and return them in a Server-Timing
+# header and an in-process histogram.
+RBAC_ACCESS_TIMING = False
+# Bearer token required by the metrics endpoint; None leaves it open.
+RBAC_METRICS_TOKEN = None
+
 MIDDLEWARE = [
+    'rbac.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
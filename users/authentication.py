@@ -0,0 +1,339 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .models import TokenUsage, User
+
+KEY_PREFIX = 'users:token'
+REVOKED_PREFIX = 'users:revoked'
+TOKEN_FORMATS = ('database', 'signed')
+SIGNED_TOKEN_SALT = 'users.authentication.signed-token'
+
+# Invalidated tokens are marked rather than deleted for this many seconds,
+# so a request that read the token before the invalidation cannot cache
+# the outdated user again.
+TOMBSTONE_TIMEOUT = 60
+
+
+def get_token_cache():
+    """Return the cache configured by the USERS_TOKEN_CACHE_ALIAS setting."""
+    return caches[getattr(settings, 'USERS_TOKEN_CACHE_ALIAS', 'default')]
+
+
+def make_token_key(key):
+    """Return the cache key of a token; the token itself is not stored."""
+    return f'{KEY_PREFIX}:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def get_revocation_cache():
+    """Return the cache configured by USERS_REVOCATION_CACHE_ALIAS."""
+    return caches[getattr(settings, 'USERS_REVOCATION_CACHE_ALIAS', 'default')]
+
+
+def _token_format():
+    token_format = getattr(settings, 'USERS_TOKEN_FORMAT', 'database')
+    if token_format not in TOKEN_FORMATS:
+        raise ImproperlyConfigured(
+            f'Unknown USERS_TOKEN_FORMAT {token_format!r}.'
+        )
+    return token_format
+
+
+def _signed_token_ttl():
+    return getattr(settings, 'USERS_SIGNED_TOKEN_TTL', 3600)
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def _last_used_interval():
+    return getattr(settings, 'USERS_TOKEN_LAST_USED_INTERVAL', 60)
+
+
+def token_expiry_cutoff(now=None):
+    """Return the last-use time before which database tokens are expired.
+
+    Returns None if USERS_TOKEN_TTL is None and tokens never expire.
+    """
+    ttl = getattr(settings, 'USERS_TOKEN_TTL', None)
+    if ttl is None:
+        return None
+    return (now or timezone.now()) - timedelta(seconds=ttl)
+
+
+def _last_used(token):
+    """Return when a token was last used, or created if never recorded."""
+    try:
+        return token.usage.last_used
+    except TokenUsage.DoesNotExist:
+        return token.created
+
+
+def _use_token(key, last_used, now):
+    """Check that a token has not expired and record its use.
+
+    Returns the last-use time of the token including this use.
+    """
+    cutoff = token_expiry_cutoff(now)
+    if cutoff is not None and last_used < cutoff:
+        raise exceptions.AuthenticationFailed(_('Token has expired.'))
+    if (now - last_used).total_seconds() < _last_used_interval():
+        return last_used
+    last_used_buffer.touch(key, now)
+    return now
+
+
+class LastUsedBuffer:
+    """Token last-use times waiting to be written to TokenUsage.
+
+    A token is only touched when its recorded use is older than
+    USERS_TOKEN_LAST_USED_INTERVAL, and the buffer is written by the
+    first touch after that interval with one bulk upsert, so requests do
+    not write to the database on their own. Times still buffered when a
+    process exits are lost, which can only make tokens expire early by
+    up to the interval.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._flushed_at = time.monotonic()
+
+    def touch(self, key, when):
+        with self._lock:
+            self._pending[key] = when
+            if time.monotonic() - self._flushed_at < _last_used_interval():
+                return
+            pending = self._swap()
+        self._write(pending)
+
+    def flush(self):
+        """Write all buffered times now."""
+        with self._lock:
+            pending = self._swap()
+        self._write(pending)
+
+    def _swap(self):
+        pending, self._pending = self._pending, {}
+        self._flushed_at = time.monotonic()
+        return pending
+
+    def _write(self, pending):
+        if not pending:
+            return
+        try:
+            with transaction.atomic():
+                # Tokens deleted in the meantime have nothing to update.
+                keys = Token.objects.filter(key__in=pending).values_list(
+                    'key', flat=True
+                )
+                TokenUsage.objects.bulk_create(
+                    [
+                        TokenUsage(token_id=key, last_used=pending[key])
+                        for key in keys
+                    ],
+                    batch_size=500,
+                    update_conflicts=True,
+                    unique_fields=['token'],
+                    update_fields=['last_used'],
+                )
+        except IntegrityError:
+            # A token was deleted between the two queries; the times are
+            # only a hint for expiry, so the batch is dropped.
+            pass
+
+
+last_used_buffer = LastUsedBuffer()
+
+
+def _token_user(user_pk, is_active, is_superuser):
+    """Return a User with every field but the given ones deferred."""
+    return User.from_db(
+        User.objects.db,
+        [User._meta.pk.attname, 'is_active', 'is_superuser'],
+        [user_pk, is_active, is_superuser],
+    )
+
+
+def issue_token(user):
+    """Return an access token for the user in the USERS_TOKEN_FORMAT.
+
+    'database' tokens are rows of the authtoken table, sent as
+    "Token <key>". 'signed' tokens embed the user id, superuser flag,
+    issue and expiry times, are signed with SECRET_KEY and are sent as
+    "Bearer <token>".
+    """
+    if _token_format() == 'database':
+        return _database_token(user).key
+    issued_at = _now_ms()
+    return signing.dumps(
+        {
+            'u': user.pk,
+            's': user.is_superuser,
+            'i': issued_at,
+            'e': issued_at + _signed_token_ttl() * 1000,
+        },
+        salt=SIGNED_TOKEN_SALT,
+    )
+
+
+def _database_token(user):
+    """Return the user's database token, replacing it if it expired."""
+    token, created = Token.objects.select_related('usage').get_or_create(
+        user=user
+    )
+    if created:
+        return token
+    try:
+        _use_token(token.key, _last_used(token), timezone.now())
+    except exceptions.AuthenticationFailed:
+        token.delete()
+        token = Token.objects.create(user=user)
+    return token
+
+
+def _revoked_token_key(key):
+    return f'{REVOKED_PREFIX}:token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def _revoked_user_key(user_pk):
+    return f'{REVOKED_PREFIX}:user:{user_pk}'
+
+
+def revoke_user_signed_tokens(user_pk):
+    """Revoke every signed token issued to a user until now."""
+    get_revocation_cache().set(
+        _revoked_user_key(user_pk),
+        _now_ms(),
+        # Tokens issued before now expire within one TTL.
+        timeout=_signed_token_ttl() + 1,
+    )
+
+
+class SignedToken:
+    """A verified signed access token, used as request.auth.
+
+    delete() revokes it, like deleting a database token.
+    """
+
+    def __init__(self, key, payload):
+        self.key = key
+        self.user_id = payload['u']
+        self.issued_at = payload['i']
+        self.expires_at = payload['e']
+
+    def delete(self):
+        # The revocation only needs to outlive the token.
+        timeout = math.ceil((self.expires_at - _now_ms()) / 1000) + 1
+        if timeout > 0:
+            get_revocation_cache().set(
+                _revoked_token_key(self.key), True, timeout=timeout
+            )
+
+
+def invalidate_tokens(keys):
+    """Drop tokens from the cache, so their next use reads the database."""
+    get_token_cache().set_many(
+        dict.fromkeys(map(make_token_key, keys), False),
+        timeout=TOMBSTONE_TIMEOUT,
+    )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication that caches the token's user.
+
+    The user's id, is_active and is_superuser and the token's last use
+    are cached per token, so an authenticated request needs no query.
+    Tokens unused for USERS_TOKEN_TTL seconds are rejected; uses are
+    recorded in batches by last_used_buffer. request.user is then a User
+    with every other field deferred: they are all loaded with one query
+    when the first of them is read, and save() only writes the fields
+    that were loaded or changed. Cache entries are invalidated when the
+    token is deleted or its user is saved (see users.signals).
+    """
+
+    def authenticate_credentials(self, key):
+        cache = get_token_cache()
+        cache_key = make_token_key(key)
+        cached = cache.get(cache_key)
+        now = timezone.now()
+        if not cached:
+            user, token = self.get_token(key)
+            last_used = _use_token(key, _last_used(token), now)
+            if cached is None:
+                cache.add(
+                    cache_key,
+                    (user.pk, user.is_active, user.is_superuser, last_used),
+                )
+            return user, token
+
+        user_pk, is_active, is_superuser, last_used = cached
+        if not is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        _use_token(key, last_used, now)
+        model = self.get_model()
+        user = _token_user(user_pk, is_active, is_superuser)
+        token = model.from_db(
+            model.objects.db, ['key', 'user_id'], [key, user_pk]
+        )
+        token.user = user
+        return user, token
+
+    def get_token(self, key):
+        """Return the user and token of a key from the database."""
+        model = self.get_model()
+        try:
+            token = model.objects.select_related('user', 'usage').get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        return token.user, token
+
+
+class SignedTokenAuthentication(TokenAuthentication):
+    """Authentication with signed tokens from issue_token().
+
+    Tokens are verified with SECRET_KEY and checked against the revocation
+    list in the USERS_REVOCATION_CACHE_ALIAS cache, without any database
+    access. The list holds logged out tokens and, per user, the time of
+    the last save that could change is_active or is_superuser; entries
+    expire with the tokens they cover.
+    """
+
+    keyword = 'Bearer'
+
+    def authenticate_credentials(self, key):
+        try:
+            payload = signing.loads(key, salt=SIGNED_TOKEN_SALT)
+        except signing.BadSignature:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if payload['e'] <= _now_ms():
+            raise exceptions.AuthenticationFailed(_('Token has expired.'))
+
+        token_key = _revoked_token_key(key)
+        user_key = _revoked_user_key(payload['u'])
+        revoked = get_revocation_cache().get_many([token_key, user_key])
+        if token_key in revoked or revoked.get(user_key, -1) >= payload['i']:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        return _token_user(payload['u'], True, payload['s']), SignedToken(
+            key, payload
+        )
@@ -0,0 +1,26 @@
+import contextlib
+
+from django.core.cache.backends.filebased import FileBasedCache
+
+
+class ExpiringFileBasedCache(FileBasedCache):
+    """File-based cache that deletes expired entries before culling.
+
+    FileBasedCache only deletes an expired file when it is read, and culls
+    random entries, live or not, once MAX_ENTRIES files exist. This cache
+    deletes every expired file first and only culls if the live entries
+    alone reach MAX_ENTRIES, so entries that are never read again, like
+    signed token revocations, cannot push live ones out.
+    """
+
+    def _cull(self):
+        filelist = self._list_cache_files()
+        if len(filelist) < self._max_entries:
+            return
+        for fname in filelist:
+            with (
+                contextlib.suppress(FileNotFoundError),
+                open(fname, 'rb') as f,
+            ):
+                self._is_expired(f)
+        super()._cull()
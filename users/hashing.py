@@ -0,0 +1,103 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    UNUSABLE_PASSWORD_PREFIX,
+    make_password,
+    verify_password,
+)
+
+
+class HasherBusy(Exception):
+    """Raised when the password hashing executor is saturated."""
+
+
+def _workers():
+    return getattr(settings, 'USERS_HASHER_WORKERS', None) or os.cpu_count()
+
+
+def _max_pending(workers):
+    max_pending = getattr(settings, 'USERS_HASHER_MAX_PENDING', None)
+    return max_pending or workers * 4
+
+
+class HashingExecutor:
+    """Bounded thread pool running password hashes off the event loop.
+
+    The hashers in hashlib, bcrypt and argon2 release the GIL, so up to
+    USERS_HASHER_WORKERS hashes run in parallel while the event loop keeps
+    serving other requests. At most USERS_HASHER_MAX_PENDING hashes may
+    be running or queued; further calls raise HasherBusy at once instead
+    of queueing, so a burst of logins is shed rather than piling up
+    latency for everyone.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._max_pending = 0
+        self._pending = 0
+
+    def _release(self, future):
+        with self._lock:
+            self._pending -= 1
+
+    def submit(self, fn, *args):
+        """Submit a hashing function; return a concurrent future."""
+        with self._lock:
+            if self._executor is None:
+                workers = _workers()
+                self._executor = ThreadPoolExecutor(
+                    workers, thread_name_prefix='password-hasher'
+                )
+                self._max_pending = _max_pending(workers)
+            if self._pending >= self._max_pending:
+                raise HasherBusy
+            self._pending += 1
+            try:
+                future = self._executor.submit(fn, *args)
+            except BaseException:
+                self._pending -= 1
+                raise
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn, *args):
+        """Run a hashing function in the pool and return its result."""
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def shutdown(self):
+        """Stop the pool; the next call starts one with current settings."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+
+hashing_executor = HashingExecutor()
+
+
+async def amake_password(password):
+    """Hash a password in the hashing executor."""
+    return await hashing_executor.run(make_password, password)
+
+
+async def acheck_user_password(user, password):
+    """Check a user's password in the hashing executor.
+
+    user may be None, in which case verify_password() hashes a password
+    anyway, so a missing user takes as long as a wrong password. Like
+    check_password(), a correct password stored with outdated parameters is
+    rehashed.
+    """
+    encoded = user.password if user is not None else UNUSABLE_PASSWORD_PREFIX
+    is_correct, must_update = await hashing_executor.run(
+        verify_password, password, encoded
+    )
+    if is_correct and must_update:
+        user.password = await amake_password(password)
+        await user.asave(update_fields=['password'])
+    return is_correct
@@ -0,0 +1,289 @@
+import codecs
+import csv
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.db import IntegrityError, transaction
+from django.utils.translation import gettext as _
+
+from rbac.models import Role, UserRole
+from rbac.services import sync_bulk_created_users
+
+from .models import User
+from .serializers import UserImportSerializer
+
+FORMATS = ('csv', 'ndjson')
+# Separates role names in the roles column of CSV files.
+ROLE_SEPARATOR = ';'
+# Errors listed in an import result; the rest are only counted.
+MAX_REPORTED_ERRORS = 100
+
+
+def _processes():
+    processes = getattr(settings, 'USERS_IMPORT_PROCESSES', None)
+    return os.cpu_count() if processes is None else processes
+
+
+def _chunk_size():
+    return getattr(settings, 'USERS_IMPORT_CHUNK_SIZE', 1000)
+
+
+def guess_format(name):
+    """Return the import format of a file name, or None."""
+    extension = os.path.splitext(name or '')[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.ndjson', '.jsonl'):
+        return 'ndjson'
+    return None
+
+
+def read_rows(file, format):
+    """Yield (line number, row) pairs from a CSV or NDJSON file.
+
+    file is iterated line by line, so it is never read into memory as a
+    whole; binary files are decoded as UTF-8. Rows are dicts, or None for
+    NDJSON lines that are not JSON objects. Raises ValueError for an
+    unknown format or a CSV file without an email column.
+    """
+    lines = _text_lines(file)
+    if format == 'csv':
+        reader = csv.DictReader(lines)
+        if 'email' not in (reader.fieldnames or ()):
+            raise ValueError('CSV files need a header with an email column.')
+        for row in reader:
+            roles = row.get('roles') or ''
+            row['roles'] = [
+                name.strip()
+                for name in roles.split(ROLE_SEPARATOR)
+                if name.strip()
+            ]
+            yield (
+                reader.line_num,
+                {
+                    name: value
+                    for name, value in row.items()
+                    if name is not None and value not in (None, '')
+                },
+            )
+    elif format == 'ndjson':
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield number, row if isinstance(row, dict) else None
+    else:
+        raise ValueError(f'Unknown import format {format!r}.')
+
+
+def _text_lines(file):
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    for line in file:
+        yield decoder.decode(line) if isinstance(line, bytes) else line
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class UserImporter:
+    """Create users from rows of read_rows() in chunks.
+
+    Every chunk is validated with UserImportSerializer, checked against
+    existing emails with one query, hashed in a process pool and inserted
+    with bulk_create() in its own transaction, together with the role
+    assignments of its users, so an import can be interrupted without
+    leaving a chunk half done. Invalid rows are skipped and reported.
+    """
+
+    def __init__(self, roles=(), chunk_size=None, processes=None):
+        self.chunk_size = chunk_size or _chunk_size()
+        self.processes = _processes() if processes is None else processes
+        self.roles = {}
+        self.default_roles = list(roles)
+        missing = self.resolve_roles(self.default_roles)
+        if missing:
+            raise ValueError(f'Unknown roles: {", ".join(sorted(missing))}.')
+        self.result = {
+            'created': 0,
+            'failed': 0,
+            'role_assignments': 0,
+            'errors': [],
+        }
+
+    def run(self, rows):
+        """Import the rows and return the counts and reported errors."""
+        # Hashes run in separate processes, started fresh so they do not
+        # inherit the threads and connections of this one. Daemonic
+        # processes, such as multiprocessing pool workers, cannot have
+        # children and hash in-process instead.
+        self.pool = None
+        if self.processes > 0 and not multiprocessing.current_process().daemon:
+            self.pool = ProcessPoolExecutor(
+                self.processes, mp_context=multiprocessing.get_context('spawn')
+            )
+        # The hasher is passed to the workers, which therefore need no
+        # settings of their own.
+        self.hasher = get_hasher()
+        self.seen = set()
+        try:
+            for chunk in _chunks(rows, self.chunk_size):
+                self.import_chunk(chunk)
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown(cancel_futures=True)
+        return self.result
+
+    def hash_passwords(self, passwords):
+        hash_password = partial(make_password, hasher=self.hasher)
+        if self.pool is None:
+            return list(map(hash_password, passwords))
+        chunksize = max(1, len(passwords) // (self.processes * 4))
+        return list(
+            self.pool.map(hash_password, passwords, chunksize=chunksize)
+        )
+
+    def resolve_roles(self, names):
+        """Load the ids of role names not seen yet; return unknown names."""
+        new = set(names) - self.roles.keys()
+        if new:
+            self.roles.update(
+                Role.objects.filter(name__in=new).values_list('name', 'pk')
+            )
+        return new - self.roles.keys()
+
+    def error(self, line, errors, email=None):
+        self.result['failed'] += 1
+        if len(self.result['errors']) < MAX_REPORTED_ERRORS:
+            self.result['errors'].append(
+                {'line': line, 'email': email, 'errors': errors}
+            )
+
+    def validate(self, chunk):
+        """Return (line, validated data) of the valid rows of a chunk."""
+        valid = []
+        for line, row in chunk:
+            if row is None:
+                self.error(
+                    line, {'non_field_errors': [_('Invalid JSON object.')]}
+                )
+                continue
+            serializer = UserImportSerializer(data=row)
+            if not serializer.is_valid():
+                self.error(line, serializer.errors, row.get('email'))
+                continue
+            data = dict(serializer.validated_data)
+            data['email'] = User.objects.normalize_email(data['email'])
+            if data['email'] in self.seen:
+                self.error(
+                    line,
+                    {'email': [_('Duplicate email in this import.')]},
+                    data['email'],
+                )
+                continue
+            self.seen.add(data['email'])
+            data['roles'] = list(
+                dict.fromkeys(data['roles'] + self.default_roles)
+            )
+            valid.append((line, data))
+
+        self.resolve_roles(
+            {name for line, data in valid for name in data['roles']}
+        )
+        existing = self.existing_emails(valid)
+        rows = []
+        for line, data in valid:
+            errors = {}
+            if data['email'] in existing:
+                errors['email'] = [_('A user with this email already exists.')]
+            unknown = [
+                name for name in data['roles'] if name not in self.roles
+            ]
+            if unknown:
+                errors['roles'] = [
+                    _('Unknown roles: %(roles)s.')
+                    % {'roles': ', '.join(unknown)}
+                ]
+            if errors:
+                self.error(line, errors, data['email'])
+            else:
+                rows.append((line, data))
+        return rows
+
+    def existing_emails(self, rows):
+        return set(
+            User.objects.filter(
+                email__in=[data['email'] for line, data in rows]
+            ).values_list('email', flat=True)
+        )
+
+    def import_chunk(self, chunk):
+        rows = self.validate(chunk)
+        with_password = [data for line, data in rows if 'password' in data]
+        hashes = self.hash_passwords(
+            [data['password'] for data in with_password]
+        )
+        for data, encoded in zip(with_password, hashes):
+            data['password'] = encoded
+        try:
+            self.create(rows)
+        except IntegrityError:
+            # Another request created some of the emails since they were
+            # checked; skip those and try once more.
+            existing = self.existing_emails(rows)
+            kept = []
+            for line, data in rows:
+                if data['email'] in existing:
+                    self.error(
+                        line,
+                        {
+                            'email': [
+                                _('A user with this email already exists.')
+                            ]
+                        },
+                        data['email'],
+                    )
+                else:
+                    kept.append((line, data))
+            self.create(kept)
+
+    def create(self, rows):
+        if not rows:
+            return
+        with transaction.atomic():
+            users = User.objects.bulk_create(
+                User(
+                    email=data['email'],
+                    first_name=data['first_name'],
+                    middle_name=data.get('middle_name', ''),
+                    last_name=data['last_name'],
+                    password=data.get('password') or make_password(None),
+                )
+                for line, data in rows
+            )
+            user_roles = [
+                UserRole(user_id=user.pk, role_id=self.roles[name])
+                for user, (line, data) in zip(users, rows)
+                for name in data['roles']
+            ]
+            UserRole.objects.bulk_create(user_roles, batch_size=1000)
+            sync_bulk_created_users(
+                [user.pk for user in users], assigned_roles=bool(user_roles)
+            )
+        self.result['created'] += len(users)
+        self.result['role_assignments'] += len(user_roles)
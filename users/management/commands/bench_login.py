@@ -0,0 +1,193 @@
+import asyncio
+import json
+import os
+import statistics
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncRequestFactory
+from rest_framework.test import APIRequestFactory
+
+from users.hashing import hashing_executor
+from users.models import User
+from users.views import AsyncLoginView, LoginView
+
+VARIANTS = ('sync', 'async')
+
+
+def _cores():
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count()
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark login in-process through LoginView, hashing on worker '
+        'threads, and AsyncLoginView, hashing in the bounded hashing '
+        'executor, and print logins per second and per core as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--variants', nargs='+', choices=VARIANTS, default=VARIANTS
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=100,
+            help='Logins measured per variant.',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=16,
+            help='Concurrent logins: worker threads for sync, tasks for '
+            'async.',
+        )
+        parser.add_argument('--email', default='bench-login@example.com')
+        parser.add_argument('--password', default='bench-login-password')
+        parser.add_argument('--output', help='Also write the JSON here.')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 2:
+            raise CommandError('--requests must be at least 2.')
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency must be positive.')
+
+        user, created = self.get_user(options['email'], options['password'])
+        data = {'email': options['email'], 'password': options['password']}
+        try:
+            # Create the token up front, so logins only read it.
+            self.check_login(LoginView.as_view()(self.sync_request(data)))
+            results = {
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'cores': _cores(),
+                'variants': {},
+            }
+            for variant in options['variants']:
+                run = getattr(self, f'run_{variant}')
+                results['variants'][variant] = self.measure(
+                    run, data, options['requests'], options['concurrency']
+                )
+        finally:
+            if created:
+                user.delete()
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + '\n')
+        self.stdout.write(output)
+
+    def get_user(self, email, password):
+        """Return the user logging in, creating it if needed."""
+        user = User.objects.filter(email=email).first()
+        if user is None:
+            return User.objects.create_user(email, password), True
+        if not user.is_active or not user.check_password(password):
+            raise CommandError(
+                f'{email} exists but is not an active user with the given '
+                'password.'
+            )
+        return user, False
+
+    def check_login(self, response):
+        if response.status_code != 200:
+            raise CommandError(
+                f'Login failed with {response.status_code}: {response.data}'
+            )
+
+    def sync_request(self, data):
+        return APIRequestFactory().post(
+            '/api/users/login/', data, format='json'
+        )
+
+    def measure(self, run, data, requests, concurrency):
+        shares = [
+            requests // concurrency + (i < requests % concurrency)
+            for i in range(concurrency)
+        ]
+        samples = []
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        run(data, [share for share in shares if share], samples)
+        elapsed = time.perf_counter() - start
+        cpu = time.process_time() - cpu_start
+
+        statuses = Counter(status_code for status_code, _ in samples)
+        latencies = [latency for _, latency in samples]
+
+        ok = statuses.get(200, 0)
+        throughput = ok / elapsed
+        cuts = statistics.quantiles(latencies, n=100)
+        return {
+            'logins': ok,
+            'statuses': {str(code): n for code, n in sorted(statuses.items())},
+            'seconds': round(elapsed, 3),
+            'cpu_seconds': round(cpu, 3),
+            'throughput': round(throughput, 1),
+            'throughput_per_core': round(throughput / _cores(), 1),
+            'logins_per_cpu_second': round(ok / cpu, 1) if cpu else None,
+            'latency_ms': {
+                'mean': round(statistics.fmean(latencies) / 1e6, 2),
+                'p50': round(cuts[49] / 1e6, 2),
+                'p95': round(cuts[94] / 1e6, 2),
+                'p99': round(cuts[98] / 1e6, 2),
+            },
+        }
+
+    def run_sync(self, data, shares, samples):
+        """Log in from one thread per share, like a threaded WSGI server."""
+        view = LoginView.as_view()
+
+        def work(count):
+            try:
+                for _ in range(count):
+                    request = self.sync_request(data)
+                    start = time.perf_counter_ns()
+                    response = view(request)
+                    samples.append(
+                        (response.status_code, time.perf_counter_ns() - start)
+                    )
+            finally:
+                connections.close_all()
+
+        threads = [
+            threading.Thread(target=work, args=(count,)) for count in shares
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def run_async(self, data, shares, samples):
+        """Log in from one task per share on a single event loop."""
+        view = AsyncLoginView.as_view()
+        factory = AsyncRequestFactory()
+
+        async def work(count):
+            for _ in range(count):
+                request = factory.post(
+                    '/api/users/login/async/',
+                    data,
+                    content_type='application/json',
+                )
+                start = time.perf_counter_ns()
+                response = await view(request)
+                samples.append(
+                    (response.status_code, time.perf_counter_ns() - start)
+                )
+
+        async def main():
+            await asyncio.gather(*(work(count) for count in shares))
+
+        try:
+            async_to_sync(main)()
+        finally:
+            hashing_executor.shutdown()
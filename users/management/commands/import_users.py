@@ -0,0 +1,80 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.importing import FORMATS, UserImporter, guess_format, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Import users from a CSV or NDJSON file, hashing passwords in a '
+        'process pool and inserting them in chunks.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for stdin.")
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='Input format; guessed from the file extension by default.',
+        )
+        parser.add_argument(
+            '--role',
+            action='append',
+            default=[],
+            dest='roles',
+            help='Role assigned to every imported user; may be repeated.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            help='Rows validated and inserted per transaction; defaults to '
+            'USERS_IMPORT_CHUNK_SIZE.',
+        )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            help='Password hashing processes; 0 hashes in this process. '
+            'Defaults to USERS_IMPORT_PROCESSES.',
+        )
+
+    def handle(self, *args, **options):
+        format = options['format'] or guess_format(options['path'])
+        if format is None:
+            raise CommandError(
+                'Cannot guess the format from the file name; use --format.'
+            )
+        if options['chunk_size'] is not None and options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive.')
+        if options['processes'] is not None and options['processes'] < 0:
+            raise CommandError('--processes cannot be negative.')
+
+        try:
+            importer = UserImporter(
+                roles=options['roles'],
+                chunk_size=options['chunk_size'],
+                processes=options['processes'],
+            )
+            if options['path'] == '-':
+                result = importer.run(read_rows(sys.stdin.buffer, format))
+            else:
+                with open(options['path'], 'rb') as file:
+                    result = importer.run(read_rows(file, format))
+        except (OSError, ValueError) as e:
+            raise CommandError(e) from e
+
+        for error in result['errors']:
+            errors = json.dumps(error['errors'], ensure_ascii=False)
+            self.stderr.write(f'Line {error["line"]}: {errors}')
+        if result['failed'] > len(result['errors']):
+            self.stderr.write(
+                f'{result["failed"] - len(result["errors"])} more rows failed.'
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Created {result["created"]} users with '
+                f'{result["role_assignments"]} role assignments; '
+                f'{result["failed"]} rows failed.'
+            )
+        )
@@ -0,0 +1,71 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+
+from users.authentication import token_expiry_cutoff
+from users.models import TokenUsage
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete authentication tokens unused for longer than '
+        'USERS_TOKEN_TTL, in chunks with a short transaction each.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Tokens deleted per transaction.',
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0.0,
+            help='Seconds to wait between chunks, letting other writers in.',
+        )
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive.')
+        cutoff = token_expiry_cutoff()
+        if cutoff is None:
+            raise CommandError('USERS_TOKEN_TTL is None; tokens never expire.')
+
+        # Tokens are found through the last_used index. Tokens without a
+        # usage row (e.g. from bulk_create()) fall back to their creation
+        # time. The filters are applied again when deleting, so a token
+        # used after it was selected is kept.
+        sources = [
+            (
+                TokenUsage.objects.filter(last_used__lt=cutoff)
+                .order_by('last_used')
+                .values_list('token_id', flat=True),
+                {'usage__last_used__lt': cutoff},
+            ),
+            (
+                Token.objects.filter(
+                    usage__isnull=True, created__lt=cutoff
+                ).values_list('key', flat=True),
+                {'usage__isnull': True, 'created__lt': cutoff},
+            ),
+        ]
+        chunk_size = options['chunk_size']
+        deleted = 0
+        for candidates, expired in sources:
+            while keys := list(candidates[:chunk_size]):
+                with transaction.atomic():
+                    _, counts = Token.objects.filter(
+                        key__in=keys, **expired
+                    ).delete()
+                deleted += counts.get(Token._meta.label, 0)
+                if len(keys) < chunk_size:
+                    break
+                time.sleep(options['pause'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Deleted {deleted} expired tokens.')
+        )
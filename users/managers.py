@@ -1,5 +1,7 @@
 from django.contrib.auth.base_user import BaseUserManager
 
+from .hashing import amake_password
+
 
 class UserManager(BaseUserManager):
     """Custom manager for User model with create_user and create_superuser methods."""
@@ -18,6 +20,23 @@ class UserManager(BaseUserManager):
         user.save(using=self._db)
         return user
 
+    async def acreate_user(self, email, password=None, **extra_fields):
+        """Async create_user() hashing the password in the hashing executor.
+
+        Raises users.hashing.HasherBusy if the executor is saturated.
+        """
+        if not email:
+            raise ValueError('Email address is required')
+
+        if password is None:
+            raise ValueError('Password is required')
+
+        email = self.normalize_email(email)
+        user = self.model(email=email, **extra_fields)
+        user.password = await amake_password(password)
+        await user.asave(using=self._db)
+        return user
+
     def create_superuser(self, email, password=None, **extra_fields):
         """Create and save a superuser with the given email and password."""
         extra_fields.setdefault('is_staff', True)
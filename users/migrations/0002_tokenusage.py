@@ -0,0 +1,57 @@
+# Generated by Django 6.1.2 on 2026-10-18 01:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def create_token_usage(apps, schema_editor):
+    Token = apps.get_model('authtoken', 'Token')
+    TokenUsage = apps.get_model('users', 'TokenUsage')
+    # When tokens were last used is unknown, so existing tokens count as
+    # used now rather than expiring at once.
+    now = timezone.now()
+    TokenUsage.objects.bulk_create(
+        (
+            TokenUsage(token_id=key, last_used=now)
+            for key in Token.objects.values_list('key', flat=True)
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('authtoken', '0004_alter_tokenproxy_options'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenUsage',
+            fields=[
+                (
+                    'token',
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name='usage',
+                        serialize=False,
+                        to='authtoken.token',
+                        verbose_name='Токен',
+                    ),
+                ),
+                (
+                    'last_used',
+                    models.DateTimeField(
+                        db_index=True, verbose_name='Последнее использование'
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'Использование токена',
+                'verbose_name_plural': 'Использование токенов',
+            },
+        ),
+        migrations.RunPython(create_token_usage, migrations.RunPython.noop),
+    ]
@@ -29,6 +29,11 @@ class User(AbstractBaseUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
 
+    # Fields that tokens and cached access decisions depend on. save()
+    # records which of them it changes in changed_account_fields, for the
+    # post_save handlers.
+    ACCOUNT_FIELDS = ('is_active', 'is_superuser')
+
     class Meta:
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
@@ -36,6 +41,66 @@ class User(AbstractBaseUser):
     def __str__(self):
         return f'{self.first_name} {self.last_name} ({self.email})'
 
+    @classmethod
+    def from_db(cls, db, field_names, values, *args, **kwargs):
+        user = super().from_db(db, field_names, values, *args, **kwargs)
+        user._loaded_values = {
+            name: value
+            for name, value in zip(field_names, values)
+            if name in cls.ACCOUNT_FIELDS
+        }
+        return user
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred.issuperset(fields):
+            # Reading a deferred field, e.g. of a user authenticated from
+            # the token cache, loads the rest of the profile with it.
+            fields = deferred
+        super().refresh_from_db(using, fields, from_queryset)
+        self._remember_account_fields(fields)
+
+    def save(self, *args, **kwargs):
+        self.changed_account_fields = self._changed_account_fields(
+            kwargs.get('update_fields')
+        )
+        super().save(*args, **kwargs)
+        self._remember_account_fields()
+
+    def _remember_account_fields(self, fields=None):
+        names = self.ACCOUNT_FIELDS if fields is None else fields
+        loaded = getattr(self, '_loaded_values', {})
+        loaded.update(
+            (name, self.__dict__[name])
+            for name in self.ACCOUNT_FIELDS
+            if name in names and name in self.__dict__
+        )
+        self._loaded_values = loaded
+
+    def _changed_account_fields(self, update_fields):
+        if self._state.adding and self.pk is None:
+            return frozenset(self.ACCOUNT_FIELDS)
+        # Deferred fields are not saved unless they were assigned.
+        fields = set(self.ACCOUNT_FIELDS) - self.get_deferred_fields()
+        if update_fields is not None:
+            fields &= set(update_fields)
+        loaded = getattr(self, '_loaded_values', {})
+        unknown = fields - loaded.keys()
+        if unknown:
+            # Instances not loaded from the database compare against it.
+            stored = (
+                type(self)
+                ._base_manager.filter(pk=self.pk)
+                .values(*unknown)
+                .first()
+            )
+            loaded = {**loaded, **(stored or {})}
+        return frozenset(
+            name
+            for name in fields
+            if name not in loaded or loaded[name] != getattr(self, name)
+        )
+
     def has_perm(self, perm, obj=None):
         """Return True if user has the given permission."""
         return self.is_superuser
@@ -47,3 +112,28 @@ class User(AbstractBaseUser):
     def has_module_perms(self, app_label):
         """Return True if user has permissions to view the app."""
         return self.is_superuser
+
+
+class TokenUsage(models.Model):
+    """Last use of an authentication token, used to expire idle tokens.
+
+    Kept next to the authtoken table, which belongs to Django REST
+    framework. A row is created with every token and updated in batches
+    by CachedTokenAuthentication.
+    """
+
+    token = models.OneToOneField(
+        'authtoken.Token',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='usage',
+        verbose_name='Токен',
+    )
+    last_used = models.DateTimeField('Последнее использование', db_index=True)
+
+    class Meta:
+        verbose_name = 'Использование токена'
+        verbose_name_plural = 'Использование токенов'
+
+    def __str__(self):
+        return f'{self.token_id} ({self.last_used})'
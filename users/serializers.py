@@ -52,12 +52,16 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return user
 
 
-class UserLoginSerializer(serializers.Serializer):
-    """Serializer for user login."""
+class UserCredentialsSerializer(serializers.Serializer):
+    """Serializer for login credentials, without authenticating them."""
 
     email = serializers.EmailField(required=True)
     password = serializers.CharField(required=True, write_only=True)
 
+
+class UserLoginSerializer(UserCredentialsSerializer):
+    """Serializer for user login."""
+
     def validate(self, attrs):
         """Validate credentials and authenticate user."""
         email = attrs.get('email')
@@ -93,3 +97,31 @@ class UserUpdateSerializer(serializers.ModelSerializer):
             'middle_name': {'required': False},
             'last_name': {'required': False},
         }
+
+
+class UserImportSerializer(serializers.ModelSerializer):
+    """Serializer for one row of a bulk user import.
+
+    Emails are checked for uniqueness by the importer, a batch at a time,
+    instead of with a query per row. Rows without a password get an
+    unusable one.
+    """
+
+    password = serializers.CharField(
+        write_only=True, required=False, validators=[validate_password]
+    )
+    roles = serializers.ListField(
+        child=serializers.CharField(), required=False, default=list
+    )
+
+    class Meta:
+        model = User
+        fields = (
+            'email',
+            'password',
+            'first_name',
+            'middle_name',
+            'last_name',
+            'roles',
+        )
+        extra_kwargs = {'email': {'validators': []}}
@@ -0,0 +1,72 @@
+import logging
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import (
+    _token_format,
+    invalidate_tokens,
+    revoke_user_signed_tokens,
+)
+from .models import TokenUsage, User
+
+logger = logging.getLogger(__name__)
+
+# Fields of a user that are cached per token by CachedTokenAuthentication.
+CACHED_USER_FIELDS = frozenset({'is_active', 'is_superuser'})
+
+
+@receiver(post_save, sender=Token)
+def create_token_usage(sender, instance, created, **kwargs):
+    """Start the expiry clock of a new token."""
+    if created:
+        TokenUsage.objects.create(token=instance, last_used=instance.created)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """Stop accepting a deleted token, e.g. after logout."""
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    """Drop the cached tokens and revoke the signed tokens of a user.
+
+    Only saves that change a field tokens depend on revoke them; raw saves,
+    e.g. from loaddata, always do.
+    """
+    changed = getattr(instance, 'changed_account_fields', CACHED_USER_FIELDS)
+    if created or not CACHED_USER_FIELDS & changed:
+        return
+    _revoke_signed_tokens(instance.pk)
+    invalidate_tokens(
+        Token.objects.filter(user_id=instance.pk).values_list('key', flat=True)
+    )
+
+
+@receiver(post_delete, sender=User)
+def revoke_deleted_user_tokens(sender, instance, **kwargs):
+    """Stop accepting the signed tokens of a deleted user.
+
+    Database tokens are deleted with the user.
+    """
+    _revoke_signed_tokens(instance.pk)
+
+
+def _revoke_signed_tokens(user_pk):
+    """Revoke a user's signed tokens.
+
+    Signed tokens issued before USERS_TOKEN_FORMAT was switched to
+    'database' stay valid until they expire, so they are still revoked;
+    if the revocation cache fails meanwhile, the error is only logged.
+    """
+    try:
+        revoke_user_signed_tokens(user_pk)
+    except Exception:
+        if _token_format() == 'signed':
+            raise
+        logger.exception(
+            'Cannot revoke the signed tokens of user %s.', user_pk
+        )
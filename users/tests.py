@@ -1,15 +1,63 @@
-from django.test import TestCase
-from rest_framework import status
+import json
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+
+from django.conf import settings as django_settings
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.core import signing
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import exceptions, status
 from rest_framework.test import APITestCase
 from rest_framework.authtoken.models import Token
 
-from .models import User
+from rbac.models import (
+    AccessRoleRule,
+    BusinessElement,
+    Role,
+    UserEffectivePermission,
+)
+
+from .authentication import (
+    CachedTokenAuthentication,
+    SignedTokenAuthentication,
+    get_revocation_cache,
+    get_token_cache,
+    invalidate_tokens,
+    issue_token,
+    last_used_buffer,
+)
+from .cache import ExpiringFileBasedCache
+from .hashing import hashing_executor
+from .models import TokenUsage, User
 from .serializers import (
     UserRegistrationSerializer,
     UserLoginSerializer,
     UserUpdateSerializer,
 )
 
+QUERY_BUDGETS_PATH = Path(__file__).with_name('query_budgets.json')
+
+
+def revocation_cache_settings(location):
+    """Return CACHES with the revocation cache kept in location."""
+    return {
+        **django_settings.CACHES,
+        'revocations': {
+            'BACKEND': 'users.cache.ExpiringFileBasedCache',
+            'LOCATION': location,
+        },
+    }
+
 
 class UserManagerTestCase(TestCase):
     """Test cases for UserManager methods."""
@@ -402,3 +450,1022 @@ class UserAPITestCase(APITestCase):
         data = {'first_name': 'Jane'}
         response = self.client.patch('/api/users/update/', data, format='json')
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class CachedTokenAuthenticationTestCase(APITestCase):
+    """Test cases for CachedTokenAuthentication."""
+
+    def setUp(self):
+        """Set up test data."""
+        get_token_cache().clear()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123',
+            first_name='John',
+            last_name='Doe',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.authentication = CachedTokenAuthentication()
+
+    def authenticate(self):
+        return self.authentication.authenticate_credentials(self.token.key)
+
+    def test_cached_authentication(self):
+        """Test that a cached token is authenticated without queries."""
+        self.authenticate()
+        with self.assertNumQueries(0):
+            user, token = self.authenticate()
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertTrue(user.is_active)
+        self.assertFalse(user.is_superuser)
+        self.assertTrue(user.is_authenticated)
+        self.assertEqual(token.key, self.token.key)
+        self.assertEqual(token.user, user)
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, 'test@example.com')
+
+    def test_invalid_token(self):
+        """Test that unknown tokens are rejected."""
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.authentication.authenticate_credentials('invalid')
+
+    def test_logout_revokes_cached_token(self):
+        """Test that a token stops working right after logout."""
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.client.patch('/api/users/update/', {}, format='json')
+        response = self.client.post('/api/users/logout/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.patch('/api/users/update/', {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_account_delete_with_cached_token(self):
+        """Test account deletion by a user authenticated from the cache."""
+        self.authenticate()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        response = self.client.delete('/api/users/delete/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        # Fields that were never loaded are not overwritten.
+        self.assertEqual(self.user.email, 'test@example.com')
+        self.assertEqual(self.user.first_name, 'John')
+        self.assertTrue(self.user.check_password('testpass123'))
+        response = self.client.patch('/api/users/update/', {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_update_with_cached_token(self):
+        """Test profile updates by a user authenticated from the cache."""
+        self.authenticate()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        response = self.client.patch(
+            '/api/users/update/', {'first_name': 'Jane'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data['user'],
+            {
+                'id': self.user.pk,
+                'email': 'test@example.com',
+                'first_name': 'Jane',
+                'last_name': 'Doe',
+            },
+        )
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'Jane')
+
+    def test_user_save_invalidates(self):
+        """Test that saving the user drops its cached token."""
+        self.authenticate()
+        self.user.is_superuser = True
+        self.user.save()
+        user, _ = self.authenticate()
+        self.assertTrue(user.is_superuser)
+
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.authenticate()
+
+    def test_unrelated_update_fields_keep_cache(self):
+        """Test that saving fields that are not cached keeps the entry."""
+        self.authenticate()
+        self.user.first_name = 'Jane'
+        self.user.save(update_fields=['first_name'])
+        with self.assertNumQueries(0):
+            self.authenticate()
+
+    def test_invalidated_token_is_not_cached_again(self):
+        """Test that a request racing an invalidation cannot re-cache."""
+        invalidate_tokens([self.token.key])
+        self.authenticate()
+        with self.assertNumQueries(1):
+            self.authenticate()
+
+
+@override_settings(USERS_TOKEN_FORMAT='signed')
+class SignedTokenAuthenticationTestCase(APITestCase):
+    """Test cases for signed access tokens."""
+
+    def setUp(self):
+        """Set up test data."""
+        # A private revocation cache, as user ids repeat across the
+        # databases of parallel test processes.
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = self.settings(
+            CACHES=revocation_cache_settings(directory.name)
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123',
+            first_name='John',
+            last_name='Doe',
+        )
+        self.authentication = SignedTokenAuthentication()
+
+    def login(self):
+        response = self.client.post(
+            '/api/users/login/',
+            {'email': 'test@example.com', 'password': 'testpass123'},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {response.data["token"]}'
+        )
+        return response.data['token']
+
+    def test_login_issues_signed_token(self):
+        """Test that login returns a signed token instead of a row."""
+        token = self.login()
+        self.assertFalse(Token.objects.exists())
+        payload = signing.loads(
+            token, salt='users.authentication.signed-token'
+        )
+        self.assertEqual(payload['u'], self.user.pk)
+        self.assertFalse(payload['s'])
+        self.assertEqual(payload['e'] - payload['i'], 3600 * 1000)
+
+    def test_register_issues_signed_token(self):
+        """Test that registration returns a working signed token."""
+        response = self.client.post(
+            '/api/users/register/',
+            {
+                'email': 'new@example.com',
+                'password': 'newpass123',
+                'password_confirm': 'newpass123',
+                'first_name': 'New',
+                'last_name': 'User',
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        user, _ = self.authentication.authenticate_credentials(
+            response.data['token']
+        )
+        self.assertEqual(user.email, 'new@example.com')
+
+    def test_authentication_without_queries(self):
+        """Test that a signed token is verified without the database."""
+        token = issue_token(self.user)
+        with self.assertNumQueries(0):
+            user, auth = self.authentication.authenticate_credentials(token)
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertTrue(user.is_active)
+        self.assertFalse(user.is_superuser)
+        self.assertEqual(auth.key, token)
+
+    def test_superuser_flag(self):
+        """Test that the superuser flag is embedded in the token."""
+        admin = User.objects.create_superuser(
+            email='admin@example.com', password='adminpass123'
+        )
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {issue_token(admin)}'
+        )
+        response = self.client.get('/api/rbac/roles/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_tampered_token(self):
+        """Test that a token with a changed payload is rejected."""
+        token = issue_token(self.user)
+        payload = signing.loads(
+            token, salt='users.authentication.signed-token'
+        )
+        forged = signing.dumps(
+            {**payload, 's': True}, key='other', salt='users.authentication'
+        )
+        for key in (forged, token[:-1], 'invalid'):
+            with self.assertRaises(exceptions.AuthenticationFailed):
+                self.authentication.authenticate_credentials(key)
+
+    @override_settings(USERS_SIGNED_TOKEN_TTL=-1)
+    def test_expired_token(self):
+        """Test that expired tokens are rejected."""
+        token = issue_token(self.user)
+        with self.assertRaisesMessage(
+            exceptions.AuthenticationFailed, 'Token has expired.'
+        ):
+            self.authentication.authenticate_credentials(token)
+
+    def test_logout_revokes_token(self):
+        """Test that logout revokes only the token it was sent with."""
+        other = issue_token(self.user)
+        self.login()
+        response = self.client.post('/api/users/logout/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.patch('/api/users/update/', {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.authentication.authenticate_credentials(other)
+
+    def test_account_delete_revokes_tokens(self):
+        """Test that deleting the account revokes all its tokens."""
+        other = issue_token(self.user)
+        self.login()
+        response = self.client.delete('/api/users/delete/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertEqual(self.user.email, 'test@example.com')
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.authentication.authenticate_credentials(other)
+
+    def test_user_save_revokes_tokens(self):
+        """Test that saving the user revokes tokens issued before."""
+        token = issue_token(self.user)
+        self.user.save(update_fields=['first_name'])
+        self.authentication.authenticate_credentials(token)
+        self.user.is_superuser = True
+        self.user.save()
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.authentication.authenticate_credentials(token)
+
+    def test_update_with_signed_token(self):
+        """Test a profile update authenticated with a signed token."""
+        self.login()
+        response = self.client.patch(
+            '/api/users/update/', {'first_name': 'Jane'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['user']['email'], 'test@example.com')
+        self.assertEqual(response.data['user']['first_name'], 'Jane')
+        # The update does not change the fields the token depends on, so
+        # the token stays valid.
+        response = self.client.patch(
+            '/api/users/update/', {'last_name': 'Roe'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['user']['last_name'], 'Roe')
+
+    def test_unchanged_account_fields_keep_tokens(self):
+        """Test that saves keeping is_active and is_superuser keep tokens."""
+        token = issue_token(self.user)
+        user = User.objects.get(pk=self.user.pk)
+        user.save()
+        user.is_active = True
+        user.save(update_fields=['is_active'])
+        # An instance that was not loaded compares against the database.
+        User(
+            pk=self.user.pk,
+            email=user.email,
+            password=user.password,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            date_joined=user.date_joined,
+        ).save(force_update=True)
+        self.authentication.authenticate_credentials(token)
+
+    def test_deleted_user_is_revoked(self):
+        """Test that deleting a superuser revokes its signed tokens."""
+        admin = User.objects.create_superuser(
+            email='admin@example.com', password='adminpass123'
+        )
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {issue_token(admin)}'
+        )
+        admin.delete()
+        response = self.client.get('/api/rbac/roles/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revocation_failure_fails_the_save(self):
+        """Test that deactivation fails if signed tokens stay valid."""
+        with tempfile.NamedTemporaryFile() as file:
+            with self.settings(CACHES=revocation_cache_settings(file.name)):
+                self.user.is_active = False
+                with self.assertRaises(OSError):
+                    self.user.save()
+
+
+class RevocationCacheTestCase(TestCase):
+    """Test cases for revocations while database tokens are issued."""
+
+    def test_revocation_failure_is_logged(self):
+        """Test that deactivation succeeds if the revocation cache fails."""
+        user = User.objects.create_user(
+            email='test@example.com', password='testpass123'
+        )
+        with tempfile.NamedTemporaryFile() as file:
+            with self.settings(CACHES=revocation_cache_settings(file.name)):
+                user.is_active = False
+                with self.assertLogs('users.signals', 'ERROR'):
+                    user.save()
+        user.refresh_from_db()
+        self.assertFalse(user.is_active)
+
+
+class ExpiringFileBasedCacheTestCase(SimpleTestCase):
+    """Test cases for ExpiringFileBasedCache."""
+
+    def test_expired_entries_are_culled_first(self):
+        """Test that live entries survive while expired ones are culled."""
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ExpiringFileBasedCache(
+                directory, {'OPTIONS': {'MAX_ENTRIES': 3}}
+            )
+            cache.set('live', 1, timeout=60)
+            cache.set('expired-1', 2, timeout=0.01)
+            cache.set('expired-2', 3, timeout=0.01)
+            time.sleep(0.02)
+            # The cache is full, so this set culls.
+            cache.set('new', 4, timeout=60)
+            self.assertEqual(len(cache._list_cache_files()), 2)
+            self.assertEqual(cache.get('live'), 1)
+            self.assertEqual(cache.get('new'), 4)
+
+
+class TokenExpiryTestCase(APITestCase):
+    """Test cases for database token expiry and sweeping."""
+
+    def setUp(self):
+        """Set up test data."""
+        get_token_cache().clear()
+        last_used_buffer.flush()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123',
+            first_name='John',
+            last_name='Doe',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.authentication = CachedTokenAuthentication()
+
+    def set_last_used(self, token, age):
+        TokenUsage.objects.filter(token=token).update(
+            last_used=timezone.now() - timedelta(seconds=age)
+        )
+        get_token_cache().clear()
+
+    def authenticate(self):
+        return self.authentication.authenticate_credentials(self.token.key)
+
+    def test_new_token_usage(self):
+        """Test that a new token starts unused since its creation."""
+        self.assertEqual(self.token.usage.last_used, self.token.created)
+
+    @override_settings(USERS_TOKEN_TTL=3600)
+    def test_expired_token(self):
+        """Test that a token unused for longer than the TTL is rejected."""
+        self.set_last_used(self.token, 3601)
+        with self.assertRaisesMessage(
+            exceptions.AuthenticationFailed, 'Token has expired.'
+        ):
+            self.authenticate()
+        self.set_last_used(self.token, 3500)
+        self.authenticate()
+
+    @override_settings(USERS_TOKEN_TTL=0)
+    def test_expired_cached_token(self):
+        """Test that expiry is checked for cached tokens as well."""
+        with override_settings(USERS_TOKEN_TTL=3600):
+            self.authenticate()
+        with self.assertNumQueries(0):
+            with self.assertRaises(exceptions.AuthenticationFailed):
+                self.authenticate()
+
+    @override_settings(USERS_TOKEN_TTL=None)
+    def test_no_ttl(self):
+        """Test that tokens never expire without a TTL."""
+        self.set_last_used(self.token, 10**8)
+        self.authenticate()
+
+    @override_settings(USERS_TOKEN_TTL=3600)
+    def test_login_replaces_expired_token(self):
+        """Test that login issues a new token for an expired one."""
+        data = {'email': 'test@example.com', 'password': 'testpass123'}
+        response = self.client.post('/api/users/login/', data, format='json')
+        self.assertEqual(response.data['token'], self.token.key)
+        self.set_last_used(self.token, 3601)
+        response = self.client.post('/api/users/login/', data, format='json')
+        self.assertNotEqual(response.data['token'], self.token.key)
+        self.assertFalse(Token.objects.filter(key=self.token.key).exists())
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {response.data["token"]}'
+        )
+        response = self.client.patch('/api/users/update/', {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_last_used_batched(self):
+        """Test that uses are buffered and written in one batch."""
+        self.set_last_used(self.token, 120)
+        other = Token.objects.create(
+            user=User.objects.create_user(
+                email='other@example.com', password='testpass123'
+            )
+        )
+        self.set_last_used(other, 120)
+        with self.assertNumQueries(1):
+            self.authenticate()
+        self.authentication.authenticate_credentials(other.key)
+        self.assertLess(
+            TokenUsage.objects.get(token=self.token).last_used,
+            timezone.now() - timedelta(seconds=100),
+        )
+        with CaptureQueriesContext(connection) as queries:
+            last_used_buffer.flush()
+        self.assertEqual(sum('INSERT' in query['sql'] for query in queries), 1)
+        for token in (self.token, other):
+            self.assertGreater(
+                TokenUsage.objects.get(token=token).last_used,
+                timezone.now() - timedelta(seconds=10),
+            )
+
+    def test_recent_use_not_recorded(self):
+        """Test that uses within the interval are not recorded again."""
+        self.authenticate()
+        with self.assertNumQueries(0):
+            last_used_buffer.flush()
+
+    @override_settings(USERS_TOKEN_LAST_USED_INTERVAL=0)
+    def test_flush_after_interval(self):
+        """Test that a touch after the interval writes the buffer."""
+        self.set_last_used(self.token, 120)
+        self.authenticate()
+        self.assertGreater(
+            TokenUsage.objects.get(token=self.token).last_used,
+            timezone.now() - timedelta(seconds=10),
+        )
+
+    def test_flush_skips_deleted_tokens(self):
+        """Test that uses of tokens deleted meanwhile are dropped."""
+        self.set_last_used(self.token, 120)
+        self.authenticate()
+        self.token.delete()
+        last_used_buffer.flush()
+        self.assertFalse(TokenUsage.objects.exists())
+
+    @override_settings(USERS_TOKEN_TTL=3600)
+    def test_sweep_tokens(self):
+        """Test that expired tokens are deleted in chunks."""
+        expired = []
+        for i in range(5):
+            user = User.objects.create_user(
+                email=f'user{i}@example.com', password='testpass123'
+            )
+            expired.append(Token.objects.create(user=user))
+            self.set_last_used(expired[-1], 3601 + i)
+        bulk = Token.objects.bulk_create(
+            [
+                Token(
+                    user=User.objects.create_user(
+                        email='bulk@example.com', password='testpass123'
+                    ),
+                    key=Token.generate_key(),
+                )
+            ]
+        )[0]
+        Token.objects.filter(pk=bulk.pk).update(
+            created=timezone.now() - timedelta(seconds=3601)
+        )
+        stdout = StringIO()
+        call_command('sweep_tokens', chunk_size=2, stdout=stdout)
+        self.assertIn('Deleted 6 expired tokens.', stdout.getvalue())
+        self.assertQuerySetEqual(
+            Token.objects.all(), [self.token.key], lambda t: t.key
+        )
+        self.assertEqual(TokenUsage.objects.count(), 1)
+
+    @override_settings(USERS_TOKEN_TTL=None)
+    def test_sweep_tokens_without_ttl(self):
+        """Test that sweeping requires a TTL."""
+        with self.assertRaises(CommandError):
+            call_command('sweep_tokens', stdout=StringIO())
+
+
+class AsyncHashingViewTestCase(APITestCase):
+    """Test cases for the async login and registration views."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123',
+            first_name='John',
+            last_name='Doe',
+        )
+        hashing_executor.shutdown()
+        self.addCleanup(hashing_executor.shutdown)
+
+    def login(self, email='test@example.com', password='testpass123'):
+        return self.client.post(
+            '/api/users/login/async/',
+            {'email': email, 'password': password},
+            format='json',
+        )
+
+    def register(self, email='new@example.com'):
+        return self.client.post(
+            '/api/users/register/async/',
+            {
+                'email': email,
+                'password': 'newpass123',
+                'password_confirm': 'newpass123',
+                'first_name': 'New',
+                'last_name': 'User',
+            },
+            format='json',
+        )
+
+    def saturate(self):
+        """Fill the executor with a blocked hash until the test ends."""
+        release = threading.Event()
+        hashing_executor.submit(release.wait)
+        self.addCleanup(release.set)
+
+    def test_login_matches_sync_view(self):
+        """Test that the async login returns what LoginView returns."""
+        response = self.login()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        token = Token.objects.get(user=self.user)
+        sync_response = self.client.post(
+            '/api/users/login/',
+            {'email': 'test@example.com', 'password': 'testpass123'},
+            format='json',
+        )
+        self.assertEqual(response.json(), sync_response.json())
+        self.assertEqual(response.json()['token'], token.key)
+
+    def test_login_invalid_credentials(self):
+        """Test that wrong passwords, unknown and inactive users fail."""
+        self.user.is_active = False
+        self.user.save()
+        User.objects.create_user(email='other@example.com', password='pw1')
+        for email, password in (
+            ('other@example.com', 'wrong'),
+            ('missing@example.com', 'testpass123'),
+            ('test@example.com', 'testpass123'),
+        ):
+            with self.subTest(email=email):
+                response = self.login(email, password)
+                self.assertEqual(
+                    response.status_code, status.HTTP_401_UNAUTHORIZED
+                )
+                self.assertEqual(
+                    response.json(),
+                    {'non_field_errors': ['Invalid email or password.']},
+                )
+
+    def test_login_invalid_data(self):
+        """Test that field errors and malformed JSON are reported."""
+        response = self.login(email='not-an-email')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn('email', response.json())
+
+        response = self.client.post(
+            '/api/users/login/async/',
+            '{',
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(
+        PASSWORD_HASHERS=[
+            'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+            'django.contrib.auth.hashers.MD5PasswordHasher',
+        ]
+    )
+    def test_login_upgrades_outdated_hash(self):
+        """Test that a password stored with an old hasher is rehashed."""
+        self.user.password = make_password('testpass123', hasher='md5')
+        self.user.save()
+        response = self.login()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$'))
+        self.assertTrue(self.user.check_password('testpass123'))
+
+    @override_settings(USERS_HASHER_WORKERS=1, USERS_HASHER_MAX_PENDING=1)
+    def test_saturated_executor_returns_503(self):
+        """Test that logins and registrations are shed when saturated."""
+        self.saturate()
+        for response in (self.login(), self.register()):
+            self.assertEqual(
+                response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+            self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(User.objects.filter(email='new@example.com').exists())
+
+    def test_register(self):
+        """Test registration through the async view."""
+        response = self.register()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        user = User.objects.get(email='new@example.com')
+        self.assertTrue(user.check_password('newpass123'))
+        self.assertEqual(
+            response.json(),
+            {
+                'user': {
+                    'id': user.pk,
+                    'email': 'new@example.com',
+                    'first_name': 'New',
+                    'last_name': 'User',
+                },
+                'token': Token.objects.get(user=user).key,
+            },
+        )
+
+    def test_register_duplicate_email(self):
+        """Test that registration errors match RegisterView."""
+        response = self.register('test@example.com')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('email', response.json())
+
+
+class UserImportTestCase(APITestCase):
+    """Test cases for the bulk user import endpoint and command."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.admin = User.objects.create_superuser(
+            email='admin@example.com', password='testpass123'
+        )
+        User.objects.create_user(
+            email='existing@example.com',
+            password='testpass123',
+            first_name='Old',
+            last_name='User',
+        )
+        self.role = Role.objects.create(name='Employee')
+        self.element = BusinessElement.objects.create(name='Document')
+        AccessRoleRule.objects.create(
+            role=self.role, element=self.element, read_permission=True
+        )
+        Role.objects.create(name='Manager')
+        self.client.force_authenticate(self.admin)
+
+    def upload(self, name, content, **data):
+        return self.client.post(
+            '/api/users/import/',
+            {'file': SimpleUploadedFile(name, content.encode()), **data},
+            format='multipart',
+        )
+
+    @override_settings(USERS_IMPORT_PROCESSES=0)
+    def test_import_csv(self):
+        """Test that users and their roles are created from a CSV file."""
+        response = self.upload(
+            'users.csv',
+            'email,password,first_name,middle_name,last_name,roles\n'
+            'new1@example.com,newpass123,New,,One,Manager\n'
+            'new2@example.com,,New,Middle,Two,\n',
+            roles='Employee',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data,
+            {'created': 2, 'failed': 0, 'role_assignments': 3, 'errors': []},
+        )
+        first = User.objects.get(email='new1@example.com')
+        self.assertTrue(first.check_password('newpass123'))
+        self.assertEqual(
+            set(first.userrole_set.values_list('role__name', flat=True)),
+            {'Employee', 'Manager'},
+        )
+        second = User.objects.get(email='new2@example.com')
+        self.assertEqual(second.middle_name, 'Middle')
+        self.assertFalse(second.has_usable_password())
+        self.assertTrue(
+            UserEffectivePermission.objects.filter(
+                user=second, element=self.element
+            ).exists()
+        )
+
+    @override_settings(USERS_IMPORT_PROCESSES=0)
+    def test_import_reports_invalid_rows(self):
+        """Test that invalid rows are skipped and reported."""
+        response = self.upload(
+            'users.ndjson',
+            '{"email": "ok@example.com", "first_name": "A", "last_name": "B"}\n'
+            '{"email": "not-an-email", "first_name": "A", "last_name": "B"}\n'
+            '{"email": "existing@example.com", "first_name": "A", '
+            '"last_name": "B"}\n'
+            '{"email": "ok@example.com", "first_name": "A", "last_name": "B"}\n'
+            '{"email": "x@example.com", "first_name": "A", "last_name": "B", '
+            '"roles": ["Missing"]}\n'
+            '[]\n',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['failed'], 5)
+        errors = {
+            error['line']: set(error['errors'])
+            for error in response.data['errors']
+        }
+        self.assertEqual(
+            errors,
+            {
+                2: {'email'},
+                3: {'email'},
+                4: {'email'},
+                5: {'roles'},
+                6: {'non_field_errors'},
+            },
+        )
+        self.assertFalse(User.objects.filter(email='x@example.com').exists())
+
+    @override_settings(USERS_IMPORT_PROCESSES=0, USERS_IMPORT_CHUNK_SIZE=2)
+    def test_import_checks_emails_once_per_chunk(self):
+        """Test that existing emails are looked up with a query per chunk."""
+        content = 'email,first_name,last_name\n' + ''.join(
+            f'user{i}@example.com,A,B\n' for i in range(5)
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.upload('users.csv', content)
+        self.assertEqual(response.data['created'], 5)
+        lookups = [
+            query['sql']
+            for query in queries.captured_queries
+            if query['sql'].startswith('SELECT')
+            and '"users_user"."email" IN' in query['sql']
+        ]
+        self.assertEqual(len(lookups), 3)
+
+    def test_import_rejects_bad_requests(self):
+        """Test that bad uploads and non-superusers are rejected."""
+        for data, field in (
+            ({}, 'file'),
+            ({'file': SimpleUploadedFile('users.txt', b'')}, 'format'),
+            (
+                {
+                    'file': SimpleUploadedFile('users.csv', b'email\n'),
+                    'roles': 'Missing',
+                },
+                'roles',
+            ),
+            ({'file': SimpleUploadedFile('users.csv', b'name\n')}, 'file'),
+        ):
+            with self.subTest(field=field):
+                response = self.client.post(
+                    '/api/users/import/', data, format='multipart'
+                )
+                self.assertEqual(
+                    response.status_code, status.HTTP_400_BAD_REQUEST
+                )
+                self.assertIn(field, response.data)
+
+        self.client.force_authenticate(
+            User.objects.get(email='existing@example.com')
+        )
+        response = self.upload('users.csv', 'email\n')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_import_users_command(self):
+        """Test the command, hashing in a process pool."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'users.jsonl'
+            path.write_text(
+                ''.join(
+                    json.dumps(
+                        {
+                            'email': f'cmd{i}@example.com',
+                            'password': 'newpass123',
+                            'first_name': 'Command',
+                            'last_name': str(i),
+                        }
+                    )
+                    + '\n'
+                    for i in range(3)
+                )
+                + '{"email": "existing@example.com"}\n'
+            )
+            out, err = StringIO(), StringIO()
+            call_command(
+                'import_users',
+                str(path),
+                role=['Employee'],
+                processes=2,
+                stdout=out,
+                stderr=err,
+            )
+        self.assertIn(
+            'Created 3 users with 3 role assignments; 1 rows failed.',
+            out.getvalue(),
+        )
+        self.assertIn('Line 4:', err.getvalue())
+        user = User.objects.get(email='cmd2@example.com')
+        self.assertTrue(user.check_password('newpass123'))
+        self.assertTrue(user.userrole_set.filter(role=self.role).exists())
+
+        with self.assertRaises(CommandError):
+            call_command('import_users', 'users.txt', stdout=StringIO())
+
+
+# Imports hash in-process, so no process pool is started per request.
+@override_settings(USERS_IMPORT_PROCESSES=0)
+class QueryBudgetTestCase(APITestCase):
+    """Test cases for the SQL query budgets of the user endpoints.
+
+    Every endpoint is requested against datasets of increasing size. The
+    number of queries must not grow with the data and must stay within
+    the budget recorded in query_budgets.json.
+    """
+
+    sizes = (3, 15)
+
+    def setUp(self):
+        """Set up test data."""
+        self.budgets = json.loads(QUERY_BUDGETS_PATH.read_text())
+        self.password_hash = make_password('testpass123')
+        self.admin = User.objects.create_superuser(
+            email='admin@example.com', password='testpass123'
+        )
+        self.created = 0
+
+    def next_email(self):
+        self.created += 1
+        return f'user{self.created}@example.com'
+
+    def add_users(self, count):
+        users = User.objects.bulk_create(
+            User(
+                email=self.next_email(),
+                first_name='Bulk',
+                last_name='User',
+                password=self.password_hash,
+            )
+            for _ in range(count)
+        )
+        Token.objects.bulk_create(
+            Token(user=user, key=Token.generate_key()) for user in users
+        )
+
+    def endpoints(self):
+        """Map endpoint names to (expected status, request function).
+
+        The functions take a fresh user and its token, and return the
+        request to measure.
+        """
+        client = self.client
+
+        def authenticated(request):
+            def prepare(user, token):
+                client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+                return request
+
+            return prepare
+
+        def warm(request):
+            def prepare(user, token):
+                client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+                # Cache the token, as any earlier request would have.
+                CachedTokenAuthentication().authenticate_credentials(token.key)
+                return request
+
+            return prepare
+
+        def register(user, token):
+            data = {
+                'email': self.next_email(),
+                'password': 'newpass123',
+                'password_confirm': 'newpass123',
+                'first_name': 'New',
+                'last_name': 'User',
+            }
+            return lambda: client.post(
+                '/api/users/register/', data, format='json'
+            )
+
+        def login(user, token):
+            data = {'email': user.email, 'password': 'testpass123'}
+            return lambda: client.post(
+                '/api/users/login/', data, format='json'
+            )
+
+        def login_async(user, token):
+            data = {'email': user.email, 'password': 'testpass123'}
+            return lambda: client.post(
+                '/api/users/login/async/', data, format='json'
+            )
+
+        def register_async(user, token):
+            data = {
+                'email': self.next_email(),
+                'password': 'newpass123',
+                'password_confirm': 'newpass123',
+                'first_name': 'New',
+                'last_name': 'User',
+            }
+            return lambda: client.post(
+                '/api/users/register/async/', data, format='json'
+            )
+
+        def import_users(user, token):
+            client.force_authenticate(self.admin)
+            content = f'email,first_name,last_name\n{self.next_email()},A,B\n'
+            return lambda: client.post(
+                '/api/users/import/',
+                {'file': SimpleUploadedFile('users.csv', content.encode())},
+                format='multipart',
+            )
+
+        def admin_users(user, token):
+            client.force_login(self.admin)
+            return lambda: client.get('/admin/users/user/')
+
+        return {
+            'register': (status.HTTP_201_CREATED, register),
+            'register-async': (status.HTTP_201_CREATED, register_async),
+            'login': (status.HTTP_200_OK, login),
+            'login-async': (status.HTTP_200_OK, login_async),
+            'logout': (
+                status.HTTP_200_OK,
+                authenticated(lambda: client.post('/api/users/logout/')),
+            ),
+            'delete': (
+                status.HTTP_204_NO_CONTENT,
+                authenticated(lambda: client.delete('/api/users/delete/')),
+            ),
+            'update': (
+                status.HTTP_200_OK,
+                authenticated(
+                    lambda: client.patch(
+                        '/api/users/update/',
+                        {'first_name': 'Jane'},
+                        format='json',
+                    )
+                ),
+            ),
+            'logout-warm': (
+                status.HTTP_200_OK,
+                warm(lambda: client.post('/api/users/logout/')),
+            ),
+            'delete-warm': (
+                status.HTTP_204_NO_CONTENT,
+                warm(lambda: client.delete('/api/users/delete/')),
+            ),
+            'update-warm': (
+                status.HTTP_200_OK,
+                warm(
+                    lambda: client.patch(
+                        '/api/users/update/',
+                        {'first_name': 'Jane'},
+                        format='json',
+                    )
+                ),
+            ),
+            'import': (status.HTTP_200_OK, import_users),
+            'admin-user': (status.HTTP_200_OK, admin_users),
+        }
+
+    def measure(self):
+        """Return the number of queries of every endpoint."""
+        counts = {}
+        for name, (expected, prepare) in self.endpoints().items():
+            self.client.logout()
+            self.client.credentials()
+            user = User.objects.create(
+                email=self.next_email(), password=self.password_hash
+            )
+            token = Token.objects.create(user=user)
+            request = prepare(user, token)
+            with CaptureQueriesContext(connection) as queries:
+                response = request()
+            self.assertEqual(response.status_code, expected, name)
+            counts[name] = len(queries)
+        return counts
+
+    def test_query_counts_within_budgets(self):
+        """Test that query counts are constant and within budget."""
+        # Warm up per-process caches such as the content type cache.
+        self.measure()
+        measured = []
+        for size in self.sizes:
+            self.add_users(size)
+            measured.append(self.measure())
+        self.assertEqual(set(measured[0]), set(self.budgets))
+        for name, budget in self.budgets.items():
+            counts = [counts[name] for counts in measured]
+            with self.subTest(endpoint=name):
+                self.assertEqual(
+                    len(set(counts)),
+                    1,
+                    f'{name} runs {counts} queries for dataset sizes '
+                    f'{self.sizes}.',
+                )
+                self.assertLessEqual(
+                    counts[-1],
+                    budget,
+                    f'{name} exceeds its budget; update '
+                    f'{QUERY_BUDGETS_PATH.name} if this is intended.',
+                )
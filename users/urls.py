@@ -1,10 +1,13 @@
 from django.urls import path
 
 from .views import (
-    RegisterView,
+    AccountDeleteView,
+    AsyncLoginView,
+    AsyncRegisterView,
     LoginView,
     LogoutView,
-    AccountDeleteView,
+    RegisterView,
+    UserImportView,
     UserUpdateView,
 )
 
@@ -12,8 +15,15 @@ app_name = 'users'
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
+    path(
+        'register/async/',
+        AsyncRegisterView.as_view(),
+        name='register-async',
+    ),
     path('login/', LoginView.as_view(), name='login'),
+    path('login/async/', AsyncLoginView.as_view(), name='login-async'),
     path('logout/', LogoutView.as_view(), name='logout'),
     path('delete/', AccountDeleteView.as_view(), name='delete'),
     path('update/', UserUpdateView.as_view(), name='update'),
+    path('import/', UserImportView.as_view(), name='import'),
 ]
@@ -1,17 +1,42 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.decorators import method_decorator
 from django.utils.translation import gettext_lazy as _
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework import status
-from rest_framework.authtoken.models import Token
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from rbac.permissions import IsSuperuser
+
+from .authentication import issue_token
+from .hashing import HasherBusy, acheck_user_password
+from .importing import FORMATS, UserImporter, guess_format, read_rows
+from .models import User
 from .serializers import (
+    UserCredentialsSerializer,
     UserRegistrationSerializer,
     UserLoginSerializer,
     UserUpdateSerializer,
 )
 
 
+def _user_data(user):
+    return {
+        'id': user.pk,
+        'email': user.email,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+    }
+
+
 class RegisterView(APIView):
     """API endpoint for user registration."""
 
@@ -21,17 +46,8 @@ class RegisterView(APIView):
         serializer = UserRegistrationSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
-            token, created = Token.objects.get_or_create(user=user)
             return Response(
-                {
-                    'user': {
-                        'id': user.pk,
-                        'email': user.email,
-                        'first_name': user.first_name,
-                        'last_name': user.last_name,
-                    },
-                    'token': token.key,
-                },
+                {'user': _user_data(user), 'token': issue_token(user)},
                 status=status.HTTP_201_CREATED,
             )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -46,22 +62,118 @@ class LoginView(APIView):
         serializer = UserLoginSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.validated_data['user']
-            token, created = Token.objects.get_or_create(user=user)
             return Response(
-                {
-                    'user': {
-                        'id': user.pk,
-                        'email': user.email,
-                        'first_name': user.first_name,
-                        'last_name': user.last_name,
-                    },
-                    'token': token.key,
-                },
+                {'user': _user_data(user), 'token': issue_token(user)},
                 status=status.HTTP_200_OK,
             )
         return Response(serializer.errors, status=status.HTTP_401_UNAUTHORIZED)
 
 
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncHashingView(View):
+    """Base of the async views that hash passwords.
+
+    Passwords are hashed in users.hashing.hashing_executor, so the event
+    loop keeps serving requests meanwhile. When the executor is saturated
+    the view answers 503 with a Retry-After header instead of queueing.
+    Request bodies are parsed like DRF's JSON and form parsers.
+    """
+
+    http_method_names = ['post', 'options']
+
+    async def post(self, request):
+        try:
+            data = self.parse(request)
+        except ValueError as e:
+            return self.render(
+                {'detail': f'JSON parse error - {e}'},
+                status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            return await self.handle(data)
+        except HasherBusy:
+            response = self.render(
+                {'detail': _('Server busy, try again later.')},
+                status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+            response['Retry-After'] = str(
+                getattr(settings, 'USERS_HASHER_RETRY_AFTER', 1)
+            )
+            return response
+
+    def parse(self, request):
+        if request.content_type == 'application/json':
+            return json.loads(request.body or b'{}')
+        return request.POST
+
+    def render(self, data, status_code):
+        response = HttpResponse(
+            JSONRenderer().render(data),
+            status=status_code,
+            content_type='application/json',
+        )
+        response['Allow'] = 'POST, OPTIONS'
+        return response
+
+
+class AsyncRegisterView(AsyncHashingView):
+    """Async API endpoint for user registration.
+
+    Accepts and returns the same data as RegisterView.
+    """
+
+    async def handle(self, data):
+        serializer = UserRegistrationSerializer(data=data)
+        if not await sync_to_async(serializer.is_valid)():
+            return self.render(serializer.errors, status.HTTP_400_BAD_REQUEST)
+        validated_data = dict(serializer.validated_data)
+        validated_data.pop('password_confirm')
+        user = await User.objects.acreate_user(**validated_data)
+        return self.render(
+            {
+                'user': _user_data(user),
+                'token': await sync_to_async(issue_token)(user),
+            },
+            status.HTTP_201_CREATED,
+        )
+
+
+class AsyncLoginView(AsyncHashingView):
+    """Async API endpoint for user login.
+
+    Accepts and returns the same data as LoginView. Only the password
+    check runs in the hashing executor; the user is fetched on the event
+    loop.
+    """
+
+    async def handle(self, data):
+        serializer = UserCredentialsSerializer(data=data)
+        if not serializer.is_valid():
+            return self.render(serializer.errors, status.HTTP_401_UNAUTHORIZED)
+        email = serializer.validated_data['email']
+        try:
+            user = await User.objects.aget_by_natural_key(email)
+        except User.DoesNotExist:
+            user = None
+        # A password is checked even without a user, like ModelBackend,
+        # so that the response time does not reveal registered emails.
+        is_correct = await acheck_user_password(
+            user, serializer.validated_data['password']
+        )
+        if not is_correct or not user.is_active:
+            return self.render(
+                {'non_field_errors': [_('Invalid email or password.')]},
+                status.HTTP_401_UNAUTHORIZED,
+            )
+        return self.render(
+            {
+                'user': _user_data(user),
+                'token': await sync_to_async(issue_token)(user),
+            },
+            status.HTTP_200_OK,
+        )
+
+
 class LogoutView(APIView):
     """API endpoint for user logout."""
 
@@ -116,3 +228,47 @@ class UserUpdateView(APIView):
                 status=status.HTTP_200_OK,
             )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class UserImportView(APIView):
+    """API endpoint for importing users from a CSV or NDJSON upload.
+
+    Only superusers may import. The file is streamed from the upload in
+    chunks; see users.importing.
+    """
+
+    permission_classes = [IsSuperuser]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        upload = request.data.get('file')
+        if upload is None:
+            return Response(
+                {'file': [_('No file was submitted.')]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        format = request.data.get('format') or guess_format(upload.name)
+        if format not in FORMATS:
+            return Response(
+                {'format': [_('Use csv or ndjson.')]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        roles = [
+            name.strip()
+            for value in request.data.getlist('roles')
+            for name in value.split(',')
+            if name.strip()
+        ]
+        try:
+            importer = UserImporter(roles=roles)
+        except ValueError as e:
+            return Response(
+                {'roles': [str(e)]}, status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            result = importer.run(read_rows(upload, format))
+        except ValueError as e:
+            return Response(
+                {'file': [str(e)]}, status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(result, status=status.HTTP_200_OK)